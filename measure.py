@@ -1,6 +1,14 @@
-import os, sys, getopt, subprocess, random, re, time, math, yaml, psutil
+import os, sys, getopt, subprocess, random, re, time, math, queue, resource, secrets, socket, threading, yaml, psutil
 from datetime import datetime
 
+import scripts.checkpoint as checkpoint
+import scripts.distributed as distributed
+from scripts.cooldown import Cooldown
+from scripts.engine import RunEngine
+from scripts.sampler import FakePowercap
+from scripts.sequential import SequentialStopping, get_run_energy
+import scripts.topology as topology
+
 
 class Workload:
     def __init__(
@@ -19,6 +27,12 @@ class Workload:
         monitor: str,
         docker: bool,
         command: str,
+        dry_run: float = 0,
+        cooldown: Cooldown = None,
+        sequential: SequentialStopping = None,
+        build_jobs: int = 0,
+        rebuild: bool = False,
+        topology: str = "",
     ):
         self.exp_id = exp_id
         self.name = name
@@ -34,8 +48,40 @@ class Workload:
         self.monitor = monitor
         self.docker = docker
         self.command = command
+        self.dry_run = dry_run
+        self.cooldown = cooldown
+        self.sequential = sequential
+        self.build_jobs = build_jobs
+        self.rebuild = rebuild
+        self.topology = topology
+
+        # The state and run number of every entry in the queue, stored after every change (see checkpoint)
+        self.states = [checkpoint.PENDING] * len(queue)
+        self.runs = [None] * len(queue)
+        self.prepared = False
+
+    def restore(self, saved: dict):
+        """Continues the stored queue of an interrupted experiment (see checkpoint.save_queue).
+
+        Args:
+            saved: The stored queue, states and run numbers.
+        """
+        self.queue = saved["queue"]
+        self.states = [
+            checkpoint.PENDING if state == checkpoint.RUNNING else state for state in saved["states"]
+        ]
+        self.runs = saved["runs"]
+        self.prepared = saved["prepared"]
+
+    def save(self):
+        checkpoint.save_queue(self.exp_id, self.name, self.queue, self.states, self.runs, self.prepared)
+
+    def is_finished(self):
+        return all(state != checkpoint.PENDING for state in self.states)
+
+    def prepare(self, pin_cpus: str = ""):
+        self.save()
 
-    def prepare(self):
         # Execute the given command
         command = [
             "bash",
@@ -56,51 +102,136 @@ class Workload:
             str(self.docker),
             "-c",
             self.command,
+            "-k",
+            str(self.build_jobs),
+            "-o",
+            self.topology,
         ]
+        if self.rebuild:
+            command.append("-r")
+        # The images of a resumed workload were already built
+        if self.prepared:
+            command.append("-n")
         for image in self.images:
             command += ["-b", image]
+        # A packed workload is warmed up on its own cpus while the other workloads are measured
+        if pin_cpus != "":
+            command = ["taskset", "-c", pin_cpus] + command
         subprocess.call(command)
 
+        self.prepared = True
+        self.save()
+
     def run(self):
-        # Current execution number in total
-        total = 1
+        # Current execution number in total (after the runs of a resumed queue)
+        total = max([run for run in self.runs if run is not None], default=0) + 1
 
-        command = [
-            "bash",
-            "scripts/monitor",
-            "-x",
+        # Wall-clock and CPU time of the harness for each run (in dry-run mode)
+        overhead = list()
+
+        # Monitor the selected images for the selected number of times in regular order,
+        # in a single run engine instead of one monitoring script per run
+        with RunEngine(
             self.exp_id,
-            "-l",
             self.name,
-            "-i",
             self.isolate_cpus,
-            "-j",
             self.background_cpus,
-            "-t",
-            str(self.threads),
-            "-p",
-            str(self.pause),
-            "-v",
-            str(self.interval),
-            "-m",
+            self.threads,
+            self.pause,
+            self.interval,
+            self.clients,
             self.monitor,
-            "-d",
-            str(self.docker),
-            "-c",
+            self.docker,
             self.command,
-        ]
-
-        if self.clients > 0:
-            command += ["-s", str(self.clients)]
-
-        # Monitor the selected images for the selected number of times in regular order
-        for image in self.queue:
-            # Execute the monitoring script;
-            # -r is the current run for the image;
-            # -t is the current run in total
-            run_command = command + ["-b", image, "-r", str(total)]
-            subprocess.call(run_command)
-            total += 1
+            self.cooldown,
+        ) as engine:
+            # Add the runs of a resumed queue to the estimates
+            if self.sequential is not None:
+                for image, state, run in zip(self.queue, self.states, self.runs):
+                    if state == checkpoint.DONE:
+                        energy = get_run_energy(engine.get_result(image, run))
+                        if energy is not None:
+                            self.sequential.add(image, energy)
+
+            for index, image in enumerate(self.queue):
+                # Skip the runs that were finished before the experiment was resumed
+                if self.states[index] != checkpoint.PENDING:
+                    continue
+
+                # Keep the shuffled order, but skip the remaining runs of images that are settled
+                if self.sequential is not None and self.sequential.is_settled(image):
+                    self.states[index] = checkpoint.SKIPPED
+                    self.save()
+                    continue
+
+                # An interrupted run is run again with the same number, without its partial result
+                run = self.runs[index] if self.runs[index] is not None else total
+                if self.runs[index] is not None:
+                    engine.discard(image, run)
+                self.states[index] = checkpoint.RUNNING
+                self.runs[index] = run
+                self.save()
+
+                start = time.perf_counter()
+                usage = get_cpu_time()
+                returncode = engine.run(image, run)
+                wall = time.perf_counter() - start
+                end_usage = get_cpu_time()
+                overhead.append(
+                    [
+                        run,
+                        image,
+                        wall,
+                        wall - engine.paused - self.dry_run,
+                        end_usage[0] - usage[0],
+                        end_usage[1] - usage[1],
+                    ]
+                )
+
+                self.states[index] = checkpoint.DONE if returncode == 0 else checkpoint.FAILED
+                self.save()
+
+                if self.sequential is not None:
+                    energy = get_run_energy(engine.get_result(image, run))
+                    if energy is not None:
+                        self.sequential.add(image, energy)
+                total = max(total, run + 1)
+
+        if self.sequential is not None:
+            self.log_sequential(total - 1)
+        if self.dry_run > 0:
+            self.log_overhead(overhead)
+
+    def log_overhead(self, overhead: list):
+        """Logs the time the harness itself spent on each run, excluding the pause and the (fake) workload.
+
+        Args:
+            overhead: The run, image, wall-clock time, overhead and CPU user and system time of each run.
+        """
+        file = f"logs/experiment-{self.exp_id}/{self.name}/overhead.tsv"
+        # A resumed workload adds its runs to the overhead of the runs before
+        header = not os.path.exists(file)
+        with open(file, "a") as f:
+            if header:
+                f.write("RUN\tIMAGE\tWALL (s)\tOVERHEAD (s)\tUSER (s)\tSYSTEM (s)\n")
+            for run in overhead:
+                f.write("\t".join(str(x) for x in run) + "\n")
+        if len(overhead) > 0:
+            print(
+                f"Harness overhead for {self.name}: "
+                f"{sum(run[3] for run in overhead) / len(overhead):.3f} s wall-clock and "
+                f"{sum(run[4] + run[5] for run in overhead) / len(overhead):.3f} s CPU per run"
+            )
+
+    def log_sequential(self, runs: int):
+        """Logs the confidence interval width of every comparison when the sequential stopping ended.
+
+        Args:
+            runs: The number of runs that were executed.
+        """
+        summary = self.sequential.summary()
+        summary.to_csv(f"logs/experiment-{self.exp_id}/{self.name}/sequential.tsv", sep="\t", index=False)
+        print(f"Sequential stopping for {self.name}: {runs} of {len(self.queue)} runs executed")
 
     def remove(self):
         command = ["bash", "scripts/remove", "-x", self.exp_id, "-l", self.name]
@@ -109,6 +240,13 @@ class Workload:
         subprocess.call(command)
 
 
+def get_cpu_time():
+    # User and system time of this process (which samples in-process) and its children
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+
+
 def init_queue(images, runs, shuffle_mode):
     """Initializes the queue based on the images, the number of runs, and order.
 
@@ -128,36 +266,29 @@ def init_queue(images, runs, shuffle_mode):
     return queue
 
 
-def set_cpus(cpus):
+def set_cpus(cpus, root: str = topology.ROOT):
     """Sets the cpuset for the workload if no cpuset is provided, but the number of threads is.
 
+    The threads are isolated on whole physical cores (with their SMT siblings from the sysfs topology),
+    on a single NUMA node and socket if possible.
+
     Args:
         cpus: The number of threads to isolate for the workload
+        root: The system directory in sysfs.
 
     Returns:
         The cpuset and the reserved threads (i.e. threads that are not used at all).
     """
-    # Get the number of physical and logical CPUs
-    physical_cpus = psutil.cpu_count(logical=False)
-    logical_cpus = psutil.cpu_count()
-
-    # Allocate the logical CPUs to the physical CPUs
-    dict_cpus = {x: [] for x in range(physical_cpus)}
-    core = 0
-    for x in range(logical_cpus):
-        dict_cpus[core].append(x)
-        core += 1
-        if core >= physical_cpus:
-            core = 0
+    cores = topology.get_cores(root)
 
     # Isolate the amount of threads on the same physical CPU
+    threads = len(cores[0].cpus)
     cpuset = list()
-    reserve = list()
-    threads = logical_cpus / physical_cpus
-    for x in range(math.ceil(cpus / threads)):
-        cpuset.extend(dict_cpus[x])
+    for core in topology.allocate(cores, min(math.ceil(cpus / threads), len(cores))):
+        cpuset.extend(core.cpus)
 
     # Reserve the remaining threads on a physical CPU
+    reserve = list()
     for x in range(len(cpuset) - cpus):
         reserve.append(cpuset.pop())
 
@@ -264,6 +395,310 @@ def get_workload_config(workload: str):
     return config
 
 
+def set_dry_run(duration: float):
+    """Puts the fake docker, sysbench and ts commands first on the PATH of the monitoring scripts.
+
+    Args:
+        duration: The time (s) each fake workload run takes.
+    """
+    fakes = os.path.join(os.getcwd(), "scripts", "fake")
+    os.environ["PATH"] = f"{fakes}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ["FAKE_DURATION"] = str(duration)
+
+
+def init_cooldown(tolerance: float, dry_run: bool = False):
+    """Records the idle baseline of the package power and temperature for the adaptive pause.
+
+    Args:
+        tolerance: The tolerance (%) above the baseline that counts as idle.
+        dry_run: Whether to use synthetic energy counters.
+
+    Returns:
+        The cool-down, or None if neither the power nor the temperature can be read.
+    """
+    cooldown = Cooldown(tolerance, powercap=FakePowercap() if dry_run else None)
+    if not cooldown.available():
+        print("No readable energy counters or temperature sensors; using the fixed pause")
+        return None
+    power, temperature = cooldown.record_baseline()
+    print(
+        "Idle baseline: "
+        + (f"{power:.2f} W" if power is not None else "no power")
+        + ", "
+        + (f"{temperature:.1f} °C" if temperature is not None else "no temperature")
+    )
+    return cooldown
+
+
+def get_workload_cpus(arguments: dict, config: dict):
+    """Returns the number of threads to isolate for a workload, or 0 if it uses all cpus (or a given cpuset).
+
+    Args:
+        arguments: The arguments of the experiment.
+        config: The configuration of the workload.
+
+    Returns:
+        The number of threads from the arguments, or else from the config.
+    """
+    if arguments["cpus"] != 0:
+        return arguments["cpus"]
+    if "cpus" in config.keys() and type(config["cpus"]) is int:
+        return config["cpus"]
+    return 0
+
+
+def get_workload(arguments: dict, workload: str, date: str, cooldown: Cooldown = None):
+    """Configures a workload from its config file and the arguments.
+
+    Args:
+        arguments: The arguments of the experiment (see parse_args).
+        workload: The workload to configure.
+        date: The id of the experiment.
+        cooldown: The adaptive cool-down to pause with (if any).
+
+    Returns:
+        The workload, or None if it cannot be monitored with the given arguments.
+    """
+    config = get_workload_config(workload)
+
+    # Skip development workloads
+    if "development" in config.keys() and config["development"]:
+        return None
+
+    # First set the cpuset
+    cpus = get_workload_cpus(arguments, config)
+    if arguments["cpuset"] != "":
+        cpuset = arguments["cpuset"]
+        reserve = []
+    # If no cpuset is provided, use the number of cpus (from the arguments or the config)
+    elif cpus != 0:
+        cpuset, reserve = set_cpus(cpus)
+    # If no cpus are provided in the config, use all cpus
+    else:
+        cpuset = ""
+        reserve = []
+
+    isolate_cpus, background_cpus, threads = set_cpuset(cpuset, reserve)
+    description = topology.describe(topology.parse_cpulist(isolate_cpus), topology.get_cores())
+
+    if "clients" in config.keys() and type(config["clients"]) is int:
+        clients = abs(config["clients"])
+    else:
+        clients = 0
+
+    # Use all images if all_images is enabled, otherwise use the provided images (if they exist)
+    images = set(config["images"]) if "images" in config.keys() else set()
+
+    if not arguments["all_images"]:
+        images = images.intersection(arguments["images"])
+
+    # If the workload is not a Docker workload, use the command from the config
+    docker = True
+    command = ""
+    if "docker" in config.keys() and not config["docker"]:
+        if "command" in config.keys() and type(config["command"]) is str:
+            docker = False
+            command = config["command"]
+            images = set(["machine"])
+            if arguments["dry_run"]:
+                command = f"sleep {arguments['dry_run_duration']}"
+        else:
+            return None
+    else:
+        if len(images) == 0:
+            print(f"No correct images provided for workload {workload}")
+            return None
+
+    # Create the queue of images for the workload
+    queue = init_queue(images, arguments["runs"], arguments["shuffle_mode"])
+
+    # Create the workload
+    current_workload = Workload(
+        date,
+        workload,
+        images,
+        queue,
+        isolate_cpus,
+        background_cpus,
+        threads,
+        arguments["warmup"],
+        arguments["pause"],
+        arguments["interval"],
+        clients,
+        arguments["monitor"],
+        docker,
+        command,
+        arguments["dry_run_duration"] if arguments["dry_run"] else 0,
+        cooldown,
+        SequentialStopping(images, arguments["min_runs"], arguments["ci_target"])
+        if arguments["sequential"]
+        else None,
+        arguments["build_jobs"],
+        arguments["rebuild"],
+        description,
+    )
+
+    # Continue the stored queue of an interrupted experiment
+    if arguments["resume"] != "":
+        saved = checkpoint.load_queue(date, workload)
+        if saved is not None:
+            current_workload.restore(saved)
+    return current_workload
+
+
+def run_coordinator(arguments: dict, workloads: list, date: str):
+    """Distributes the (workload, image, run) queue of the experiment to the workers.
+
+    Args:
+        arguments: The arguments of the experiment.
+        workloads: The workloads to monitor.
+        date: The id of the experiment.
+    """
+    authkey = arguments["authkey"]
+    if authkey == "":
+        if arguments["workers"] == 0:
+            print("An authkey (--authkey or DOCKER_ENERGY_AUTHKEY) is required to coordinate remote workers")
+            return
+        authkey = secrets.token_hex(16)
+
+    if arguments["sequential"]:
+        print("Sequential stopping is not supported with workers; running all runs")
+        arguments["sequential"] = False
+
+    # The shuffled queue of every workload, in workload order; each worker takes the next run when it is free
+    tasks = list()
+    for workload in workloads:
+        current_workload = get_workload(arguments, workload, date)
+        if current_workload is None:
+            continue
+        tasks += [(workload, image, run) for run, image in enumerate(current_workload.queue, 1)]
+
+    coordinator = distributed.Coordinator(date, arguments, tasks)
+    distributed.coordinate(coordinator, arguments["coordinator"], authkey.encode(), arguments["workers"])
+
+
+def run_worker(arguments: dict):
+    """Runs the runs handed out by the coordinator on this host, with the arguments of the coordinator.
+
+    Args:
+        arguments: The arguments of this worker.
+    """
+    if arguments["authkey"] == "":
+        print("An authkey (--authkey or DOCKER_ENERGY_AUTHKEY) is required to connect to the coordinator")
+        return 1
+
+    # The experiment arguments are only known once connected; the cpus are allocated on this host
+    cooldown = list()
+
+    def get_worker_workload(experiment: dict, workload: str, exp_id: str):
+        if len(cooldown) == 0:
+            if experiment["dry_run"]:
+                set_dry_run(experiment["dry_run_duration"])
+            cooldown.append(
+                init_cooldown(experiment["pause_tolerance"], experiment["dry_run"])
+                if experiment["adaptive_pause"]
+                else None
+            )
+        return get_workload(experiment, workload, exp_id, cooldown[0])
+
+    return distributed.work(
+        arguments["worker"], arguments["authkey"].encode(), arguments["host"], get_worker_workload
+    )
+
+
+def run_packed(arguments: dict, workloads: list, date: str):
+    """Runs the workloads concurrently, each on its own physical cores.
+
+    One or more physical cores are kept for the background processes; the other cores are packed with
+    workloads (first fit, in order, on a single NUMA node if possible), and a workload is started as soon as enough cores are free. Each
+    workload is prepared right after its cores are allocated: its images are built on the background cpus and
+    it is warmed up on its own cores (the warm-up is pinned to them), so it runs where it was warmed up. The cores of each
+    workload (with their cpu ids) are written to cores.txt in its results directory, so the energy of its runs
+    is attributed to the counters of its own cpus (see parse.read_cores). Only greenserver has per-cpu energy
+    counters; with any other monitor the workloads are not packed. Workloads that use all cpus (or a given
+    cpuset) cannot be packed and run one after another afterwards.
+
+    Args:
+        arguments: The arguments of the experiment.
+        workloads: The workloads to monitor.
+        date: The id of the experiment.
+    """
+    cores = topology.get_physical_cores(topology.get_cores())
+    background = cores[: arguments["pack_background"]]
+    pool = cores[arguments["pack_background"] :]
+    background_cpus = ",".join(str(cpu) for core in background for cpu in core.cpus)
+    if len(background) == 0 or len(pool) == 0:
+        print("Not enough physical cores to pack workloads; running them one after another")
+        pool = list()
+
+    # Without per-cpu counters the energy of the packed workloads could not be told apart
+    if arguments["monitor"] not in ("", "greenserver") and len(pool) > 0:
+        print("Only greenserver has per-cpu energy counters; running the workloads one after another")
+        pool = list()
+
+    # Each workload needs enough physical cores for its threads
+    packed = list()
+    exclusive = list()
+    for workload in workloads:
+        current_workload = get_workload(arguments, workload, date)
+        if current_workload is None or current_workload.is_finished():
+            continue
+        cpus = get_workload_cpus(arguments, get_workload_config(workload))
+        need = math.ceil(cpus / len(pool[0].cpus)) if cpus != 0 and len(pool) > 0 else 0
+        if need == 0 or need > len(pool):
+            exclusive.append(current_workload)
+        else:
+            packed.append((current_workload, cpus, need))
+
+    # Isolate the threads on the allocated cores; like set_cpus, the remaining threads of the cores are not used
+    def allocate(workload: Workload, cpus: int, allocation: list):
+        isolate_cpus = [cpu for core in allocation for cpu in core.cpus][:cpus]
+        workload.isolate_cpus = ",".join(str(cpu) for cpu in isolate_cpus)
+        workload.background_cpus = background_cpus
+        workload.threads = cpus
+        workload.topology = topology.describe(isolate_cpus, cores)
+
+    free = list(pool)
+    pending = list(packed)
+    running = dict()
+    finished = queue.Queue()
+    while len(pending) > 0 or len(running) > 0:
+        for item in list(pending):
+            workload, cpus, need = item
+            allocation = topology.allocate(cores, need, free)
+            if len(allocation) == 0:
+                continue
+            free = [core for core in free if core not in allocation]
+            allocate(workload, cpus, allocation)
+            print(f"Running {workload.name} on {workload.topology}")
+
+            def run(workload=workload, allocation=allocation):
+                try:
+                    workload.prepare(workload.isolate_cpus)
+                    with open(f"results/experiment-{date}/{workload.name}/cores.txt", "w") as f:
+                        for core in allocation:
+                            f.write(f"{core.package}:{core.core}\t{','.join(str(cpu) for cpu in core.cpus)}\n")
+                    with open(f"logs/experiment-{date}/{workload.name}/info.txt", "a") as f:
+                        f.write(f"# packed on {workload.topology}\n\n")
+                    workload.run()
+                finally:
+                    finished.put((workload, allocation))
+
+            thread = threading.Thread(target=run)
+            running[workload.name] = thread
+            pending.remove(item)
+            thread.start()
+
+        workload, allocation = finished.get()
+        running.pop(workload.name).join()
+        free = [core for core in cores if core in free or core in allocation]
+
+    for current_workload in exclusive:
+        current_workload.prepare()
+        current_workload.run()
+        time.sleep(arguments["pause"])
+
+
 def help():
     print(
         "A tool for measuring energy consumption for specific workloads using different base images.\n",
@@ -272,15 +707,32 @@ def help():
         '   -b --base           Base image to monitor; can be used for multiple base images (e.g. -b ubuntu -b alpine)',
         "   -n --runs           Number of monitoring runs per base image (e.g. -n 30) (default 30)",
         "   -w --warmup         Warm up time (multiplied by the number of cores in seconds) (e.g. -w 30) (default 10)",
-        "   -p --pause          Pause time (s) (e.g. -p 60) (default 20)",
+        "   -p --pause          Pause time (s) (e.g. -p 60) (default 20); the upper bound with --adaptive-pause",
         "   -i --interval       Interval of monitoring (ms) (e.g. -i 100) (default 100)",
-        '   -m --monitor        Monitoring tool (e.g. -m "perf") (default "greenserver")',
+        '   -m --monitor        Monitoring tool; "greenserver", "perf" or "native" (powercap) (e.g. -m "perf") (default "greenserver")',
         "   --no-shuffle        Disables shuffle mode; regular order of monitoring base images",
         "   --cpus              Number of CPUs to isolate; will use threads on the same physical core (e.g. --cpus 2)",
         "   --cpuset            CPUs to isolate (e.g. --cpuset 0-1)",
         "   --all-images        Monitor all compatible base images (defined in the corresponding config file)",
         "   --all-workloads     Monitor all compatible workloads (defined in the workloads directory)",
         "   --full              Monitor all compatible workloads using all compatible base images",
+        "   --adaptive-pause    Pause until the package power and temperature are back at their idle baseline",
+        "   --pause-tolerance   Tolerance (%) above the idle baseline for --adaptive-pause (e.g. --pause-tolerance 10) (default 5)",
+        "   --build-jobs        Maximum number of images to build at the same time; 0 builds all at once (e.g. --build-jobs 2) (default 0)",
+        "   --rebuild           Build the images even if an image with the same content hash exists",
+        "   --sequential        Stop running an image once its comparisons are settled (at most --runs runs per image)",
+        "   --min-runs          Minimum number of runs per base image with --sequential (e.g. --min-runs 5) (default 10)",
+        "   --ci-target         Target width (%) of the 95% confidence interval of the mean energy differences (e.g. --ci-target 2) (default 5)",
+        "   --pack              Run workloads concurrently, each on its own physical cores (with --cpus or the cpus in the config)",
+        "   --pack-background   Number of physical cores kept for the background processes with --pack (default 1)",
+        "   --coordinator       Distribute the runs to workers instead of running them; address to listen on (e.g. --coordinator 0.0.0.0:50000)",
+        "   --workers           Number of local worker processes to start with --coordinator (for testing on a single host) (default 0)",
+        "   --worker            Run the runs handed out by the coordinator at the given address (e.g. --worker server1:50000)",
+        "   --host              Name the worker is logged with (default the hostname)",
+        "   --authkey           Key shared by the coordinator and workers (default $DOCKER_ENERGY_AUTHKEY)",
+        "   --resume            Continue an interrupted experiment with its stored queue (e.g. --resume 20230601T120000)",
+        "   --dry-run           Replace Docker and the monitoring tool with local fakes and log the harness overhead per run",
+        "   --dry-run-duration  Duration (s) of each fake workload run (e.g. --dry-run-duration 5) (default 1)",
         sep=os.linesep,
     )
 
@@ -292,6 +744,8 @@ def parse_args(argv):
     runs = 30 # number of runs per image
     warmup = 15 # (warmup * cores) seconds of warm up time
     pause = 20 # seconds of pause between runs
+    adaptive_pause = False # pause until the machine is back at idle (at most pause seconds)
+    pause_tolerance = 5 # % above the idle baseline that counts as idle
     interval = 100 # ms of interval between measurements
     monitor = "" # monitoring tool (default: greenserver)
     shuffle_mode = True # shuffle the order of the images
@@ -300,6 +754,21 @@ def parse_args(argv):
     cpuset = "" # cpus to dedicate only to the workload
     all_images = False # monitor all compatible images
     all_workloads = False # monitor all compatible workloads
+    build_jobs = 0 # maximum number of concurrent image builds (0: all images at once)
+    rebuild = False # build the images even if their content hash is unchanged
+    sequential = False # stop running an image once its estimates are settled
+    min_runs = 10 # minimum number of runs per image in sequential mode
+    ci_target = 5 # % of the mean energy the confidence intervals must be narrower than
+    pack = False # run workloads concurrently on disjoint physical cores
+    pack_background = 1 # physical cores for the background processes when packing
+    coordinator = "" # address to distribute the runs from
+    workers = 0 # number of local worker processes
+    worker = "" # address of the coordinator to run the runs of
+    host = socket.gethostname() # name of this worker
+    authkey = os.environ.get("DOCKER_ENERGY_AUTHKEY", "") # key shared by the coordinator and workers
+    resume = "" # id of the experiment to resume
+    dry_run = False # replace docker and the monitoring tool with fakes
+    dry_run_duration = 1 # seconds of each fake workload run
 
     # Get the arguments provided by the user
     opts, args = getopt.getopt(
@@ -321,12 +790,29 @@ def parse_args(argv):
             "pause=",
             "interval=",
             "monitor=",
+            "adaptive-pause",
+            "pause-tolerance=",
             "no-shuffle",
             "cpus=",
             "cpuset=",
             "all-images",
             "all-workloads",
             "full",
+            "build-jobs=",
+            "rebuild",
+            "sequential",
+            "min-runs=",
+            "ci-target=",
+            "pack",
+            "pack-background=",
+            "coordinator=",
+            "workers=",
+            "worker=",
+            "host=",
+            "authkey=",
+            "resume=",
+            "dry-run",
+            "dry-run-duration=",
             "help",
         ],
     )
@@ -361,6 +847,13 @@ def parse_args(argv):
                 pause = int(arg)
             except ValueError:
                 print(f"Pause time must be an integer; using default value ({pause})")
+        elif opt == "--adaptive-pause":
+            adaptive_pause = True
+        elif opt == "--pause-tolerance":
+            try:
+                pause_tolerance = float(arg)
+            except ValueError:
+                print(f"Pause tolerance must be a number; using default value ({pause_tolerance})")
         elif opt in ["-i", "--interval"]:
             try:
                 interval = int(arg)
@@ -389,6 +882,54 @@ def parse_args(argv):
         elif opt == "--full":
             all_images = True
             all_workloads = True
+        elif opt == "--build-jobs":
+            try:
+                build_jobs = max(0, int(arg))
+            except ValueError:
+                print(f"Number of build jobs must be an integer; using default value ({build_jobs})")
+        elif opt == "--rebuild":
+            rebuild = True
+        elif opt == "--sequential":
+            sequential = True
+        elif opt == "--min-runs":
+            try:
+                min_runs = int(arg)
+            except ValueError:
+                print(f"Minimum number of runs must be an integer; using default value ({min_runs})")
+        elif opt == "--ci-target":
+            try:
+                ci_target = float(arg)
+            except ValueError:
+                print(f"Confidence interval target must be a number; using default value ({ci_target})")
+        elif opt == "--pack":
+            pack = True
+        elif opt == "--pack-background":
+            try:
+                pack_background = max(1, int(arg))
+            except ValueError:
+                print(f"Number of background cores must be an integer; using default value ({pack_background})")
+        elif opt == "--coordinator":
+            coordinator = arg
+        elif opt == "--workers":
+            try:
+                workers = max(0, int(arg))
+            except ValueError:
+                print(f"Number of workers must be an integer; using default value ({workers})")
+        elif opt == "--worker":
+            worker = arg
+        elif opt == "--host":
+            host = arg
+        elif opt == "--authkey":
+            authkey = arg
+        elif opt == "--resume":
+            resume = arg.replace("experiment-", "", 1)
+        elif opt == "--dry-run":
+            dry_run = True
+        elif opt == "--dry-run-duration":
+            try:
+                dry_run_duration = float(arg)
+            except ValueError:
+                print(f"Dry-run duration must be a number; using default value ({dry_run_duration})")
         # Set help mode to true
         elif opt in ["-h", "--help"]:
             help_mode = True
@@ -400,6 +941,8 @@ def parse_args(argv):
         "runs": runs,
         "warmup": warmup,
         "pause": pause,
+        "adaptive_pause": adaptive_pause,
+        "pause_tolerance": pause_tolerance,
         "interval": interval,
         "monitor": monitor,
         "shuffle_mode": shuffle_mode,
@@ -407,6 +950,21 @@ def parse_args(argv):
         "cpuset": cpuset,
         "all_images": all_images,
         "all_workloads": all_workloads,
+        "build_jobs": build_jobs,
+        "rebuild": rebuild,
+        "sequential": sequential,
+        "min_runs": min_runs,
+        "ci_target": ci_target,
+        "pack": pack,
+        "pack_background": pack_background,
+        "coordinator": coordinator,
+        "workers": workers,
+        "worker": worker,
+        "host": host,
+        "authkey": authkey,
+        "resume": resume,
+        "dry_run": dry_run,
+        "dry_run_duration": dry_run_duration,
         "help_mode": help_mode,
     }
     return arguments
@@ -421,6 +979,25 @@ def main(argv):
         help()
         return
 
+    # Run the runs handed out by a coordinator; the experiment is configured by the coordinator
+    if arguments["worker"] != "":
+        return run_worker(arguments)
+
+    # Continue an interrupted experiment with its stored arguments and workloads
+    workloads = None
+    date = datetime.now().strftime("%Y%m%dT%H%M%S")
+    if arguments["resume"] != "":
+        experiment = checkpoint.load_experiment(arguments["resume"])
+        if experiment is None:
+            print(f"Experiment {arguments['resume']} cannot be resumed: {checkpoint.get_experiment_file(arguments['resume'])} not found")
+            return
+        stored, workloads = experiment
+        arguments = {**stored, **{key: arguments[key] for key in checkpoint.LOCAL_ARGUMENTS}}
+        date = arguments["resume"]
+        if arguments["coordinator"] != "":
+            print("Experiments with workers cannot be resumed")
+            return
+
     # If no specific workload is selected, monitor all available workloads
     if len(arguments["workloads"]) == 0 and not arguments["all_workloads"]:
         print("No workload provided, all workloads will be used")
@@ -431,90 +1008,61 @@ def main(argv):
         print("No base images provided, all images will be used")
         arguments["all_images"] = True
 
-    workloads = get_workloads("workloads")
+    # Replace docker, sysbench and ts with the fakes, and use the fake monitor
+    if arguments["dry_run"]:
+        set_dry_run(arguments["dry_run_duration"])
+        arguments["monitor"] = "fake"
 
-    # If specific workloads are selected, monitor only those workloads if they are available
-    if not arguments["all_workloads"]:
-        workloads = set(workloads).intersection(arguments["workloads"])
-    
-    date = datetime.now().strftime("%Y%m%dT%H%M%S")
+    # The samples of perf do not have the energy columns of greenserver
+    if arguments["sequential"] and arguments["monitor"] == "perf":
+        print("Sequential stopping needs the greenserver or native monitor; running all runs")
+        arguments["sequential"] = False
 
-    for workload in workloads:
-        config = get_workload_config(workload)
+    if workloads is None:
+        workloads = get_workloads("workloads")
 
-        # Skip development workloads
-        if "development" in config.keys() and config["development"]:
-            continue
+        # If specific workloads are selected, monitor only those workloads if they are available
+        if not arguments["all_workloads"]:
+            workloads = set(workloads).intersection(arguments["workloads"])
+        workloads = list(workloads)
 
-        # First set the cpuset
-        if arguments["cpuset"] != "":
-            cpuset = arguments["cpuset"]
-            reserve = []
-        # If no cpuset is provided, use the number of cpus
-        elif arguments["cpus"] != 0:
-            cpuset, reserve = set_cpus(arguments["cpus"])
-        # If no cpus are provided, use the cpus from the config
-        elif "cpus" in config.keys() and type(config["cpus"]) is int:
-            cpuset, reserve = set_cpus(config["cpus"])
-        # If no cpus are provided in the config, use all cpus
-        else:
-            cpuset = ""
-            reserve = []
+        # Store the experiment, so it can be resumed in the same order if it is interrupted
+        checkpoint.save_experiment(date, arguments, workloads)
 
-        isolate_cpus, background_cpus, threads = set_cpuset(cpuset, reserve)
+    # Log the sockets, NUMA nodes and cores the cpus are allocated from
+    topology.log_topology(f"logs/experiment-{date}/topology.tsv", topology.get_cores())
 
-        if "clients" in config.keys() and type(config["clients"]) is int:
-            clients = abs(config["clients"])
-        else:
-            clients = 0
-
-        # Use all images if all_images is enabled, otherwise use the provided images (if they exist)
-        images = set(config["images"]) if "images" in config.keys() else set()
-
-        if not arguments["all_images"]:
-            images = images.intersection(arguments["images"])
-
-        # If the workload is not a Docker workload, use the command from the config
-        docker = True
-        command = ""
-        if "docker" in config.keys() and not config["docker"]:
-            if "command" in config.keys() and type(config["command"]) is str:
-                docker = False
-                command = config["command"]
-                images = set(["machine"])
-            else:
-                continue
+    # The workers record their own idle baseline (see run_worker)
+    if arguments["coordinator"] != "":
+        return run_coordinator(arguments, workloads, date)
+
+    if arguments["pack"]:
+        if arguments["cpuset"] != "":
+            print("Workloads cannot be packed on a single cpuset; running them one after another")
         else:
-            if len(images) == 0:
-                print(f"No correct images provided for workload {workload}")
-                continue
+            # The package never returns to idle while other workloads run
+            if arguments["adaptive_pause"]:
+                print("The adaptive pause is not used when packing workloads")
+            return run_packed(arguments, workloads, date)
 
-        # Create the queue of images for the workload
-        queue = init_queue(images, arguments["runs"], arguments["shuffle_mode"])
-
-        # Create the workload
-        current_workload = Workload(
-            date,
-            workload,
-            images,
-            queue,
-            isolate_cpus,
-            background_cpus,
-            threads,
-            arguments["warmup"],
-            arguments["pause"],
-            arguments["interval"],
-            clients,
-            arguments["monitor"],
-            docker,
-            command,
-        )
+    # Record the idle baseline before anything runs, so each pause can end once the machine is back at idle
+    cooldown = None
+    if arguments["adaptive_pause"]:
+        cooldown = init_cooldown(arguments["pause_tolerance"], arguments["dry_run"])
+
+    for workload in workloads:
+        current_workload = get_workload(arguments, workload, date, cooldown)
+        if current_workload is None or current_workload.is_finished():
+            continue
 
         # Run the workload
         current_workload.prepare()
         current_workload.run()
         # current_workload.remove()
-        time.sleep(arguments["pause"])
+        if cooldown is not None:
+            cooldown.wait(arguments["pause"])
+        else:
+            time.sleep(arguments["pause"])
 
 
 
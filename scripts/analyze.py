@@ -7,7 +7,6 @@ from scipy import stats
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
 
 import scikit_posthocs as sp
-from cliffs_delta import cliffs_delta
 
 import matplotlib.pyplot as plt
 
@@ -16,8 +15,11 @@ import matplotlib.ticker as ticker
 from matplotlib.lines import Line2D
 import seaborn as sns
 import scripts.parse as parse
+import scripts.resample as resample
 
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 from pathlib import Path
 
@@ -203,14 +205,149 @@ def dunn_test(images: dict, labels: list, parts: list):
     # return parts, tukey
 
 
+# Type of the values that are not timestamps, run numbers or energy counters (see get_dtypes)
+FLOAT_TYPE = np.float32
+
+# Directory of the figures in batch mode (figures are shown interactively if empty) and their formats
+FIGURE_DIRECTORY = ""
+FIGURE_FORMATS = ["png"]
+
+# Columns of the run samples used by plot_median
+SAMPLE_COLUMNS = [
+    "Time",
+    "Delta",
+    "CORE0_ENERGY (J)",
+    "CORE0_VOLT (V)",
+    "CORE0_PSTATE",
+    "CORE0_FREQ (MHZ)",
+] + [f"CPU{cpu}_USAGE (%)" for cpu in range(0, 23)]
+
+# Display names of the images whose directory name lost the tag (see measure.py)
+IMAGE_NAMES = {
+    "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125": "node:16@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125",
+    "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1": "node:16-alpine@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1",
+}
+
+# Thresholds of the magnitude of Cohen's d and Cliff's delta (negligible, small, medium; large otherwise)
+COHEN_THRESHOLDS = [0.2, 0.5, 0.8]
+CLIFF_THRESHOLDS = [0.147, 0.33, 0.474]
+MAGNITUDES = np.array(["negligible", "small", "medium", "large"])
+
+EFFECT_SIZE_COLUMNS = [
+    "IMAGE",
+    "OTHER",
+    "PART",
+    "RUNS",
+    "OTHER RUNS",
+    "COHEN D",
+    "COHEN MAGNITUDE",
+    "CLIFF DELTA",
+    "CLIFF MAGNITUDE",
+]
+
+
+def get_image_name(label: str):
+    # The image without its digest
+    label = IMAGE_NAMES.get(label, label)
+    return label[: label.index("@")] if "@" in label else label
+
+
 def calculate_d(x, y):
-    # Compute the Cohen's d effect size
+    """Computes Cohen's d (with the pooled standard deviation) of every column of two samples.
+
+    Args:
+        x: The first sample, as a (runs, parts) matrix (or a single part).
+        y: The second sample, with the same parts.
+
+    Returns:
+        The effect size of every part.
+    """
     nx = len(x)
     ny = len(y)
     dof = nx + ny - 2
-    return (np.mean(x) - np.mean(y)) / np.sqrt(
-        ((nx - 1) * np.std(x, ddof=1) ** 2 + (ny - 1) * np.std(y, ddof=1) ** 2) / dof
-    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.mean(x, axis=0) - np.mean(y, axis=0)) / np.sqrt(
+            ((nx - 1) * np.var(x, axis=0, ddof=1) + (ny - 1) * np.var(y, axis=0, ddof=1)) / dof
+        )
+
+
+def calculate_delta(x, y):
+    """Computes Cliff's delta of every column of two samples from their ranks (Mann-Whitney U).
+
+    The delta is 2U / (nx * ny) - 1, where U counts the pairs in which x is greater than y (ties count half),
+    so each part takes O((nx + ny) log(nx + ny)) instead of comparing every pair of values.
+
+    Args:
+        x: The first sample, as a (runs, parts) matrix (or a single part).
+        y: The second sample, with the same parts.
+
+    Returns:
+        The effect size of every part.
+    """
+    nx = len(x)
+    ny = len(y)
+    ranks = stats.rankdata(np.concatenate([x, y]), axis=0)
+    u = ranks[:nx].sum(axis=0) - nx * (nx + 1) / 2
+    return 2 * u / (nx * ny) - 1
+
+
+def get_magnitude(values, thresholds: list):
+    return MAGNITUDES[np.searchsorted(thresholds, np.abs(values), side="right")]
+
+
+def effect_sizes(images: dict, labels: list, parts: list):
+    """Computes Cohen's d and Cliff's delta of every part for every pair of images.
+
+    Every pair is computed for all parts at once; a positive value indicates that the second image (OTHER)
+    performs better than the first (IMAGE).
+
+    Args:
+        images: The runs of every image.
+        labels: The images to compare, in order.
+        parts: The parts (columns) to compare.
+
+    Returns:
+        A DataFrame with one row per pair of images and part.
+    """
+    values = resample.get_values(images, labels, parts)
+    pairs = list()
+    for i in range(len(labels)):
+        for j in range(i + 1, len(labels)):
+            x = values[labels[i]]
+            y = values[labels[j]]
+            d = calculate_d(x, y)
+            delta = calculate_delta(x, y)
+            pairs.append(
+                pd.DataFrame(
+                    {
+                        "IMAGE": labels[i],
+                        "OTHER": labels[j],
+                        "PART": parts,
+                        "RUNS": len(x),
+                        "OTHER RUNS": len(y),
+                        "COHEN D": d,
+                        "COHEN MAGNITUDE": get_magnitude(d, COHEN_THRESHOLDS),
+                        "CLIFF DELTA": delta,
+                        "CLIFF MAGNITUDE": get_magnitude(delta, CLIFF_THRESHOLDS),
+                    }
+                )
+            )
+    if len(pairs) == 0:
+        return pd.DataFrame(columns=EFFECT_SIZE_COLUMNS)
+    return pd.concat(pairs, ignore_index=True)
+
+
+def print_pairs(df: pd.DataFrame, columns: list):
+    df = df.assign(IMAGE=df["IMAGE"].map(get_image_name), OTHER=df["OTHER"].map(get_image_name))
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(f"{df[['IMAGE', 'OTHER', 'PART'] + columns].to_string(index=False)}\n")
+
+
+def write_effect_sizes(df: pd.DataFrame, file: str):
+    if os.path.dirname(file) != "":
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+    df.to_csv(file, sep="\t", index=False)
+    print(f"Effect sizes written to {file}")
 
 
 def cohen_d(images: dict, labels: list, parts: list):
@@ -225,24 +362,9 @@ def cohen_d(images: dict, labels: list, parts: list):
     print(
         "A positive value indicates that the second image performs better than the first.\n"
     )
-    # cohen = list()
-    # Perform the Cohen's d test for each part between the base images
-    for i in range(len(labels)):
-        for j in range(i + 1, len(labels)):
-            header = ["part", "d"]
-            data = list()
-            print("Cohen's d effect size for " + labels[i] + " and " + labels[j] + ":")
-            for part in parts:
-                d = calculate_d(
-                    images[labels[i]][part].values.astype(float),
-                    images[labels[j]][part].values.astype(float),
-                )
-                data.append([part, d])
-                # print("\t" + part + ": " + str(d))
-            # cohen.append(c)
-            print(f"{pd.DataFrame(data, columns=header)}\n")
-
-    # return parts, cohen
+    df = effect_sizes(images, labels, parts)
+    print_pairs(df, ["COHEN D", "COHEN MAGNITUDE"])
+    return df
 
 
 def cliff_d(images: dict, labels: list, parts: list):
@@ -257,52 +379,60 @@ def cliff_d(images: dict, labels: list, parts: list):
     print(
         "A positive value indicates that the second image performs better than the first.\n"
     )
-    # cohen = list()
-    # Perform the Cohen's d test for each part between the base images
-    for i in range(len(labels)):
-        first_label = labels[i]
-        if (
-            labels[i]
-            == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-        ):
-            first_label = "node:16@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-        elif (
-            labels[i]
-            == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
-        ):
-            first_label = "node:16-alpine@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
-        for j in range(i + 1, len(labels)):
-            header = ["part", "d", "result"]
-            data = list()
-
-            second_label = labels[j]
-            if (
-                labels[j]
-                == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-            ):
-                second_label = "node:16@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-            elif (
-                labels[j]
-                == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
-            ):
-                second_label = "node:16-alpine@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
+    df = effect_sizes(images, labels, parts)
+    print_pairs(df, ["CLIFF DELTA", "CLIFF MAGNITUDE"])
+    return df
 
-            print(
-                "Cliff's delta effect size for "
-                + first_label[: first_label.index("@")]
-                + " and "
-                + second_label[: second_label.index("@")]
-                + ":"
-            )
-            for part in parts:
-                d, res = cliffs_delta(
-                    images[labels[i]][part].values.astype(float),
-                    images[labels[j]][part].values.astype(float),
-                )
-                data.append([part, d, res])
-                # print("\t" + part + ": " + str(d))
-            # cohen.append(c)
-            print(f"{pd.DataFrame(data, columns=header)}\n")
+
+def effect_size(images: dict, labels: list, parts: list, output: str = ""):
+    print(
+        "============================== Effect size ================================="
+    )
+
+    if len(labels) < 2:
+        print("Not enough data to perform the test.")
+        return
+
+    print(
+        "A positive value indicates that the second image performs better than the first.\n"
+    )
+    df = effect_sizes(images, labels, parts)
+    print_pairs(df, ["COHEN D", "COHEN MAGNITUDE", "CLIFF DELTA", "CLIFF MAGNITUDE"])
+    if output != "":
+        write_effect_sizes(df, output)
+    return df
+
+
+def bootstrap_test(images: dict, labels: list, parts: list, replicates: int, seed: int, workers: int):
+    print(
+        "============================== Bootstrap intervals ================================="
+    )
+
+    seed = resample.get_seed(seed)
+    print(f"{replicates} replicates, {resample.CONFIDENCE * 100:g}% percentile intervals (seed {seed})\n")
+    df = resample.bootstrap_intervals(
+        images, labels, parts, replicates, resample.CONFIDENCE, seed, workers
+    )
+    df = df.assign(IMAGE=df["IMAGE"].map(get_image_name))
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(f"{df.to_string(index=False)}\n")
+    return df
+
+
+def permutation_test(images: dict, labels: list, parts: list, replicates: int, seed: int, workers: int):
+    print(
+        "============================== Permutation test ================================="
+    )
+
+    if len(labels) < 2:
+        print("Not enough data to perform the test.")
+        return
+
+    seed = resample.get_seed(seed)
+    print(f"{replicates} permutations of the difference between the means (seed {seed})\n")
+    df = resample.permutation_tests(images, labels, parts, replicates, seed, workers)
+    print_pairs(df, ["DIFFERENCE", "P-VALUE"])
+    return df
 
 
 def statistics(images: dict, labels: list, parts: list):
@@ -315,46 +445,50 @@ def statistics(images: dict, labels: list, parts: list):
             )
 
 
+def draw_boxplot(images: dict, labels: list, part: str):
+    label_names = list()
+    compare = list()
+    node_compare = list()
+    node_label_names = list()
+    for label in labels:
+        if (
+            label
+            == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
+        ):
+            node_label_names.insert(0, "node:16")
+            node_compare.insert(0, images[label][part].values.astype(float))
+        elif (
+            label
+            == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
+        ):
+            node_label_names.append("node:16-alpine")
+            node_compare.append(images[label][part].values.astype(float))
+        else:
+            try:
+                label_names.append(label[: label.index("@")])
+            except:
+                label_names.append(label)
+            compare.append(images[label][part].values.astype(float))
+    compare = compare + node_compare
+    label_names = label_names + node_label_names
+    plt.figure(figsize=(9, 7))
+    # plt.boxplot(compare)
+    # plt.violinplot(compare)
+    sns.boxplot(data=compare)
+    plt.xticks(range(0, len(labels)), label_names)
+    plt.title(part)
+    # try:
+    #     plt.title(part.rsplit("_", 1)[1])
+    # except:
+    #     plt.title(part)
+    # print(labels)
+    # print(label_names)
+
+
 def plot(images: dict, labels: list, parts: list):
     # Boxplots
     for part in parts:
-        label_names = list()
-        compare = list()
-        node_compare = list()
-        node_label_names = list()
-        for label in labels:
-            if (
-                label
-                == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-            ):
-                node_label_names.insert(0, "node:16")
-                node_compare.insert(0, images[label][part].values.astype(float))
-            elif (
-                label
-                == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
-            ):
-                node_label_names.append("node:16-alpine")
-                node_compare.append(images[label][part].values.astype(float))
-            else:
-                try:
-                    label_names.append(label[: label.index("@")])
-                except:
-                    label_names.append(label)
-                compare.append(images[label][part].values.astype(float))
-        compare = compare + node_compare
-        label_names = label_names + node_label_names
-        plt.figure(figsize=(9, 7))
-        # plt.boxplot(compare)
-        # plt.violinplot(compare)
-        sns.boxplot(data=compare)
-        plt.xticks(range(0, len(labels)), label_names)
-        plt.title(part)
-        # try:
-        #     plt.title(part.rsplit("_", 1)[1])
-        # except:
-        #     plt.title(part)
-        # print(labels)
-        # print(label_names)
+        draw_boxplot(images, labels, part)
         plt.show()
 
     # for label in labels:
@@ -402,7 +536,8 @@ def plot(images: dict, labels: list, parts: list):
     #     plt.show()
 
 
-def plot_distribution(images: dict, labels: list, parts: list):
+def get_distribution_data(images: dict, labels: list):
+    # The runs of all images in one dataframe, with the image name in the "Image" column
     df = pd.DataFrame()
     df_node = pd.DataFrame()
     for label in labels:  # in range(len(labels)):
@@ -426,32 +561,40 @@ def plot_distribution(images: dict, labels: list, parts: list):
                 df_label["Image"] = label
             df = pd.concat([df, df_label], ignore_index=True)
 
-    df = pd.concat([df, df_node], ignore_index=True)
-    for part in parts:
-        # for label in labels:
-        # ax = sns.displot(images[label], x="CORE0_ENERGY (J)", kind="kde")
-        # plt.title(label[: label.index("@")])
+    return pd.concat([df, df_node], ignore_index=True)
 
-        # ax.set(xlim=(930, 1080))
-        # ax.set(ylim=(0, 0.05))
-
-        # plt.figure(figsize=(15, 7))
-        # sns.set(rc={"figure.figsize": (15, 7)})
-        g = sns.displot(
-            data=df,
-            x=part,
-            hue="Image",
-            kind="kde",
-            height=7,
-            aspect=1,
-        )
-        # if part == "CORE0_ENERGY (J)":
-        #     g.set(xlabel="ENERGY (J)")
-        # elif part == "ELAPSED_TIME (s)":
-        #     g.set(xlabel="TIME (s)")
-        # g = sns.displot(data=df, x=part, hue="Image", height=7, aspect=2)
-        # plt.title(f"{part.rsplit('_', 1)[1]} distribution", y=0.95)
-        # plt.legend(loc="upper right")
+
+def draw_distribution(df: pd.DataFrame, part: str):
+    # for label in labels:
+    # ax = sns.displot(images[label], x="CORE0_ENERGY (J)", kind="kde")
+    # plt.title(label[: label.index("@")])
+
+    # ax.set(xlim=(930, 1080))
+    # ax.set(ylim=(0, 0.05))
+
+    # plt.figure(figsize=(15, 7))
+    # sns.set(rc={"figure.figsize": (15, 7)})
+    g = sns.displot(
+        data=df,
+        x=part,
+        hue="Image",
+        kind="kde",
+        height=7,
+        aspect=1,
+    )
+    # if part == "CORE0_ENERGY (J)":
+    #     g.set(xlabel="ENERGY (J)")
+    # elif part == "ELAPSED_TIME (s)":
+    #     g.set(xlabel="TIME (s)")
+    # g = sns.displot(data=df, x=part, hue="Image", height=7, aspect=2)
+    # plt.title(f"{part.rsplit('_', 1)[1]} distribution", y=0.95)
+    # plt.legend(loc="upper right")
+
+
+def plot_distribution(images: dict, labels: list, parts: list):
+    df = get_distribution_data(images, labels)
+    for part in parts:
+        draw_distribution(df, part)
         plt.show()
 
 
@@ -482,224 +625,354 @@ def plot_correlation(images: dict, labels: list, parts: list):
     # print(df)
 
 
+def draw_median(directory: str, images: dict, label: str, part: str):
+    # The samples of the median run of an image
+    # if (
+    #     label
+    #     != "alpine@sha25625fad2a32ad1f6f510e528448ae1ec69a28ef81916a004d3629874104f8a7f70"
+    # ):
+    #     continue
+    # compare.append(images[label][part].values.astype(float))
+    sorted = images[label].sort_values(part)
+    # print(sorted)
+    middle = (len(sorted) - 1) // 2
+    middle = 28
+    index = sorted["RUN"].iloc[middle]
+    # index = sorted["RUN"].iloc[6]
+    # index = sorted["RUN"].iloc[24]
+    # print(index)
+
+    base, df = read_tsv(f"{directory}/{label}/run-{index}.tsv", SAMPLE_COLUMNS)
+    df_samples = pd.DataFrame()
+    df_samples = parse.get_greenserver_time(df_samples, df)
+    df_samples = parse.get_greenserver_average_power(df_samples, df, [0])
+    df_samples = parse.get_greenserver_cpu_usage(df_samples, df, range(0, 23))
+    df_samples["CORE0_VOLT (V)"] = df["CORE0_VOLT (V)"].copy()
+    df_samples["CORE0_PSTATE"] = df["CORE0_PSTATE"].copy()
+    df_samples["CORE0_FREQ (MHZ)"] = df["CORE0_FREQ (MHZ)"].copy()
+    # df_samples["GPU_POWER (W)"] = df["GPU_POWER (W)"].copy()
+    # df_samples["GPU_USAGE"] = df["GPU_USAGE (%)"].copy()
+    # x_value = "INTERVAL_ELAPSED_TIME (s)"
+    x_value = "ELAPSED_TIME (s)"
+    # y_value1 = f"CORE0_AVERAGE_POWER (W)"
+    y_value1 = f"CORE0_ENERGY_SAMPLE (J/interval)"
+    # y_value1 = f"GPU_POWER (W)"
+    # y_value1 = f"CORE0_FREQ (MHZ)"
+    # y_value1 = f"CORE0_ENERGY_SAMPLE_DIFF"
+    # y_value1 = f"CORE0_PSTATE"
+    y_value1 = f"CPU0_USAGE_DELTA"
+    # y_value1 = f"GPU_USAGE"
+    # y_value3 = f"CPU12_USAGE_DELTA"
+    # y_value1 = "CORE0_VOLT (V)"
+    df_smooth = pd.DataFrame()
+    # Keep the peaks of the plotted series instead of every 10th sample
+    df_smooth = df_samples.iloc[parse.downsample(df_samples[y_value1].values)].copy()
+
+    # print(df_samples)
+
+    # break
+
+    df_smooth[f"CORE0_ENERGY_SAMPLE_DIFF"] = (
+        df_smooth[f"CORE0_ENERGY_SAMPLE (J/interval)"]
+        .diff()
+        .fillna(0)
+        .div(df_smooth["TIME_DELTA (s)"], axis=0)
+        .fillna(0)
+    )
+
+    # r = stats.pearsonr(df_samples[y_value1], df_samples[y_value2])
+    # print(f"{label[: label.index('@')]}: {r}")
+    # ax = sns.relplot(
+    #     data=df_samples,
+    #     x=y_value1,
+    #     y=y_value2,
+    # )
+    # ax.set(ylim=(5000, 6000))
+    # plt.title(label[: label.index("@")])
+    # plt.show()
+
+    # print(df_samples)
+    # print(df_samples["CORE0_AVERAGE_POWER (W)"].sum())
+    ax = sns.lineplot(
+        x=x_value,
+        y=y_value1,
+        # data=df_samples.iloc[::35, :],
+        # data=df_samples,
+        data=df_smooth,
+        # )
+        # color="b",
+    )
+    # ax = sns.lineplot(
+    #     x=x_value,
+    #     y="CORE0_VOLT (V)",
+    #     data=df_samples,
+    #     # )
+    #     # color="b",
+    # )
+    # ax2 = ax.twinx()
+    # sns.lineplot(
+    #     x=x_value,
+    #     y=y_value2,
+    #     data=df_samples,
+    #     ax=ax2,
+    #     color="g",
+    # )
+    # sns.lineplot(
+    #     x=x_value,
+    #     y=y_value3,
+    #     data=df_samples,
+    #     ax=ax2,
+    #     color="y",
+    # )
+    # ax.legend(
+    #     handles=[
+    #         # Line2D([], [], marker="_", color="b", label="CORE0_AVERAGE_POWER (W)"),
+    #         Line2D([], [], marker="_", color="b", label=y_value1),
+    #         Line2D([], [], marker="_", color="g", label=y_value2),
+    #         # Line2D([], [], marker="_", color="y", label=y_value3),
+    #     ]
+    # )
+    # ax = sns.lineplot(
+    #     x=x_value,
+    #     y=y_value,
+    #     data=df_samples,
+    #     # color="b",
+    # )
+    # plt.title(
+    #     f"Voltage over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
+    # )
+    if (
+        label
+        == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
+    ):
+        plt.title(
+            f"Energy over time for node:16 - run {index} ({int(sorted[part].iloc[middle])} J)"
+        )
+    elif (
+        label
+        == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
+    ):
+        plt.title(
+            f"Energy over time for node:16-alpine - run {index} ({int(sorted[part].iloc[middle])} J)"
+        )
+    else:
+        # plt.title(
+        #     f"Energy over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
+        # )
+        try:
+            plt.title(
+                f"CPU usage over time for {label[: label.index('@')]} - run {index} ({int(sorted['CORE0_ENERGY (J)'].iloc[middle])} J)"
+            )
+        except:
+            plt.title(
+                f"Energy over time for {label} - run {index} ({int(sorted['ENERGY (J)'].iloc[middle])} J)"
+            )
+    # plt.title(
+    #     f"Freq over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
+    # )
+    # ax2.set(xlim=(-0.00000011, 0.00000051))
+    # ax.set(xlim=(-10, 490), ylim=(-0.1, 1.7))
+    # plt.title(
+    #     f"P-state/usage over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
+    # )
+    # break
+
+    # ax.set(xlabel="TIME(s)", ylabel="ENERGY PER SAMPLE (J/100ms)")
+    # for i in range(23):
+    #     ax = sns.lineplot(
+    #         x=x_value,
+    #         y=f"CPU{i}_USAGE_DELTA",
+    #         # data=df_samples.iloc[::35, :],
+    #         data=df_samples,
+    #         # data=df_smooth
+    #         # )
+    #         # color="b",
+    #     )
+    #     plt.show()
+
+
 def plot_median(directory: str, images: dict, labels: list, parts: list):
     for part in parts:
         for i in range(len(labels)):
             label = labels[i]
-            # if (
-            #     label
-            #     != "alpine@sha25625fad2a32ad1f6f510e528448ae1ec69a28ef81916a004d3629874104f8a7f70"
-            # ):
-            #     continue
-            # compare.append(images[label][part].values.astype(float))
-            sorted = images[label].sort_values(part)
-            # print(sorted)
-            middle = (len(sorted) - 1) // 2
-            middle = 28
-            index = sorted["RUN"].iloc[middle]
-            # index = sorted["RUN"].iloc[6]
-            # index = sorted["RUN"].iloc[24]
-            # print(index)
-
-            base, df = read_tsv(f"{directory}/{label}/run-{index}.tsv")
-            df_samples = pd.DataFrame()
-            df_samples = parse.get_greenserver_time(df_samples, df)
-            df_samples = parse.get_greenserver_average_power(df_samples, df, [0])
-            df_samples = parse.get_greenserver_cpu_usage(df_samples, df, range(0, 23))
-            df_samples["CORE0_VOLT (V)"] = df["CORE0_VOLT (V)"].copy()
-            df_samples["CORE0_PSTATE"] = df["CORE0_PSTATE"].copy()
-            df_samples["CORE0_FREQ (MHZ)"] = df["CORE0_FREQ (MHZ)"].copy()
-            # df_samples["GPU_POWER (W)"] = df["GPU_POWER (W)"].copy()
-            # df_samples["GPU_USAGE"] = df["GPU_USAGE (%)"].copy()
-            # x_value = "INTERVAL_ELAPSED_TIME (s)"
-            x_value = "ELAPSED_TIME (s)"
-            # y_value1 = f"CORE0_AVERAGE_POWER (W)"
-            y_value1 = f"CORE0_ENERGY_SAMPLE (J/interval)"
-            # y_value1 = f"GPU_POWER (W)"
-            # y_value1 = f"CORE0_FREQ (MHZ)"
-            # y_value1 = f"CORE0_ENERGY_SAMPLE_DIFF"
-            # y_value1 = f"CORE0_PSTATE"
-            y_value1 = f"CPU0_USAGE_DELTA"
-            # y_value1 = f"GPU_USAGE"
-            # y_value3 = f"CPU12_USAGE_DELTA"
-            # y_value1 = "CORE0_VOLT (V)"
-            df_smooth = pd.DataFrame()
-            df_smooth = df_samples.iloc[::10, :].copy()
-
-            # print(df_samples)
-
-            # break
-
-            df_smooth[f"CORE0_ENERGY_SAMPLE_DIFF"] = (
-                df_smooth[f"CORE0_ENERGY_SAMPLE (J/interval)"]
-                .diff()
-                .fillna(0)
-                .div(df_smooth["TIME_DELTA (s)"], axis=0)
-                .fillna(0)
-            )
-
-            # r = stats.pearsonr(df_samples[y_value1], df_samples[y_value2])
-            # print(f"{label[: label.index('@')]}: {r}")
-            # ax = sns.relplot(
-            #     data=df_samples,
-            #     x=y_value1,
-            #     y=y_value2,
-            # )
-            # ax.set(ylim=(5000, 6000))
-            # plt.title(label[: label.index("@")])
-            # plt.show()
-
-            # print(df_samples)
-            # print(df_samples["CORE0_AVERAGE_POWER (W)"].sum())
-            ax = sns.lineplot(
-                x=x_value,
-                y=y_value1,
-                # data=df_samples.iloc[::35, :],
-                data=df_samples,
-                # data=df_smooth
-                # )
-                # color="b",
-            )
-            # ax = sns.lineplot(
-            #     x=x_value,
-            #     y="CORE0_VOLT (V)",
-            #     data=df_samples,
-            #     # )
-            #     # color="b",
-            # )
-            # ax2 = ax.twinx()
-            # sns.lineplot(
-            #     x=x_value,
-            #     y=y_value2,
-            #     data=df_samples,
-            #     ax=ax2,
-            #     color="g",
-            # )
-            # sns.lineplot(
-            #     x=x_value,
-            #     y=y_value3,
-            #     data=df_samples,
-            #     ax=ax2,
-            #     color="y",
-            # )
-            # ax.legend(
-            #     handles=[
-            #         # Line2D([], [], marker="_", color="b", label="CORE0_AVERAGE_POWER (W)"),
-            #         Line2D([], [], marker="_", color="b", label=y_value1),
-            #         Line2D([], [], marker="_", color="g", label=y_value2),
-            #         # Line2D([], [], marker="_", color="y", label=y_value3),
-            #     ]
-            # )
-            # ax = sns.lineplot(
-            #     x=x_value,
-            #     y=y_value,
-            #     data=df_samples,
-            #     # color="b",
-            # )
-            # plt.title(
-            #     f"Voltage over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
-            # )
-            if (
-                label
-                == "node@sha256b04c99456868ce5e52dfdd3307b3d2a212deeec792b29692e19fb8b9078ae125"
-            ):
-                plt.title(
-                    f"Energy over time for node:16 - run {index} ({int(sorted[part].iloc[middle])} J)"
-                )
-            elif (
-                label
-                == "node@sha25682bcf77a5de631c6b19f4449ccec82bfbb7d8f6c94d6ae3bdf760ed67e080cb1"
-            ):
-                plt.title(
-                    f"Energy over time for node:16-alpine - run {index} ({int(sorted[part].iloc[middle])} J)"
-                )
-            else:
-                # plt.title(
-                #     f"Energy over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
-                # )
-                try:
-                    plt.title(
-                        f"CPU usage over time for {label[: label.index('@')]} - run {index} ({int(sorted['CORE0_ENERGY (J)'].iloc[middle])} J)"
-                    )
-                except:
-                    plt.title(
-                        f"Energy over time for {label} - run {index} ({int(sorted['ENERGY (J)'].iloc[middle])} J)"
-                    )
-            # plt.title(
-            #     f"Freq over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
-            # )
-            # ax2.set(xlim=(-0.00000011, 0.00000051))
-            # ax.set(xlim=(-10, 490), ylim=(-0.1, 1.7))
-            # plt.title(
-            #     f"P-state/usage over time for {label[: label.index('@')]} - run {index} ({int(sorted[part].iloc[middle])} J)"
-            # )
-            # break
-
-            # ax.set(xlabel="TIME(s)", ylabel="ENERGY PER SAMPLE (J/100ms)")
-            # for i in range(23):
-            #     ax = sns.lineplot(
-            #         x=x_value,
-            #         y=f"CPU{i}_USAGE_DELTA",
-            #         # data=df_samples.iloc[::35, :],
-            #         data=df_samples,
-            #         # data=df_smooth
-            #         # )
-            #         # color="b",
-            #     )
-            #     plt.show()
+            draw_median(directory, images, label, part)
             plt.show()
             break
         # break
 
 
-def plot_samples(directory: str):
-    images = [
+def read_samples(directory: str, image: str):
+    # The elapsed time and power of every run of an image
+    runs = list()
+    for file in sorted(parse.get_files(f"{directory}/{image}", "*.tsv")):
+        df = pd.read_csv(
+            file,
+            sep="\t",
+            usecols=["Delta", "CORE0_ENERGY (J)"],
+        )
+        df["ELAPSED_TIME (s)"] = df["Delta"].cumsum() / 1000
+        df["CORE0_POWER (W)"] = (
+            df["CORE0_ENERGY (J)"]
+            .diff()
+            .fillna(0)
+            .div(df["Delta"], axis=0)
+            .fillna(0)
+            .multiply(1000)
+        )
+        runs.append(df[["ELAPSED_TIME (s)", "CORE0_POWER (W)"]])
+    return runs
+
+
+def get_samples(directory: str, image: str):
+    # The power of the runs of an image, aggregated on a common time grid
+    return parse.resample_runs(read_samples(directory, image))
+
+
+def draw_samples(directory: str, image: str):
+    # The power of the runs of an image over time (mean and percentile band over the runs)
+    df_samples = get_samples(directory, image)
+
+    # print(df_samples)
+    x_value = "ELAPSED_TIME (s)"
+    y_value = "CORE0_POWER (W)"
+
+    with sns.axes_style("whitegrid"):
+        plt.figure(figsize=(10, 7))
+        parse.plot_band(df_samples, y_value, x_value, label=image)
+        plt.legend()
+        plt.title("Power usage over time")
+
+
+def samples(images_samples: dict):
+    for label, df in images_samples.items():
+        print(f"{label} ({df['RUNS'].max()} runs, {len(df)} points):")
+        print(f"{df}\n")
+
+
+def get_image_directories(directory: str):
+    return [
         image
-        for image in os.listdir(directory)
+        for image in sorted(os.listdir(directory))
         if os.path.isdir(f"{directory}/{image}")
     ]
 
-    sns.set_style("whitegrid")
-    plt.figure(figsize=(10, 7))
-    for image in images:
-        df_run = pd.DataFrame()
-        run = 0
-        df_label = images[label].copy()
-        files = parse.get_files(f"{directory}/{image}", "*.tsv")
-        for file in files:
-            df = pd.read_csv(
-                file,
-                sep="\t",
-                usecols=["Delta", "CORE0_ENERGY (J)", "ELAPSED_TIME (s)"],
-            )
-            df["CORE0_POWER (W)"] = (
-                df["CORE0_ENERGY (J)"]
-                .diff()
-                .fillna(0)
-                .div(df["Delta"], axis=0)
-                .fillna(0)
-                .multiply(1000)
-            )
-            df["Run"] = run
-            df["Image"] = image
-            run += 1
-
-            if df_run.empty:
-                df_run = df
-            else:
-                df_run = pd.concat([df_run, df], ignore_index=True)
-        try:
-            # print(df_run)
-            x_value = "ELAPSED_TIME (s)"
-            y_value = "CORE0_POWER (W)"
 
-            sns.lineplot(x=x_value, y=y_value, data=df_run, hue="Image")
-            plt.title("Power usage over time")
+def plot_samples(directory: str):
+    for image in get_image_directories(directory):
+        try:
+            draw_samples(directory, image)
             plt.show()
         except:
             print("Incorrect values for x and y")
 
 
+def get_file_name(name: str):
+    # A part or image as a file name (e.g. "CORE0_ENERGY (J)" as "CORE0_ENERGY_J")
+    return re.sub(r"[^A-Za-z0-9.@-]+", "_", name).strip("_")
+
+
+def save_figure(file: str):
+    """Saves the current figure in every figure format, and returns the files written."""
+    os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+    files = list()
+    for extension in FIGURE_FORMATS:
+        plt.savefig(f"{file}.{extension}", bbox_inches="tight")
+        files.append(f"{file}.{extension}")
+    return files
+
+
+def get_figure_tasks(workload: str, directory: str, images: dict, labels: list, parts: list, plots: list):
+    """Returns the figures of a workload to render in batch mode, one task per figure.
+
+    Args:
+        workload: The name of the workload (the directory of its figures).
+        directory: The results directory of the workload.
+        images: The runs of every image.
+        labels: The images.
+        parts: The parts to plot.
+        plots: The selected tests and plots (plot, plot-distribution, plot-median, plot-samples).
+
+    Returns:
+        A list of (kind, workload, directory, images, labels, name) tuples; images only has the columns
+        each figure needs.
+    """
+    tasks = list()
+    for part in parts:
+        columns = {label: images[label][[part]] for label in labels}
+        if "plot" in plots:
+            tasks.append(("boxplot", workload, directory, columns, labels, part))
+        if "plot-distribution" in plots:
+            tasks.append(("distribution", workload, directory, columns, labels, part))
+        if "plot-median" in plots and directory != "":
+            tasks.append(("median", workload, directory, images, labels[:1], part))
+    if "plot-samples" in plots and directory != "":
+        for image in get_image_directories(directory):
+            tasks.append(("samples", workload, directory, None, None, image))
+    return tasks
+
+
+def render_figure(kind: str, workload: str, directory: str, images: dict, labels: list, name: str):
+    """Draws one figure with the non-interactive backend and saves it to the figure directory.
+
+    Returns:
+        The files written and an error message (None if the figure was rendered).
+    """
+    try:
+        if kind == "boxplot":
+            draw_boxplot(images, labels, name)
+        elif kind == "distribution":
+            draw_distribution(get_distribution_data(images, labels), name)
+        elif kind == "median":
+            draw_median(directory, images, labels[0], name)
+        elif kind == "samples":
+            draw_samples(directory, name)
+        return save_figure(os.path.join(FIGURE_DIRECTORY, workload, f"{kind}-{get_file_name(name)}")), None
+    except Exception as e:
+        return list(), f"{os.path.join(workload, kind)} {name}: {e}"
+    finally:
+        plt.close("all")
+
+
+def set_figures(directory: str, formats: list = None):
+    global FIGURE_DIRECTORY, FIGURE_FORMATS
+    FIGURE_DIRECTORY = directory
+    if formats is not None:
+        FIGURE_FORMATS = formats
+    if directory != "":
+        plt.switch_backend("Agg")
+
+
+def init_renderer(figure_directory: str, formats: list, cache_directory: str, points: int):
+    set_figures(figure_directory, formats)
+    parse.set_cache(cache_directory)
+    parse.set_plot_points(points)
+
+
+def render_figures(tasks: list, workers: int = 1):
+    """Renders figures in batch mode, in parallel worker processes if there are several workers.
+
+    Args:
+        tasks: The figures to render (see get_figure_tasks).
+        workers: The number of processes.
+    """
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_renderer,
+            initargs=(FIGURE_DIRECTORY, FIGURE_FORMATS, parse.CACHE_DIRECTORY, parse.PLOT_POINTS),
+        ) as executor:
+            results = list(executor.map(render_figure, *zip(*tasks)))
+    else:
+        results = [render_figure(*task) for task in tasks]
+
+    written = 0
+    for files, error in results:
+        if error is not None:
+            print(f"Could not render {error}")
+        written += len(files)
+    print(f"{written} figures written to {FIGURE_DIRECTORY}")
+
+
 def analyze(images: dict, images_samples: dict, labels: list, parts: list):
     normal = shapiro_test(images, labels, parts)
     significance = anova_test(images, labels, parts)
@@ -709,19 +982,59 @@ def analyze(images: dict, images_samples: dict, labels: list, parts: list):
     return normal, significance, tukey, cohen
 
 
-def read_tsv(file: str):
+def read_tsv(file: str, columns: list = None):
     base = Path(file).stem
+    return base, parse.read_cached(
+        file, "summary", lambda columns: read_summary(file, columns), columns
+    )
+
+
+def get_dtypes(columns: list):
+    # The timestamps, run numbers and energy counters keep their type (the counters of the runs need double
+    # precision); the other values are stored in single precision
+    return {
+        column: FLOAT_TYPE
+        for column in columns
+        if column not in ["Time", "RUN"] and not column.endswith("ENERGY (J)")
+    }
+
+
+def read_summary(file: str, columns: list = None):
+    """Reads a summary (or run) file, parsing only the given columns.
+
+    Args:
+        file: The file to read.
+        columns: The columns to read (all columns if None).
+
+    Returns:
+        A dataframe with the columns in the order of the file.
+    """
     with open(file) as f:
         # Read the first line for the base image name
         # base = f.readline().rstrip().split("\t")[0]
         # Read the second line for the column names
         parts = f.readline().rstrip().split("\t")
+        start = f.tell()
         data = f.readline().rstrip().split("\t")
         if len(data) != len(parts):
             raise ValueError(
                 "The header length in the file does not match the number of columns."
             )
-    return base, pd.read_csv(file, sep="\t", skiprows=1, names=parts)
+        for column in columns or list():
+            if column not in parts:
+                raise ValueError(
+                    f"Part {column} not found in the data; choose one from: {', '.join(parts)}"
+                )
+        columns = parts if columns is None else columns
+        f.seek(start)
+        return pd.read_csv(
+            f,
+            sep="\t",
+            header=None,
+            names=parts,
+            usecols=columns,
+            dtype=get_dtypes(columns),
+        )
     # df = pd.read_csv(
     #     file,
     #     sep="\t",
@@ -742,14 +1055,22 @@ def parse_args(argv):
     x_value = ""
     y_value = ""
     file_type = ""
+    output = ""
+    replicates = resample.REPLICATES
+    seed = None
+    workers = 1
+    experiment = ""
+    figures = ""
+    formats = None
 
     # Get the arguments provided by the user
     opts, args = getopt.getopt(
         argv,
-        "f:d:p:x:y:",
+        "f:d:e:p:x:y:o:j:",
         [
             "file=",
             "directory=",
+            "experiment=",
             "part=",
             "shapiro",
             "anova",
@@ -758,6 +1079,16 @@ def parse_args(argv):
             "dunn",
             "cohen",
             "cliff",
+            "effect-size",
+            "output=",
+            "bootstrap",
+            "permutation",
+            "replicates=",
+            "seed=",
+            "workers=",
+            "figures=",
+            "figure-format=",
+            "points=",
             "full",
             "statistics",
             "plot",
@@ -766,6 +1097,8 @@ def parse_args(argv):
             "plot-correlation",
             "plot-samples",
             "samples",
+            "cache=",
+            "no-cache",
         ],
     )
     for opt, arg in opts:
@@ -776,6 +1109,8 @@ def parse_args(argv):
             if directory[-1] == "/":
                 directory = directory[:-1]
             files = parse.get_files(directory, "*.tsv")
+        elif opt in ["-e", "--experiment"]:
+            experiment = arg.rstrip("/")
         elif opt in ["-p", "--part"]:
             parts.append(arg)
         elif opt == "--shapiro":
@@ -792,6 +1127,41 @@ def parse_args(argv):
             statistical_test.append("cohen")
         elif opt == "--cliff":
             statistical_test.append("cliff")
+        elif opt == "--effect-size":
+            statistical_test.append("effect-size")
+        elif opt in ["-o", "--output"]:
+            output = arg
+        elif opt == "--bootstrap":
+            statistical_test.append("bootstrap")
+        elif opt == "--permutation":
+            statistical_test.append("permutation")
+        elif opt == "--replicates":
+            try:
+                replicates = int(arg)
+            except ValueError:
+                print(f"Number of replicates must be an integer; using default value ({replicates})")
+        elif opt == "--seed":
+            try:
+                seed = int(arg)
+            except ValueError:
+                print("Seed must be an integer; using a random seed")
+        elif opt in ["-j", "--workers"]:
+            try:
+                workers = int(arg)
+            except ValueError:
+                print(f"Number of workers must be an integer; using default value ({workers})")
+            # 0 uses one worker per available CPU
+            if workers == 0:
+                workers = os.cpu_count()
+        elif opt == "--figures":
+            figures = arg
+        elif opt == "--points":
+            try:
+                parse.set_plot_points(int(arg))
+            except ValueError:
+                print(f"Number of points must be an integer; using default value ({parse.PLOT_POINTS})")
+        elif opt == "--figure-format":
+            formats = [extension.strip() for extension in arg.split(",") if extension.strip() != ""]
         elif opt == "--full":
             statistical_test.append("full")
         elif opt == "--statistics":
@@ -812,57 +1182,133 @@ def parse_args(argv):
             y_value = arg
         elif opt == "--samples":
             file_type = "samples"
+            statistical_test.append("samples")
+        elif opt == "--cache":
+            parse.set_cache(arg)
+        elif opt == "--no-cache":
+            parse.set_cache("")
+
+    # Render the figures to files instead of showing them
+    set_figures(figures, formats)
+
+    return (
+        directory,
+        files,
+        parts,
+        statistical_test,
+        x_value,
+        y_value,
+        file_type,
+        output,
+        replicates,
+        seed,
+        workers,
+        experiment,
+    )
 
-    return directory, files, parts, statistical_test, x_value, y_value, file_type
 
+def get_columns(parts: list, statistical_test: list):
+    """Returns the columns of the summaries to read, or None to read all columns.
 
-def main(argv):
+    Args:
+        parts: The selected parts (all parts if empty).
+        statistical_test: The selected tests and plots.
+
+    Returns:
+        The selected parts, with the run numbers (and the energy in the title) for plot-median and the time
+        and energy for plot-correlation.
+    """
+    if len(parts) == 0:
+        return None
+    columns = list(parts)
+    if "plot-median" in statistical_test:
+        columns.extend(["RUN", "CORE0_ENERGY (J)"])
+    if "plot-correlation" in statistical_test:
+        columns.extend(["TIME (s)", "ENERGY (J)"])
+    return list(dict.fromkeys(columns))
+
+
+def get_workloads(directory: str, files: list, experiment: str):
+    """Returns the workloads to analyze as (name, directory, files) tuples.
+
+    Args:
+        directory: The directory of a workload (-d), or empty.
+        files: The summary files of the workload (-f or the files in -d).
+        experiment: The directory of an experiment (-e), whose workloads are all analyzed, or empty.
+    """
+    if experiment == "":
+        return [(os.path.basename(directory), directory, files)]
+    workloads = list()
+    for workload in sorted(os.listdir(experiment)):
+        files = sorted(parse.get_files(f"{experiment}/{workload}", "*.tsv"))
+        if len(files) > 0:
+            workloads.append((workload, f"{experiment}/{workload}", files))
+    return workloads
+
+
+def get_output(output: str, workload: str, workloads: list):
+    # With several workloads, the output of each one gets the name of the workload
+    if output == "" or len(workloads) == 1:
+        return output
+    root, extension = os.path.splitext(output)
+    return f"{root}-{workload}{extension}"
+
+
+def analyze_workload(
+    workload: str,
+    directory: str,
+    files: list,
+    parts: list,
+    statistical_test: list,
+    output: str,
+    replicates: int,
+    seed: int,
+    workers: int,
+):
+    """Runs the selected tests and plots on the summaries of a workload.
+
+    Returns:
+        The figures to render in batch mode (see get_figure_tasks).
+    """
     images = {}
     images_samples = {}
-    directory, files, parts, statistical_test, x_value, y_value, file_type = parse_args(
-        argv
-    )
 
     # if len(files) == 0:
     #     print("No .tsv files provided")
     #     return
 
-    # Read the TSV files
+    # Read only the selected parts (and the columns the plots need) of the TSV files
+    columns = get_columns(parts, statistical_test)
     for f in files:
         try:
-            base, df = read_tsv(f)
+            base, df = read_tsv(f, columns)
             images[base] = df
         except ValueError as e:
             print(f"{f}: {e}")
 
     if len(images) == 0:
         print("No (correct) .tsv files provided")
-        return
-
-    # TODO: Interpolation of data samples
+        return list()
 
-    # if file_type == "samples":
-    #     images["ubuntulatest"] = images["ubuntulatest"].groupby("Run")["Watts"].mean().reset_index()
     labels, all_parts = get_lists(images)
 
-    for p in parts:
-        if p not in all_parts:
-            print(
-                f"Part {p} not found in the data; choose one from: {', '.join(all_parts)}"
-            )
-            return
+    # Aggregate the samples of the runs of every image on a common time grid
+    if "samples" in statistical_test and directory != "":
+        images_samples = {
+            label: get_samples(directory, label)
+            for label in labels
+            if os.path.isdir(f"{directory}/{label}")
+        }
+        samples(images_samples)
 
     if len(parts) == 0:
         parts = all_parts
 
     labels = list(images.keys())
 
-    if len(statistical_test) == 0:
-        print("No statistical test selected.")
-        return
     if "full" in statistical_test:
         analyze(images, images_samples, labels, parts)
-        return
+        return list()
     if "shapiro" in statistical_test:
         shapiro_test(images, labels, parts)
     if "anova" in statistical_test:
@@ -877,18 +1323,71 @@ def main(argv):
         cohen_d(images, labels, parts)
     if "cliff" in statistical_test:
         cliff_d(images, labels, parts)
+    if "effect-size" in statistical_test:
+        effect_size(images, labels, parts, output)
+    if "bootstrap" in statistical_test:
+        bootstrap_test(images, labels, parts, replicates, seed, workers)
+    if "permutation" in statistical_test:
+        permutation_test(images, labels, parts, replicates, seed, workers)
     if "statistics" in statistical_test:
         statistics(images, labels, parts)
+    if "plot-correlation" in statistical_test:
+        plot_correlation(images, labels, parts)
+    if FIGURE_DIRECTORY != "":
+        return get_figure_tasks(workload, directory, images, labels, parts, statistical_test)
     if "plot" in statistical_test:
         plot(images, labels, parts)
     if "plot-median" in statistical_test:
         plot_median(directory, images, labels, parts)
     if "plot-distribution" in statistical_test:
         plot_distribution(images, labels, parts)
-    if "plot-correlation" in statistical_test:
-        plot_correlation(images, labels, parts)
     if "plot-samples" in statistical_test:
         plot_samples(directory)
+    return list()
+
+
+def main(argv):
+    (
+        directory,
+        files,
+        parts,
+        statistical_test,
+        x_value,
+        y_value,
+        file_type,
+        output,
+        replicates,
+        seed,
+        workers,
+        experiment,
+    ) = parse_args(argv)
+
+    if len(statistical_test) == 0:
+        print("No statistical test selected.")
+        return
+
+    workloads = get_workloads(directory, files, experiment)
+    tasks = list()
+    for workload, directory, files in workloads:
+        if len(workloads) > 1:
+            print(f"### {workload} ###")
+        tasks.extend(
+            analyze_workload(
+                workload,
+                directory,
+                files,
+                parts,
+                statistical_test,
+                get_output(output, workload, workloads),
+                replicates,
+                seed,
+                workers,
+            )
+        )
+
+    # Render the figures of all workloads at once, so the (workload, part) figures are spread over the workers
+    if len(tasks) > 0:
+        render_figures(tasks, workers)
 
 
 if __name__ == "__main__":
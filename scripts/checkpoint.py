@@ -0,0 +1,99 @@
+import json
+import os
+
+# Arguments that are not part of the experiment (and are not stored with it)
+LOCAL_ARGUMENTS = ["resume", "coordinator", "workers", "worker", "host", "authkey", "help_mode"]
+
+# States of a queue entry; an entry that is "running" when the experiment is interrupted is run again
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def write_json(file: str, data):
+    """Writes a JSON file atomically, so an interruption leaves either the previous or the new file.
+
+    Args:
+        file: The file to write.
+        data: The data to write.
+    """
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(f"{file}.tmp", "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{file}.tmp", file)
+
+
+def read_json(file: str):
+    try:
+        with open(file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_experiment_file(exp_id: str):
+    return f"logs/experiment-{exp_id}/experiment.json"
+
+
+def get_queue_file(exp_id: str, workload: str):
+    return f"logs/experiment-{exp_id}/{workload}/queue.json"
+
+
+def save_experiment(exp_id: str, arguments: dict, workloads: list):
+    """Stores the arguments and workloads of an experiment, so it can be resumed with the same configuration.
+
+    Args:
+        exp_id: The id of the experiment.
+        arguments: The arguments of the experiment (see parse_args).
+        workloads: The workloads of the experiment, in order.
+    """
+    stored = dict()
+    for key, value in arguments.items():
+        if key in LOCAL_ARGUMENTS:
+            continue
+        stored[key] = sorted(value) if isinstance(value, set) else value
+    write_json(get_experiment_file(exp_id), {"arguments": stored, "workloads": list(workloads)})
+
+
+def load_experiment(exp_id: str):
+    """Returns the arguments and workloads of a stored experiment.
+
+    Args:
+        exp_id: The id of the experiment.
+
+    Returns:
+        The arguments and the workloads, or None if the experiment was not stored.
+    """
+    experiment = read_json(get_experiment_file(exp_id))
+    if experiment is None:
+        return None
+    arguments = experiment["arguments"]
+    for key in ["workloads", "images"]:
+        arguments[key] = set(arguments[key])
+    return arguments, experiment["workloads"]
+
+
+def save_queue(exp_id: str, workload: str, queue: list, states: list, runs: list, prepared: bool):
+    """Stores the planned queue of a workload with the state and run number of every entry.
+
+    Args:
+        exp_id: The id of the experiment.
+        workload: The workload.
+        queue: The (shuffled) images to run.
+        states: The state of every entry in the queue.
+        runs: The run number of every entry that was started (None otherwise).
+        prepared: Whether the images of the workload were built.
+    """
+    write_json(
+        get_queue_file(exp_id, workload),
+        {"prepared": prepared, "queue": queue, "states": states, "runs": runs},
+    )
+
+
+def load_queue(exp_id: str, workload: str):
+    """Returns the stored queue of a workload (see save_queue), or None if it was not stored."""
+    return read_json(get_queue_file(exp_id, workload))
@@ -0,0 +1,377 @@
+import getopt
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import scripts.analyze as analyze
+import scripts.checkpoint as checkpoint
+import scripts.index as index
+import scripts.resample as resample
+
+# Metrics that are compared by default (lower is better for all of them)
+METRICS = ["ENERGY (J)", "TIME (s)"]
+
+# Default minimum increase (%) of the mean of a metric to be reported as a regression
+THRESHOLD = 5
+
+# Default significance level of the (Holm-adjusted) permutation tests
+ALPHA = 0.05
+
+# Minimum number of runs of an image in each experiment to compare it
+MIN_RUNS = 2
+
+# Exit codes: no regression, a regression was found, the experiments could not be compared
+OK = 0
+REGRESSION = 1
+ERROR = 2
+
+COLUMNS = [
+    "WORKLOAD",
+    "IMAGE",
+    "OTHER IMAGE",
+    "METRIC",
+    "RUNS",
+    "OTHER RUNS",
+    "MEAN",
+    "OTHER MEAN",
+    "MEDIAN",
+    "OTHER MEDIAN",
+    "CHANGE (%)",
+    "P-VALUE",
+    "ADJUSTED P-VALUE",
+    "COHEN D",
+    "COHEN MAGNITUDE",
+    "CLIFF DELTA",
+    "CLIFF MAGNITUDE",
+    "STATUS",
+]
+
+
+def get_key(image: str):
+    # Images are paired by their name without the digest, so an updated image is compared to its previous build
+    return image.split("@")[0]
+
+
+def get_cells(df: pd.DataFrame, baseline: str, candidate: str):
+    """Pairs the (workload, image) cells of two experiments.
+
+    Images with the same name are paired first; the remaining images are paired by their name without the
+    digest when that is unambiguous in both experiments.
+
+    Args:
+        df: The runs of both experiments (see index.query_values).
+        baseline: The id of the baseline experiment.
+        candidate: The id of the candidate experiment.
+
+    Returns:
+        The paired cells as (workload, baseline image, candidate image) tuples, and the unpaired cells as
+        (experiment, workload, image) tuples.
+    """
+    cells = list()
+    missing = list()
+    for workload in sorted(df["workload"].unique()):
+        images = df[df["workload"] == workload]
+        left = sorted(images[images["experiment"] == baseline]["image"].unique())
+        right = sorted(images[images["experiment"] == candidate]["image"].unique())
+        for image in [image for image in left if image in right]:
+            cells.append((workload, image, image))
+            left.remove(image)
+            right.remove(image)
+        for image in list(left):
+            keys = [other for other in right if get_key(other) == get_key(image)]
+            if len(keys) == 1 and [get_key(other) for other in left].count(get_key(image)) == 1:
+                cells.append((workload, image, keys[0]))
+                left.remove(image)
+                right.remove(keys[0])
+        missing.extend((baseline, workload, image) for image in left)
+        missing.extend((candidate, workload, image) for image in right)
+    return cells, missing
+
+
+def holm(p_values: np.ndarray):
+    """Adjusts p-values for multiple comparisons with the Holm-Bonferroni method."""
+    p_values = np.asarray(p_values, dtype=float)
+    order = np.argsort(p_values)
+    adjusted = np.maximum.accumulate((len(p_values) - np.arange(len(p_values))) * p_values[order])
+    result = np.empty(len(p_values))
+    result[order] = np.minimum(adjusted, 1)
+    return result
+
+
+def get_status(change: float, p_value: float, threshold: float, alpha: float):
+    if np.isnan(p_value):
+        return "insufficient"
+    if p_value >= alpha or abs(change) < threshold:
+        return "unchanged"
+    return "regression" if change > 0 else "improvement"
+
+
+def compare(
+    df: pd.DataFrame,
+    baseline: str,
+    candidate: str,
+    metrics: list = None,
+    threshold: float = THRESHOLD,
+    alpha: float = ALPHA,
+    replicates: int = resample.REPLICATES,
+    seed: int = None,
+    workers: int = 1,
+):
+    """Compares the metrics of every (workload, image) cell of a candidate experiment to a baseline.
+
+    Every cell gets a permutation test of the difference between the means of each metric, adjusted for
+    all the cells and metrics with the Holm-Bonferroni method, and Cohen's d and Cliff's delta (a positive
+    value indicates that the candidate performs better, like in analyze.py). A cell is a regression when
+    its adjusted p-value is below alpha and its mean increased by at least the threshold.
+
+    Args:
+        df: The runs of both experiments (see index.query_values).
+        baseline: The id of the baseline experiment.
+        candidate: The id of the candidate experiment.
+        metrics: The metrics to compare.
+        threshold: The minimum change (%) of the mean.
+        alpha: The significance level.
+        replicates: The number of permutations.
+        seed: The seed of the permutations (see resample.get_seed).
+        workers: The number of processes.
+
+    Returns:
+        A dataframe with one row per cell and metric, and the unpaired cells.
+    """
+    metrics = metrics or METRICS
+    seed = resample.get_seed(seed)
+    cells, missing = get_cells(df, baseline, candidate)
+
+    values = list()
+    for workload, image, other in cells:
+        runs = df[df["workload"] == workload]
+        x = runs[(runs["experiment"] == baseline) & (runs["image"] == image)][metrics].to_numpy(dtype=float)
+        y = runs[(runs["experiment"] == candidate) & (runs["image"] == other)][metrics].to_numpy(dtype=float)
+        values.append((x, y))
+
+    # The permutations of every cell come from its own stream, so the p-values do not depend on the workers
+    tested = [i for i, (x, y) in enumerate(values) if len(x) >= MIN_RUNS and len(y) >= MIN_RUNS]
+    tasks = [
+        (values[i][0], values[i][1], seed, (resample.PERMUTATION_STREAM, i), replicates) for i in tested
+    ]
+    p_values = np.full((len(cells), len(metrics)), np.nan)
+    for i, result in zip(tested, resample.run_tasks(resample.permutation, tasks, workers)):
+        p_values[i] = result[:, 1]
+    adjusted = np.full(p_values.shape, np.nan)
+    mask = ~np.isnan(p_values)
+    adjusted[mask] = holm(p_values[mask])
+
+    rows = list()
+    for i, ((workload, image, other), (x, y)) in enumerate(zip(cells, values)):
+        mean = np.mean(x, axis=0)
+        other_mean = np.mean(y, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = 100 * (other_mean - mean) / mean
+        d = delta = np.full(len(metrics), np.nan)
+        cohen = cliff = np.full(len(metrics), None)
+        if i in tested:
+            d = analyze.calculate_d(x, y)
+            delta = analyze.calculate_delta(x, y)
+            cohen = analyze.get_magnitude(d, analyze.COHEN_THRESHOLDS)
+            cliff = analyze.get_magnitude(delta, analyze.CLIFF_THRESHOLDS)
+        for j, metric in enumerate(metrics):
+            rows.append(
+                [
+                    workload,
+                    image,
+                    other,
+                    metric,
+                    len(x),
+                    len(y),
+                    mean[j],
+                    other_mean[j],
+                    np.median(x[:, j]),
+                    np.median(y[:, j]),
+                    change[j],
+                    p_values[i, j],
+                    adjusted[i, j],
+                    d[j],
+                    cohen[j],
+                    delta[j],
+                    cliff[j],
+                    get_status(change[j], adjusted[i, j], threshold, alpha),
+                ]
+            )
+    return pd.DataFrame(rows, columns=COLUMNS), missing
+
+
+def get_records(df: pd.DataFrame):
+    # NaN is not valid JSON, so missing values are written as null
+    return [
+        {key: None if isinstance(value, float) and np.isnan(value) else value for key, value in row.items()}
+        for row in df.astype(object).to_dict(orient="records")
+    ]
+
+
+def write_report(
+    file: str,
+    df: pd.DataFrame,
+    missing: list,
+    baseline: str,
+    candidate: str,
+    threshold: float,
+    alpha: float,
+    replicates: int,
+    seed: int,
+):
+    """Writes the comparison as JSON: the parameters, the number of regressions, the cells and the unpaired cells."""
+    checkpoint.write_json(
+        file,
+        {
+            "baseline": baseline,
+            "candidate": candidate,
+            "threshold": threshold,
+            "alpha": alpha,
+            "replicates": replicates,
+            "seed": seed,
+            "regressions": int((df["STATUS"] == "regression").sum()),
+            "improvements": int((df["STATUS"] == "improvement").sum()),
+            "cells": get_records(df),
+            "missing": [
+                {"experiment": experiment, "workload": workload, "image": image}
+                for experiment, workload, image in missing
+            ],
+        },
+    )
+    print(f"Report written to {file}")
+
+
+def help():
+    print(
+        "Compares the runs of every (workload, image) of a candidate experiment to a baseline experiment and\n"
+        "exits with 1 if a metric got significantly worse, 2 if the experiments cannot be compared, and 0 otherwise.\n",
+        "Usage: python -m scripts.compare [options] <baseline> <candidate>",
+        "Options:",
+        "   -l --workload       Workload to compare (all workloads by default)",
+        "   -m --metric         Metric to compare (a column of the summaries); can be used for multiple metrics (default ENERGY (J) and TIME (s))",
+        "   -t --threshold      Minimum increase (%) of the mean to report a regression (default 5)",
+        "   -a --alpha          Significance level of the Holm-adjusted permutation tests (default 0.05)",
+        "   --replicates        Number of permutations (default 10000)",
+        "   --seed              Seed of the permutations (default random; the seed is reported)",
+        "   -j --workers        Number of processes (0 for all cpus) (default 1)",
+        "   -o --output         Report file (default results/compare-<baseline>-<candidate>.json)",
+        "   --results           Results directory (default results)",
+        "   --logs              Logs directory (default logs)",
+        "   --database          Index database (default results/index.db)",
+        sep=os.linesep,
+    )
+
+
+def main(argv):
+    workload = None
+    metrics = list()
+    threshold = THRESHOLD
+    alpha = ALPHA
+    replicates = resample.REPLICATES
+    seed = None
+    workers = 1
+    output = ""
+    results = "results"
+    logs = "logs"
+    database = index.DATABASE
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "l:m:t:a:j:o:h",
+            [
+                "workload=",
+                "metric=",
+                "threshold=",
+                "alpha=",
+                "replicates=",
+                "seed=",
+                "workers=",
+                "output=",
+                "results=",
+                "logs=",
+                "database=",
+                "help",
+            ],
+        )
+        for opt, arg in opts:
+            if opt in ["-l", "--workload"]:
+                workload = arg
+            elif opt in ["-m", "--metric"]:
+                metrics.append(arg)
+            elif opt in ["-t", "--threshold"]:
+                threshold = float(arg)
+            elif opt in ["-a", "--alpha"]:
+                alpha = float(arg)
+            elif opt == "--replicates":
+                replicates = int(arg)
+            elif opt == "--seed":
+                seed = int(arg)
+            elif opt in ["-j", "--workers"]:
+                workers = int(arg) or os.cpu_count()
+            elif opt in ["-o", "--output"]:
+                output = arg
+            elif opt == "--results":
+                results = arg.rstrip("/")
+            elif opt == "--logs":
+                logs = arg.rstrip("/")
+            elif opt == "--database":
+                database = arg
+            elif opt in ["-h", "--help"]:
+                help()
+                return OK
+    except (getopt.GetoptError, ValueError) as e:
+        print(e)
+        help()
+        return ERROR
+    if len(args) != 2:
+        print("A baseline and a candidate experiment are required")
+        help()
+        return ERROR
+    baseline, candidate = args
+    metrics = metrics or METRICS
+    output = output or f"{results}/compare-{baseline}-{candidate}.json"
+
+    # The runs are read from the index, which is updated first in case the experiments were parsed again
+    connection = index.connect(database)
+    try:
+        if len(index.update(connection, results, logs, [baseline, candidate])) > 0:
+            print(f"Index {database} updated")
+        df = index.query_values(connection, [baseline, candidate], metrics, workload)
+    finally:
+        connection.close()
+    for experiment in [baseline, candidate]:
+        if experiment not in df["experiment"].values:
+            print(f"No parsed runs of experiment {experiment} with {', '.join(metrics)} (run parse.py first)")
+            return ERROR
+
+    seed = resample.get_seed(seed)
+    df, missing = compare(df, baseline, candidate, metrics, threshold, alpha, replicates, seed, workers)
+    if len(df) == 0:
+        print("The experiments have no workloads and images in common")
+        return ERROR
+
+    print(f"{baseline} -> {candidate}: {replicates} permutations (seed {seed}), alpha {alpha}, threshold {threshold}%\n")
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(
+            df.assign(IMAGE=df["IMAGE"].map(analyze.get_image_name))
+            .drop(columns="OTHER IMAGE")
+            .to_string(index=False)
+            + "\n"
+        )
+    for experiment, name, image in missing:
+        print(f"{name}/{image} only in experiment {experiment}")
+
+    write_report(output, df, missing, baseline, candidate, threshold, alpha, replicates, seed)
+    regressions = df[df["STATUS"] == "regression"]
+    if len(regressions) > 0:
+        print(f"{len(regressions)} regression(s) found")
+        return REGRESSION
+    print("No regressions found")
+    return OK
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
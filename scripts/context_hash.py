@@ -0,0 +1,188 @@
+import fnmatch
+import getopt
+import hashlib
+import os
+import sys
+
+import yaml
+
+# Size of the blocks files are hashed in
+BLOCK_SIZE = 1024 * 1024
+
+
+def read_dockerignore(context: str):
+    """Returns the patterns of the .dockerignore file in the build context (as (pattern, exclude) tuples)."""
+    patterns = list()
+    try:
+        with open(f"{context}/.dockerignore") as f:
+            for line in f:
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                exclude = not line.startswith("!")
+                pattern = os.path.normpath(line.lstrip("!").strip().lstrip("/"))
+                patterns.append((pattern, exclude))
+    except FileNotFoundError:
+        pass
+    return patterns
+
+
+def is_ignored(path: str, patterns: list):
+    # The last matching pattern decides, like Docker; a pattern that matches a directory matches its contents
+    ignored = False
+    for pattern, exclude in patterns:
+        parts = path.split("/")
+        for i in range(1, len(parts) + 1):
+            if match(pattern, "/".join(parts[:i])):
+                ignored = exclude
+                break
+    return ignored
+
+
+def match(pattern: str, path: str):
+    if "**" not in pattern:
+        return pattern.count("/") == path.count("/") and fnmatch.fnmatchcase(path, pattern)
+    # "**" matches any number of directories (including none)
+    return fnmatch.fnmatchcase(path, pattern) or fnmatch.fnmatchcase(path, pattern.replace("**/", ""))
+
+
+def hash_file(digest, file: str):
+    with open(file, "rb") as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+
+
+def hash_context(digest, context: str):
+    """Adds the paths, modes and contents of the files in the build context that are not in .dockerignore."""
+    patterns = read_dockerignore(context)
+    for root, directories, files in os.walk(context):
+        directories.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            relative = os.path.relpath(path, context)
+            if is_ignored(relative, patterns) or not os.path.isfile(path):
+                continue
+            digest.update(relative.encode() + b"\0")
+            digest.update(oct(os.stat(path).st_mode & 0o777).encode() + b"\0")
+            hash_file(digest, path)
+
+
+def get_builds(file: str):
+    """Returns the image names and build sections of the services in a compose file.
+
+    The environment variables in the compose file are substituted from the current environment,
+    and the contexts and Dockerfiles are resolved relative to the compose file (like docker compose).
+
+    Args:
+        file: The compose file.
+
+    Returns:
+        A list of (image, context, dockerfile, contexts, args) tuples, one for every service that is built.
+    """
+    with open(file) as f:
+        config = yaml.safe_load(f)
+
+    directory = os.path.dirname(os.path.abspath(file))
+    builds = list()
+    for name, service in sorted((config.get("services") or dict()).items()):
+        build = service.get("build")
+        if build is None:
+            continue
+        if isinstance(build, str):
+            build = {"context": build}
+
+        context = os.path.join(directory, os.path.expandvars(build.get("context", ".")))
+        dockerfile = os.path.join(context, os.path.expandvars(build.get("dockerfile", "Dockerfile")))
+        contexts = [
+            (key, os.path.join(directory, os.path.expandvars(value)))
+            for key, value in sorted((build.get("additional_contexts") or dict()).items())
+        ]
+        args = build.get("args") or list()
+        if isinstance(args, dict):
+            args = [f"{key}={value}" for key, value in sorted(args.items())]
+        args = [os.path.expandvars(str(arg)) for arg in args]
+        image = os.path.expandvars(service.get("image", f"{os.path.basename(directory)}-{name}"))
+        builds.append((image, context, dockerfile, contexts, args))
+    return builds
+
+
+def get_hash(file: str, digests: list = []):
+    """Returns the content hash of the images built by a compose file.
+
+    The hash covers the Dockerfiles, the build arguments, the base-image digests and every file in the
+    build contexts (and additional contexts) that is not excluded by .dockerignore.
+
+    Args:
+        file: The compose file.
+        digests: The digests of the base image.
+
+    Returns:
+        The hash (hex) and the names of the images that are built.
+    """
+    digest = hashlib.sha256()
+    for value in sorted(digests):
+        digest.update(f"digest:{value}\0".encode())
+
+    builds = get_builds(file)
+    for image, context, dockerfile, contexts, args in builds:
+        digest.update(f"image:{image}\0".encode())
+        for arg in args:
+            digest.update(f"arg:{arg}\0".encode())
+        digest.update(b"dockerfile\0")
+        hash_file(digest, dockerfile)
+        digest.update(b"context\0")
+        hash_context(digest, context)
+        for key, path in contexts:
+            digest.update(f"context:{key}\0".encode())
+            hash_context(digest, path)
+    return digest.hexdigest(), [image for image, *_ in builds]
+
+
+def get_tag(image: str, digest: str):
+    # The image with its tag replaced by the (shortened) content hash
+    repository = image.rsplit(":", 1)[0] if ":" in image.split("/")[-1] else image
+    return f"{repository}:context-{digest[:16]}"
+
+
+def help():
+    print(
+        "Prints the content hash of the images built by a compose file, followed by each image and its hash tag.\n",
+        "Usage: python scripts/context_hash.py [options] -f docker-compose.yml",
+        "Options:",
+        "   -f --file           Compose file (with the environment variables of the build set)",
+        "   -d --digest         Digest of the base image; can be used for multiple digests",
+        sep=os.linesep,
+    )
+
+
+def main(argv):
+    file = ""
+    digests = list()
+
+    opts, args = getopt.getopt(argv, "f:d:h", ["file=", "digest=", "help"])
+    for opt, arg in opts:
+        if opt in ["-f", "--file"]:
+            file = arg
+        elif opt in ["-d", "--digest"]:
+            if arg != "":
+                digests.append(arg)
+        elif opt in ["-h", "--help"]:
+            help()
+            return 0
+
+    if file == "":
+        help()
+        return 1
+
+    digest, images = get_hash(file, digests)
+    print(digest)
+    for image in images:
+        print(f"{image}\t{get_tag(image, digest)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+import glob
+import os
+import time
+
+from scripts.sampler import Powercap, read_int
+
+# Time (s) to record the idle baseline for
+BASELINE_DURATION = 10
+
+# Sensors that report the package temperature (thermal zone types and hwmon names)
+PACKAGE_SENSORS = ["x86_pkg_temp", "coretemp", "k10temp", "zenpower"]
+
+
+class Thermal:
+    """Package temperature (°C) from the thermal zones and hwmon sensors in sysfs.
+
+    The package sensors (e.g. x86_pkg_temp, coretemp or k10temp) are preferred; if there are none,
+    every thermal zone is used. The highest temperature is reported.
+    """
+
+    def __init__(self, root: str = "/sys/class"):
+        package = list()
+        other = list()
+        for zone in sorted(glob.glob(f"{root}/thermal/thermal_zone*")):
+            if not os.path.exists(f"{zone}/temp"):
+                continue
+            (package if read_name(f"{zone}/type") in PACKAGE_SENSORS else other).append(f"{zone}/temp")
+        for hwmon in sorted(glob.glob(f"{root}/hwmon/hwmon*")):
+            if read_name(f"{hwmon}/name") in PACKAGE_SENSORS:
+                package += sorted(glob.glob(f"{hwmon}/temp*_input"))
+
+        self.sensors = list()
+        for sensor in package if len(package) > 0 else other:
+            try:
+                read_int(sensor)
+                self.sensors.append(sensor)
+            except (OSError, ValueError):
+                continue
+
+    def read(self):
+        temperatures = list()
+        for sensor in self.sensors:
+            try:
+                temperatures.append(read_int(sensor) / 1000)
+            except (OSError, ValueError):
+                continue
+        return max(temperatures) if len(temperatures) > 0 else None
+
+
+class Cooldown:
+    """Waits until the package power and temperature are back at their idle baseline.
+
+    The baseline is recorded once while the machine is idle. Afterwards, every pause polls the power
+    (from the powercap energy counters) and the temperature until both are within the tolerance of the
+    baseline for a number of consecutive readings, or until the maximum pause has passed.
+    """
+
+    def __init__(
+        self,
+        tolerance: float = 5,
+        interval: float = 1,
+        readings: int = 3,
+        powercap: Powercap = None,
+        thermal: Thermal = None,
+    ):
+        self.tolerance = tolerance
+        self.interval = interval
+        self.readings = readings
+        self.powercap = powercap if powercap is not None else Powercap()
+        self.thermal = thermal if thermal is not None else Thermal()
+
+        # The energy counters are often only readable by root
+        try:
+            if len(self.powercap.zones) > 0:
+                self.powercap.read()
+        except (OSError, ValueError):
+            self.powercap.zones = list()
+        self.previous = (time.monotonic(), self.read_energy())
+
+        self.power = None
+        self.temperature = None
+
+    def available(self):
+        return len(self.powercap.zones) > 0 or len(self.thermal.sensors) > 0
+
+    def read_energy(self):
+        if len(self.powercap.zones) == 0:
+            return None
+        try:
+            return sum(self.powercap.read())
+        except (OSError, ValueError):
+            return None
+
+    def read(self):
+        """Returns the package power (W) since the previous reading and the current temperature (°C)."""
+        now = time.monotonic()
+        energy = self.read_energy()
+        power = None
+        previous_time, previous_energy = self.previous
+        if energy is not None and previous_energy is not None and now > previous_time:
+            power = (energy - previous_energy) / (now - previous_time)
+        self.previous = (now, energy)
+        return power, self.thermal.read()
+
+    def record_baseline(self, duration: float = BASELINE_DURATION):
+        """Records the idle power and temperature as the median of the readings over the given time.
+
+        Args:
+            duration: The time (s) to record the baseline for.
+
+        Returns:
+            The idle power (W) and temperature (°C), or None for either if it cannot be read.
+        """
+        powers = list()
+        temperatures = list()
+        self.read()
+        end = time.monotonic() + duration
+        while True:
+            time.sleep(self.interval)
+            power, temperature = self.read()
+            if power is not None:
+                powers.append(power)
+            if temperature is not None:
+                temperatures.append(temperature)
+            if time.monotonic() >= end:
+                break
+        self.power = median(powers)
+        self.temperature = median(temperatures)
+        return self.power, self.temperature
+
+    def settled(self, power: float, temperature: float):
+        if self.power is not None and power is not None:
+            if power > self.power * (1 + self.tolerance / 100):
+                return False
+        if self.temperature is not None and temperature is not None:
+            if temperature > self.temperature * (1 + self.tolerance / 100):
+                return False
+        return True
+
+    def wait(self, maximum: float):
+        """Waits until the power and temperature are settled, for at most the given time.
+
+        Args:
+            maximum: The maximum time (s) to wait (i.e. the fixed pause).
+
+        Returns:
+            The time (s) that was waited.
+        """
+        start = time.monotonic()
+        if self.power is None and self.temperature is None:
+            time.sleep(maximum)
+            return time.monotonic() - start
+
+        settled = 0
+        self.read()
+        while time.monotonic() - start < maximum:
+            time.sleep(min(self.interval, max(0, maximum - (time.monotonic() - start))))
+            if self.settled(*self.read()):
+                settled += 1
+                if settled >= self.readings:
+                    break
+            else:
+                settled = 0
+        return time.monotonic() - start
+
+
+def read_name(file: str):
+    try:
+        with open(file) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def median(values: list):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
@@ -0,0 +1,354 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.managers import BaseManager
+
+from scripts.engine import RunEngine
+
+# Port the coordinator listens on if the address does not have one
+PORT = 50000
+
+# Interval (s) at which a worker renews the lease of the run it executes
+HEARTBEAT = 10
+
+# Time (s) without a heartbeat after which a run is handed out again (e.g. its worker crashed or lost the network)
+LEASE = 60
+
+# Time (s) without any worker contacting the coordinator after which it stops and reports the missing runs
+IDLE_TIMEOUT = 3600
+
+
+class Coordinator:
+    """Hands out the (workload, image, run) queue of an experiment to workers and collects their files.
+
+    Workers pull one task at a time, so faster hosts take a larger share of the queue. A task is leased to
+    its worker, which renews the lease while the run executes; a task whose lease expires (or that its worker
+    gives back when it is interrupted) is put back at the front of the queue. The results and logs of a run
+    are written to the experiment-<id> tree of the coordinator only if its worker still holds the lease,
+    and every run is logged with the host that executed it.
+    """
+
+    def __init__(self, exp_id: str, arguments: dict, tasks: list, lease: float = None):
+        self.exp_id = exp_id
+        self.arguments = arguments
+        self.tasks = tasks
+        self.lease = lease if lease is not None else LEASE
+        self.pending = deque(tasks)
+        # The host and expiry time of every task that is handed out
+        self.leases = dict()
+        self.finished = 0
+        # The workers that are connected (until they have sent their logs)
+        self.hosts = set()
+        self.contact = time.monotonic()
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if len(tasks) == 0:
+            self.done.set()
+
+    def init_logs(self):
+        for workload in dict.fromkeys(task[0] for task in self.tasks):
+            os.makedirs(f"logs/experiment-{self.exp_id}/{workload}", exist_ok=True)
+            with open(f"logs/experiment-{self.exp_id}/{workload}/info.txt", "a") as f:
+                f.write(f"### experiment {self.exp_id} ###\n# workload: {workload}\n\n# total order (run, image, host)\n\n")
+
+    def get_experiment(self):
+        return self.exp_id, self.arguments
+
+    def expire(self):
+        # Put the tasks whose worker stopped renewing their lease back at the front of the queue (holding the lock)
+        now = time.monotonic()
+        for task, (host, expiry) in list(self.leases.items()):
+            if expiry < now:
+                del self.leases[task]
+                self.pending.appendleft(task)
+                print(f"Run {task[2]} of {task[0]} on {task[1]} lost by {host}; handing it out again")
+
+    def get_task(self, host: str):
+        """Returns the next (workload, image, run) task and leases it to the host, or None if the queue is empty.
+
+        The worker keeps asking while other workers hold leases, since their tasks may be handed out again.
+
+        Returns:
+            The task, None if every task is finished, or False if the remaining tasks are leased to other workers.
+        """
+        with self.lock:
+            self.contact = time.monotonic()
+            self.hosts.add(host)
+            self.expire()
+            if len(self.pending) == 0:
+                return None if len(self.leases) == 0 else False
+            task = self.pending.popleft()
+            self.leases[task] = (host, time.monotonic() + self.lease)
+        print(f"Run {task[2]} of {task[0]} on {task[1]} assigned to {host}")
+        return task
+
+    def heartbeat(self, host: str, task: tuple):
+        """Renews the lease of a task; returns False if the host no longer holds it."""
+        with self.lock:
+            self.contact = time.monotonic()
+            if self.leases.get(task, (None,))[0] != host:
+                return False
+            self.leases[task] = (host, time.monotonic() + self.lease)
+            return True
+
+    def release(self, host: str, task: tuple):
+        """Puts a task back at the front of the queue (e.g. its worker was interrupted)."""
+        with self.lock:
+            if self.leases.get(task, (None,))[0] == host:
+                del self.leases[task]
+                self.pending.appendleft(task)
+                print(f"Run {task[2]} of {task[0]} on {task[1]} given back by {host}")
+
+    def leave(self, host: str):
+        """Marks a worker as done once it has sent its logs."""
+        with self.lock:
+            self.hosts.discard(host)
+
+    def get_missing(self):
+        """Returns the tasks that are not finished (pending or leased)."""
+        with self.lock:
+            return list(self.pending) + list(self.leases)
+
+    def get_path(self, path: str):
+        # Files sent by workers can only be written to the experiment tree (results or logs)
+        path = os.path.normpath(path)
+        if path.startswith("..") or os.path.isabs(path) or path.split(os.sep)[:2] not in (
+            ["results", f"experiment-{self.exp_id}"],
+            ["logs", f"experiment-{self.exp_id}"],
+        ):
+            raise ValueError(f"Files must be in the experiment-{self.exp_id} tree: {path}")
+        return path
+
+    def put_file(self, path: str, data: bytes):
+        """Writes a file sent by a worker into the experiment tree (results or logs only)."""
+        path = self.get_path(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def finish(self, host: str, task: tuple, returncode: int, files: dict):
+        """Writes the files of a finished run and logs it, if the host still holds the lease of the task.
+
+        A run whose lease expired is only accepted if the task was not handed out again in the meantime,
+        so a late worker never overwrites the files of the run that replaced it.
+
+        Args:
+            host: The worker.
+            task: The (workload, image, run) task.
+            returncode: The exit code of the run.
+            files: The files of the run ({path: data}, see put_file).
+
+        Returns:
+            Whether the run was accepted.
+        """
+        workload, image, run = task
+        for path in files:
+            self.get_path(path)
+        with self.lock:
+            self.contact = time.monotonic()
+            if self.leases.get(task, (None,))[0] == host:
+                del self.leases[task]
+            elif task in self.pending:
+                self.pending.remove(task)
+            else:
+                print(f"Run {run} of {workload} on {image} from {host} discarded; it was handed out again")
+                return False
+            for path, data in files.items():
+                self.put_file(path, data)
+            os.makedirs(f"logs/experiment-{self.exp_id}/{workload}", exist_ok=True)
+            with open(f"logs/experiment-{self.exp_id}/{workload}/info.txt", "a") as f:
+                f.write(f"{run}\t{image}\t{host}\n")
+            self.finished += 1
+            if self.finished >= len(self.tasks):
+                self.done.set()
+        print(f"Run {run} of {workload} on {image} finished on {host} ({returncode})")
+        return True
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+def get_address(address: str):
+    # "host:port", "host" or ":port"
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host, int(port) if port != "" else PORT
+
+
+def coordinate(coordinator: Coordinator, address: str, authkey: bytes, workers: int = 0, timeout: float = None):
+    """Serves the queue until every task is finished.
+
+    The coordinator stops early, and reports the runs that are missing, if all local workers exit or if no
+    worker contacts it for the timeout (e.g. every remote worker is gone).
+
+    Args:
+        coordinator: The coordinator of the experiment.
+        address: The address to listen on (host:port).
+        authkey: The key the workers must authenticate with.
+        workers: The number of local worker processes to start (for testing on a single host).
+        timeout: The time (s) without any worker contact after which the coordinator stops (IDLE_TIMEOUT by default).
+
+    Returns:
+        The tasks that were not finished.
+    """
+    timeout = timeout if timeout is not None else IDLE_TIMEOUT
+    coordinator.init_logs()
+    CoordinatorManager.register("coordinator", callable=lambda: coordinator)
+    manager = CoordinatorManager(address=get_address(address), authkey=authkey)
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.address
+    print(f"Coordinating experiment {coordinator.exp_id} ({len(coordinator.tasks)} runs) on {host}:{port}")
+
+    processes = list()
+    for worker in range(workers):
+        environment = {**os.environ, "DOCKER_ENERGY_AUTHKEY": authkey.decode()}
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "measure.py",
+                    "--worker",
+                    f"{'localhost' if host in ('', '0.0.0.0') else host}:{port}",
+                    "--host",
+                    f"{socket.gethostname()}-{worker + 1}",
+                ],
+                env=environment,
+            )
+        )
+
+    while not coordinator.done.wait(1):
+        # Stop waiting if all local workers exited without finishing the queue
+        if len(processes) > 0 and all(process.poll() is not None for process in processes):
+            print(f"All local workers exited; {coordinator.finished} of {len(coordinator.tasks)} runs finished")
+            break
+        if time.monotonic() - coordinator.contact > timeout:
+            print(f"No worker for {timeout:g} s; {coordinator.finished} of {len(coordinator.tasks)} runs finished")
+            break
+    for process in processes:
+        process.wait()
+    # Let the remote workers send their logs (a worker that is gone is waited for at most one lease)
+    deadline = time.monotonic() + coordinator.lease
+    while len(coordinator.hosts) > 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    missing = coordinator.get_missing()
+    for workload, image, run in missing:
+        print(f"Run {run} of {workload} on {image} was not finished")
+    return missing
+
+
+def renew(coordinator, host: str, task: tuple, stop: threading.Event):
+    # Renew the lease of the task until the run ends (the proxy opens its own connection in this thread)
+    while not stop.wait(HEARTBEAT):
+        try:
+            if not coordinator.heartbeat(host, task):
+                print(f"The lease of run {task[2]} of {task[0]} on {task[1]} expired; it was handed out again")
+                return
+        except (OSError, EOFError):
+            return
+
+
+def work(address: str, authkey: bytes, host: str, get_workload):
+    """Runs tasks from the coordinator until its queue is empty.
+
+    Every workload is prepared on this host the first time it gets one of its runs. The runs are written to
+    a local experiment-<id>-<host> tree and sent to the coordinator, together with the logs of each workload.
+
+    Args:
+        address: The address of the coordinator (host:port).
+        authkey: The key to authenticate with.
+        host: The name this host is logged with.
+        get_workload: Configures a workload on this host from the arguments of the experiment
+            (called with the arguments, the workload and the local experiment id).
+    """
+    CoordinatorManager.register("coordinator")
+    manager = CoordinatorManager(address=get_address(address), authkey=authkey)
+    for attempt in range(30):
+        try:
+            manager.connect()
+            break
+        except ConnectionRefusedError:
+            time.sleep(1)
+    else:
+        print(f"Could not connect to the coordinator at {address}")
+        return 1
+    coordinator = manager.coordinator()
+
+    exp_id, arguments = coordinator.get_experiment()
+    local_id = f"{exp_id}-{host}"
+    engines = dict()
+    task = None
+    try:
+        while True:
+            task = coordinator.get_task(host)
+            if task is None:
+                break
+            # Wait for the tasks of other workers, which are handed out again if their lease expires
+            if task is False:
+                time.sleep(HEARTBEAT)
+                continue
+            workload, image, run = task
+            stop = threading.Event()
+            threading.Thread(target=renew, args=(coordinator, host, task, stop), daemon=True).start()
+
+            if workload not in engines:
+                current_workload = get_workload(arguments, workload, local_id)
+                current_workload.prepare()
+                engines[workload] = RunEngine(
+                    local_id,
+                    workload,
+                    current_workload.isolate_cpus,
+                    current_workload.background_cpus,
+                    current_workload.threads,
+                    current_workload.pause,
+                    current_workload.interval,
+                    current_workload.clients,
+                    current_workload.monitor,
+                    current_workload.docker,
+                    current_workload.command,
+                    current_workload.cooldown,
+                )
+                engines[workload].open()
+
+            try:
+                returncode = engines[workload].run(image, run)
+            finally:
+                stop.set()
+
+            # Send the results and the log of the run with it
+            directory = image.replace(":", "", 1)
+            files = dict()
+            for local, remote in [
+                (engines[workload].get_result(image, run), f"results/experiment-{exp_id}"),
+                (f"logs/experiment-{local_id}/{workload}/{directory}/run-{run}.txt", f"logs/experiment-{exp_id}"),
+            ]:
+                if os.path.exists(local):
+                    with open(local, "rb") as f:
+                        files[remote + local.split(local_id, 1)[1]] = f.read()
+            coordinator.finish(host, task, returncode, files)
+            task = None
+    except BaseException:
+        # Give the interrupted run back, so it does not wait for its lease to expire
+        if task:
+            try:
+                coordinator.release(host, task)
+            except (OSError, EOFError):
+                pass
+        raise
+    finally:
+        # Send the logs of the preparation (and the runs on this host) of every workload
+        for workload, engine in engines.items():
+            engine.close()
+            for file in ["info.txt", "warmup.txt"]:
+                local = f"logs/experiment-{local_id}/{workload}/{file}"
+                if os.path.exists(local):
+                    with open(local, "rb") as f:
+                        coordinator.put_file(f"logs/experiment-{exp_id}/{workload}/hosts/{host}/{file}", f.read())
+        coordinator.leave(host)
+    return 0
@@ -0,0 +1,243 @@
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from email.utils import formatdate
+
+from scripts.cooldown import Cooldown
+from scripts.sampler import FakePowercap, Powercap, ProcStat, sample
+
+# EnergiBridge binary used by the greenserver monitor
+ENERGIBRIDGE = os.environ.get(
+    "ENERGIBRIDGE", "/home/tdurieux/git/EnergiBridge/target/release/energibridge"
+)
+
+
+def get_dockerfile(image: str):
+    """Returns the Dockerfile of the workload for the given base image (see scripts/prepare).
+
+    Args:
+        image: The base image.
+
+    Returns:
+        The name of the Dockerfile.
+    """
+    if image.startswith("ubuntu") or image.startswith("debian"):
+        return "Dockerfile"
+    return f"Dockerfile.{image.split('@')[0].split(':')[0]}"
+
+
+def get_date():
+    # The same format as `date -R`
+    return formatdate(localtime=True)
+
+
+class RunEngine:
+    """Runs and monitors the queue of a workload in a single process.
+
+    The engine replaces one invocation of scripts/monitor per run: the environment and commands are built
+    without a shell, the output of each run is timestamped in-process (like `ts %.s`), the info log stays
+    open between runs, and the native and fake monitors sample in this process with counters that are
+    only discovered once. The results and logs have the same layout as scripts/monitor.
+    """
+
+    def __init__(
+        self,
+        exp_id: str,
+        workload: str,
+        isolate_cpus: str,
+        background_cpus: str,
+        threads: int,
+        pause: int,
+        interval: int,
+        clients: int,
+        monitor: str,
+        docker: bool,
+        command: str,
+        cooldown: Cooldown = None,
+    ):
+        self.exp_id = exp_id
+        self.workload = workload
+        self.isolate_cpus = isolate_cpus
+        self.background_cpus = background_cpus
+        self.threads = threads
+        self.pause = pause
+        self.interval = interval
+        self.clients = clients
+        self.monitor = monitor
+        self.docker = docker
+        self.command = command
+        self.cooldown = cooldown
+
+        # Time (s) of the pause before the last run
+        self.paused = 0
+        self.info = None
+        self.powercap = None
+        self.proc_stat = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        os.makedirs(f"logs/experiment-{self.exp_id}/{self.workload}", exist_ok=True)
+        self.info = open(f"logs/experiment-{self.exp_id}/{self.workload}/info.txt", "a")
+        if self.monitor == "native":
+            self.powercap = Powercap()
+        elif self.monitor == "fake":
+            self.powercap = FakePowercap()
+        if self.powercap is not None:
+            self.proc_stat = ProcStat()
+
+    def close(self):
+        if self.info is not None:
+            self.info.close()
+            self.info = None
+
+    def get_environment(self, image: str):
+        return {
+            "NAME": image.split("@")[0],
+            "FILE": get_dockerfile(image),
+            "IMAGE": image,
+            "ISOLATE_CPU": self.isolate_cpus,
+            "BACKGROUND_CPU": self.background_cpus,
+            "THREADS_CPU": str(self.threads),
+        }
+
+    def get_monitor(self, result: str):
+        """Returns the command that wraps the workload to monitor it (empty for in-process monitors)."""
+        if self.monitor == "perf":
+            return [
+                "perf",
+                "stat",
+                "-I",
+                str(self.interval),
+                "-x",
+                "\t",
+                "-o",
+                result,
+                "--append",
+                "-C",
+                self.isolate_cpus,
+                "-e",
+                "power/energy-pkg/",
+            ]
+        elif self.powercap is not None:
+            return []
+        return [ENERGIBRIDGE, "-i", str(self.interval), "-o", result, "--"]
+
+    def get_command(self):
+        if self.docker:
+            command = [
+                "docker",
+                "compose",
+                "-f",
+                f"workloads/{self.workload}/docker-compose.yml",
+                "up",
+            ]
+            if self.clients > 0:
+                command += ["--scale", f"client={self.clients}"]
+            return command + ["--abort-on-container-exit"]
+        return ["taskset", "-c", self.isolate_cpus] + shlex.split(self.command)
+
+    def get_result(self, image: str, run: int):
+        # The results directory of an image is its name without the first ":" (like ${BASE/:/})
+        directory = image.replace(":", "", 1)
+        return f"results/experiment-{self.exp_id}/{self.workload}/{directory}/run-{run}.tsv"
+
+    def discard(self, image: str, run: int):
+        """Moves the partial result of an interrupted run aside (to run-<n>.tsv.interrupted), so running it again
+        with the same number does not append to its samples (perf stat --append) or mix them with the new run.
+
+        Args:
+            image: The base image of the run.
+            run: The number of the run.
+        """
+        result = self.get_result(image, run)
+        if os.path.exists(result):
+            os.replace(result, f"{result}.interrupted")
+            print(f"Partial result of run {run} of {image} moved to {result}.interrupted")
+
+    def run(self, image: str, run: int):
+        """Pauses (at most the pause time if the cool-down is adaptive), then runs and monitors the workload once
+        for the given image.
+
+        Args:
+            image: The base image to run.
+            run: The current run in total.
+
+        Returns:
+            The exit code of the workload (or of the monitor wrapping it).
+        """
+        result = self.get_result(image, run)
+        log = f"logs/experiment-{self.exp_id}/{self.workload}/{image.replace(':', '', 1)}/run-{run}.txt"
+        os.makedirs(os.path.dirname(result), exist_ok=True)
+        os.makedirs(os.path.dirname(log), exist_ok=True)
+
+        if self.cooldown is not None:
+            self.paused = self.cooldown.wait(self.pause)
+        else:
+            time.sleep(self.pause)
+            self.paused = self.pause
+
+        self.info.write(f"{run}\t{image}\n")
+        self.info.flush()
+
+        environment = self.get_environment(image)
+        monitor = self.get_monitor(result)
+        command = self.get_command()
+
+        # In-process monitors do not wrap the command
+        monitor_log = shlex.join(monitor) if len(monitor) > 0 else f"[{self.monitor} sampler]"
+        with open(log, "a") as f:
+            f.write(f"Started at {get_date()}\n")
+            f.write(f"Pause (s): {self.paused:.3f}\n")
+            f.write(
+                "CMD: "
+                + " ".join(f"{key}={value}" for key, value in environment.items())
+                + f" {monitor_log} {shlex.join(command)} \n\n\n"
+            )
+            f.flush()
+
+            # The CPU usage of the first sample is measured from here, not from the previous run or pause
+            if self.proc_stat is not None:
+                self.proc_stat.read()
+            start = time.time_ns()
+            process = subprocess.Popen(
+                monitor + command,
+                env={**os.environ, **environment},
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            output = threading.Thread(target=self.log_output, args=(process, f))
+            output.start()
+            if self.powercap is not None:
+                sample(result, self.interval, process, self.powercap, self.proc_stat)
+            process.wait()
+            stop = time.time_ns()
+            output.join()
+
+            if self.docker:
+                # Remove the containers
+                subprocess.call(
+                    ["docker", "compose", "-f", f"workloads/{self.workload}/docker-compose.yml", "down"],
+                    env={**os.environ, **environment},
+                )
+
+            f.write(f"\n\nStart time (ns): {start}\nStop time (ns): {stop}\n")
+            f.write(f"\n\nEnded at {get_date()}\n")
+        return process.returncode
+
+    def log_output(self, process: subprocess.Popen, log):
+        # Prefix every line with the time in seconds (like `ts %.s`) and write it to the log and stdout
+        for line in iter(process.stdout.readline, b""):
+            line = f"{time.time():.6f} {line.decode(errors='replace')}"
+            log.write(line)
+            sys.stdout.write(line)
+        log.flush()
+        sys.stdout.flush()
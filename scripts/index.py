@@ -0,0 +1,533 @@
+import getopt
+import glob
+import json
+import os
+import sqlite3
+import statistics
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+# Database of the index, next to the experiments it indexes
+DATABASE = "results/index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    experiment TEXT PRIMARY KEY,
+    date TEXT,
+    arguments TEXT,
+    signature TEXT
+);
+CREATE TABLE IF NOT EXISTS workloads (
+    experiment TEXT,
+    workload TEXT,
+    cpus TEXT,
+    topology TEXT,
+    PRIMARY KEY (experiment, workload)
+);
+CREATE TABLE IF NOT EXISTS images (
+    experiment TEXT,
+    workload TEXT,
+    image TEXT,
+    build_time REAL,
+    build_status TEXT,
+    hash TEXT,
+    PRIMARY KEY (experiment, workload, image)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    experiment TEXT,
+    workload TEXT,
+    image TEXT,
+    run INTEGER,
+    position INTEGER,
+    host TEXT,
+    file TEXT,
+    PRIMARY KEY (experiment, workload, run)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    experiment TEXT,
+    workload TEXT,
+    image TEXT,
+    run INTEGER,
+    metric TEXT,
+    value REAL,
+    PRIMARY KEY (experiment, workload, run, metric)
+);
+CREATE INDEX IF NOT EXISTS metrics_query ON metrics (workload, metric, image);
+CREATE INDEX IF NOT EXISTS experiments_date ON experiments (date);
+"""
+
+# Tables with the rows of an experiment (removed when it is indexed again)
+TABLES = ["workloads", "images", "runs", "metrics", "experiments"]
+
+# Aggregates of the metrics of the runs that can be queried
+STATISTICS = {
+    "median": "MEDIAN(value)",
+    "mean": "AVG(value)",
+    "std": "STDEV(value)",
+    "min": "MIN(value)",
+    "max": "MAX(value)",
+    "count": "COUNT(value)",
+}
+
+
+class Median:
+    def __init__(self):
+        self.values = list()
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return statistics.median(self.values) if len(self.values) > 0 else None
+
+
+class Stdev(Median):
+    def finalize(self):
+        return statistics.stdev(self.values) if len(self.values) > 1 else None
+
+
+def connect(database: str = DATABASE):
+    """Opens the index (creating it if needed), with the MEDIAN and STDEV aggregates registered."""
+    if os.path.dirname(database) != "":
+        os.makedirs(os.path.dirname(database), exist_ok=True)
+    connection = sqlite3.connect(database)
+    connection.create_aggregate("MEDIAN", 1, Median)
+    connection.create_aggregate("STDEV", 1, Stdev)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_date(experiment: str, directory: str):
+    # The date is in the id of the experiment (<date> or <date>-<host> for the local tree of a worker)
+    try:
+        return datetime.strptime(experiment[:15], "%Y%m%dT%H%M%S").isoformat()
+    except ValueError:
+        return datetime.fromtimestamp(os.path.getmtime(directory)).isoformat()
+
+
+def parse_info(file: str):
+    """Reads the cpus, topology, build times and total order of a workload from its info.txt.
+
+    An info.txt has one block per preparation (e.g. again after --resume); a run that appears more than
+    once in the total order (an interrupted run that was run again) keeps its last position.
+
+    Args:
+        file: The info.txt of the workload.
+
+    Returns:
+        A dictionary with the cpus, the topology, the builds ({image: (time, status, hash)}) and the
+        order ({run: (position, image, host)}).
+    """
+    info = {"cpus": None, "topology": None, "builds": dict(), "order": dict()}
+    section = None
+    position = 0
+    with open(file) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("### "):
+                section = None
+            elif line.startswith("# cpus:"):
+                info["cpus"] = line.split(":", 1)[1].strip()
+            elif line.startswith("# topology:"):
+                info["topology"] = line[len("# topology:") :].strip()
+            elif line.startswith("# packed on "):
+                # The cores of a packed workload (measure.py --pack) replace the cpuset of the experiment
+                info["topology"] = line[len("# packed on ") :].strip()
+            elif line.startswith("#"):
+                section = line[2:].split(" (")[0].strip()
+            elif line.strip() == "":
+                continue
+            elif section == "build times":
+                fields = line.split("\t")
+                if len(fields) >= 2:
+                    try:
+                        time = float(fields[1])
+                    except ValueError:
+                        time = None
+                    fields += [None] * (4 - len(fields))
+                    info["builds"][fields[0]] = (time, fields[2], fields[3])
+            elif section == "total order":
+                fields = line.split("\t")
+                if len(fields) >= 2 and fields[0].isdigit():
+                    position += 1
+                    info["order"][int(fields[0])] = (position, fields[1], fields[2] if len(fields) > 2 else None)
+    return info
+
+
+def get_signature(files: list):
+    # The files an experiment is indexed from, with their size and modification time
+    signature = list()
+    for file in sorted(files):
+        stat = os.stat(file)
+        signature.append([file, stat.st_size, stat.st_mtime_ns])
+    return json.dumps(signature)
+
+
+def get_experiment_files(results: str, logs: str, experiment: str):
+    return (
+        glob.glob(f"{logs}/experiment-{experiment}/*/info.txt")
+        + glob.glob(f"{logs}/experiment-{experiment}/experiment.json")
+        + glob.glob(f"{results}/experiment-{experiment}/*/*.tsv")
+    )
+
+
+def get_experiments(results: str = "results"):
+    return sorted(
+        os.path.basename(directory)[len("experiment-") :]
+        for directory in glob.glob(f"{results}/experiment-*")
+        if os.path.isdir(directory)
+    )
+
+
+def index_experiment(connection, experiment: str, results: str = "results", logs: str = "logs", force: bool = False):
+    """Indexes (or indexes again) the workloads, images, runs and per-run metrics of an experiment.
+
+    The metrics of the runs are the columns of the summaries of the images (<workload>/<image>.tsv, written
+    by parse.py); runs that are not parsed yet are indexed without metrics. An experiment whose files did
+    not change since it was indexed is skipped.
+
+    Args:
+        connection: The index (see connect).
+        experiment: The id of the experiment.
+        results: The results directory.
+        logs: The logs directory.
+        force: Whether to index the experiment even if its files did not change.
+
+    Returns:
+        Whether the experiment was indexed.
+    """
+    directory = f"{results}/experiment-{experiment}"
+    signature = get_signature(get_experiment_files(results, logs, experiment))
+    row = connection.execute(
+        "SELECT signature FROM experiments WHERE experiment = ?", (experiment,)
+    ).fetchone()
+    if row is not None and row[0] == signature and not force:
+        return False
+
+    arguments = None
+    if os.path.exists(f"{logs}/experiment-{experiment}/experiment.json"):
+        with open(f"{logs}/experiment-{experiment}/experiment.json") as f:
+            arguments = json.dumps(json.load(f).get("arguments"))
+
+    with connection:
+        for table in TABLES:
+            connection.execute(f"DELETE FROM {table} WHERE experiment = ?", (experiment,))
+        connection.execute(
+            "INSERT INTO experiments VALUES (?, ?, ?, ?)",
+            (experiment, get_date(experiment, directory), arguments, signature),
+        )
+
+        workloads = sorted(
+            workload
+            for workload in os.listdir(directory)
+            if os.path.isdir(f"{directory}/{workload}")
+        )
+        for workload in workloads:
+            info = dict(cpus=None, topology=None, builds=dict(), order=dict())
+            if os.path.exists(f"{logs}/experiment-{experiment}/{workload}/info.txt"):
+                info = parse_info(f"{logs}/experiment-{experiment}/{workload}/info.txt")
+            connection.execute(
+                "INSERT INTO workloads VALUES (?, ?, ?, ?)",
+                (experiment, workload, info["cpus"], info["topology"]),
+            )
+
+            # The directories of the images drop the colon of the digest (see measure.py)
+            images = {image.replace(":", "", 1): image for _, image, _ in info["order"].values()}
+            images.update({image.replace(":", "", 1): image for image in info["builds"]})
+            for name in os.listdir(f"{directory}/{workload}"):
+                if os.path.isdir(f"{directory}/{workload}/{name}"):
+                    images.setdefault(name, name)
+            for name, image in sorted(images.items()):
+                time, status, digest = info["builds"].get(image, (None, None, None))
+                connection.execute(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)",
+                    (experiment, workload, image, time, status, digest),
+                )
+
+            runs = dict()
+            for run, (position, image, host) in info["order"].items():
+                runs[run] = [image, position, host, None]
+            for name, image in images.items():
+                for file in glob.glob(f"{directory}/{workload}/{name}/run-*.tsv"):
+                    run = os.path.basename(file)[4:-4]
+                    if run.isdigit():
+                        runs.setdefault(int(run), [image, None, None, None])[3] = file
+            connection.executemany(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(experiment, workload, image, run, position, host, file) for run, (image, position, host, file) in runs.items()],
+            )
+
+            for name, image in sorted(images.items()):
+                summary = f"{directory}/{workload}/{name}.tsv"
+                if not os.path.exists(summary):
+                    continue
+                try:
+                    df = pd.read_csv(summary, sep="\t")
+                except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError):
+                    print(f"{summary}: could not be read")
+                    continue
+                if "RUN" not in df:
+                    continue
+                df = df.melt(id_vars="RUN", var_name="metric", value_name="value").dropna()
+                connection.executemany(
+                    "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (experiment, workload, image, int(run), metric, float(value))
+                        for run, metric, value in df.itertuples(index=False)
+                    ],
+                )
+    return True
+
+
+def update(connection, results: str = "results", logs: str = "logs", experiments: list = None, force: bool = False):
+    """Indexes the given experiments (all experiments in the results directory by default).
+
+    Returns:
+        The ids of the experiments that were indexed.
+    """
+    indexed = list()
+    for experiment in experiments or get_experiments(results):
+        if not os.path.isdir(f"{results}/experiment-{experiment}"):
+            print(f"Experiment {experiment} not found in {results}")
+            continue
+        if index_experiment(connection, experiment, results, logs, force):
+            indexed.append(experiment)
+    return indexed
+
+
+def get_filter(workload: str = None, image: str = None, experiments: list = None):
+    """Returns the conditions and parameters that select the rows of a workload, image and experiments.
+
+    An image matches its name with or without the tag and digest (e.g. "alpine" matches "alpine@sha256:...").
+    """
+    conditions = list()
+    parameters = {"workload": workload, "image": image}
+    if workload is not None:
+        conditions.append("workload = :workload")
+    if image is not None:
+        conditions.append("(image = :image OR substr(image, 1, length(:image) + 1) IN (:image || '@', :image || ':'))")
+    if experiments is not None:
+        conditions.append(f"experiment IN ({', '.join(f':experiment{i}' for i in range(len(experiments)))})")
+        parameters.update({f"experiment{i}": experiment for i, experiment in enumerate(experiments)})
+    return conditions, parameters
+
+
+def query(
+    connection,
+    metric: str = "ENERGY (J)",
+    workload: str = None,
+    image: str = None,
+    experiments: list = None,
+    last: int = None,
+    statistic: str = "median",
+):
+    """Aggregates a metric of the runs per experiment, workload and image.
+
+    Args:
+        connection: The index (see connect).
+        metric: The metric (a column of the summaries, e.g. "ENERGY (J)" or "TIME (s)").
+        workload: The workload (all workloads if None).
+        image: The image, with or without its tag and digest (all images if None).
+        experiments: The experiments (all experiments if None).
+        last: Only the last experiments (by date) that have a run of the workload and image.
+        statistic: The aggregate (see STATISTICS).
+
+    Returns:
+        A dataframe with the experiment, date, workload, image, number of runs and the statistic.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Statistic must be one of {', '.join(STATISTICS)}")
+    conditions, parameters = get_filter(workload, image, experiments)
+    conditions.insert(0, "metric = :metric")
+    parameters.update({"metric": metric, "last": last})
+    where = " AND ".join(conditions)
+    if last is not None:
+        where += (
+            " AND experiment IN (SELECT experiment FROM experiments WHERE experiment IN "
+            f"(SELECT experiment FROM metrics WHERE {where}) ORDER BY date DESC LIMIT :last)"
+        )
+    return pd.read_sql_query(
+        f"SELECT experiment, date, workload, image, COUNT(value) AS runs, {STATISTICS[statistic]} AS {statistic} "
+        f"FROM metrics JOIN experiments USING (experiment) WHERE {where} "
+        "GROUP BY experiment, workload, image ORDER BY date, workload, image",
+        connection,
+        params=parameters,
+    )
+
+
+def query_runs(connection, workload: str = None, image: str = None, experiments: list = None, metric: str = "ENERGY (J)"):
+    """Returns the runs (in total order) with their host and the value of a metric."""
+    conditions, parameters = get_filter(workload, image, experiments)
+    parameters["metric"] = metric
+    return pd.read_sql_query(
+        "SELECT experiment, workload, image, run, position, host, value FROM runs LEFT JOIN "
+        "(SELECT experiment, workload, run, value FROM metrics WHERE metric = :metric) USING (experiment, workload, run) "
+        f"WHERE {' AND '.join(['1'] + conditions)} ORDER BY experiment, workload, position, run",
+        connection,
+        params=parameters,
+    ).rename(columns={"value": metric})
+
+
+def query_values(connection, experiments: list, metrics: list, workload: str = None, image: str = None):
+    """Returns the metrics of every run of the experiments, with one column per metric.
+
+    Args:
+        connection: The index (see connect).
+        experiments: The experiments.
+        metrics: The metrics (columns of the summaries).
+        workload: The workload (all workloads if None).
+        image: The image, with or without its tag and digest (all images if None).
+
+    Returns:
+        A dataframe with the experiment, workload, image, run and the metrics (runs without any of them are left out).
+    """
+    conditions, parameters = get_filter(workload, image, experiments)
+    conditions.append(f"metric IN ({', '.join(f':metric{i}' for i in range(len(metrics)))})")
+    parameters.update({f"metric{i}": metric for i, metric in enumerate(metrics)})
+    df = pd.read_sql_query(
+        f"SELECT experiment, workload, image, run, metric, value FROM metrics WHERE {' AND '.join(conditions)}",
+        connection,
+        params=parameters,
+    )
+    df = df.pivot_table(index=["experiment", "workload", "image", "run"], columns="metric", values="value")
+    return df.reindex(columns=metrics).dropna().reset_index().rename_axis(columns=None)
+
+
+def list_experiments(connection):
+    """Returns the indexed experiments with their workloads and number of runs."""
+    return pd.read_sql_query(
+        "SELECT experiment, date, COUNT(DISTINCT workload) AS workloads, COUNT(run) AS runs "
+        "FROM experiments LEFT JOIN runs USING (experiment) GROUP BY experiment ORDER BY date",
+        connection,
+    )
+
+
+def help():
+    print(
+        "Indexes the experiments in the results and logs directories, and queries the metrics of their runs.\n",
+        "Usage: python scripts/index.py [options]",
+        "Options:",
+        "   -u --update         Index the new and changed experiments (all experiments, or those given with -e)",
+        "   --force             Index the experiments again even if they did not change",
+        "   --experiments       List the indexed experiments",
+        "   --runs              List the runs (in total order) instead of aggregating them",
+        "   -e --experiment     Experiment id; can be used for multiple experiments",
+        "   -l --workload       Workload to query",
+        "   -b --base           Image to query (e.g. alpine or alpine@sha256:...)",
+        "   -m --metric         Metric to query (a column of the summaries) (default ENERGY (J))",
+        "   -s --statistic      Statistic of the metric: median, mean, std, min, max or count (default median)",
+        "   -n --last           Only the last n experiments that have runs of the workload and image",
+        "   --results           Results directory (default results)",
+        "   --logs              Logs directory (default logs)",
+        "   --database          Index database (default results/index.db)",
+        sep=os.linesep,
+    )
+
+
+def main(argv):
+    database = DATABASE
+    results = "results"
+    logs = "logs"
+    experiments = None
+    workload = None
+    image = None
+    metric = "ENERGY (J)"
+    statistic = "median"
+    last = None
+    mode = "query"
+    refresh = False
+    force = False
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "ue:l:b:m:s:n:h",
+            [
+                "update",
+                "force",
+                "experiments",
+                "runs",
+                "experiment=",
+                "workload=",
+                "base=",
+                "metric=",
+                "statistic=",
+                "last=",
+                "results=",
+                "logs=",
+                "database=",
+                "help",
+            ],
+        )
+    except getopt.GetoptError as e:
+        print(e)
+        help()
+        return 1
+    for opt, arg in opts:
+        if opt in ["-u", "--update"]:
+            refresh = True
+        elif opt == "--force":
+            force = True
+        elif opt == "--experiments":
+            mode = "experiments"
+        elif opt == "--runs":
+            mode = "runs"
+        elif opt in ["-e", "--experiment"]:
+            experiments = (experiments or list()) + [arg]
+        elif opt in ["-l", "--workload"]:
+            workload = arg
+        elif opt in ["-b", "--base"]:
+            image = arg
+        elif opt in ["-m", "--metric"]:
+            metric = arg
+        elif opt in ["-s", "--statistic"]:
+            statistic = arg
+        elif opt in ["-n", "--last"]:
+            try:
+                last = int(arg)
+            except ValueError:
+                print("Number of experiments must be an integer")
+                return 1
+        elif opt == "--results":
+            results = arg.rstrip("/")
+        elif opt == "--logs":
+            logs = arg.rstrip("/")
+        elif opt == "--database":
+            database = arg
+        elif opt in ["-h", "--help"]:
+            help()
+            return 0
+
+    connection = connect(database)
+    try:
+        if refresh:
+            indexed = update(connection, results, logs, experiments, force)
+            print(f"Indexed {len(indexed)} experiment(s){': ' + ', '.join(indexed) if indexed else ''}")
+            if mode == "query" and workload is None and image is None:
+                return 0
+
+        with pd.option_context("display.max_rows", None, "display.width", None):
+            if mode == "experiments":
+                df = list_experiments(connection)
+            elif mode == "runs":
+                df = query_runs(connection, workload, image, experiments, metric)
+            else:
+                try:
+                    df = query(connection, metric, workload, image, experiments, last, statistic)
+                except ValueError as e:
+                    print(e)
+                    return 1
+            if len(df) == 0:
+                print("No indexed runs match the query (index the experiments with --update)")
+                return 1
+            print(df.to_string(index=False))
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
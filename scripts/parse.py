@@ -1,16 +1,35 @@
+import csv
 import getopt
 import sys
 import glob
+import hashlib
+import json
+import shutil
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import os
 from pathlib import Path
 import numpy as np
-from datetime import datetime
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 
 import seaborn as sns
 
+# Directory of the parsed run cache; caching is disabled if empty (enabled with -c/--cache)
+CACHE_DIRECTORY = ""
+# Run files larger than this size (bytes) are summarized in chunks instead of loaded at once
+STREAM_SIZE = 64 * 1024 * 1024
+# Number of samples per chunk when streaming a run file
+CHUNK_SIZE = 100000
+# Range (J) of the energy counters; if None, a wrap is corrected from the values around it
+COUNTER_WIDTH = None
+# Maximum number of points of a plotted time series; series are not downsampled if 0
+PLOT_POINTS = 2000
+# Percentiles of the bands of the runs aggregated on a time grid (see resample_runs)
+PERCENTILES = [5, 95]
+
 
 def create_file(file_name: str, df: pd.DataFrame, directory: str):
     # image = image.replace(":", "")
@@ -114,12 +133,9 @@ def parse_greenserver_samples(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
         print(directory)
         files = get_files(f"{directory}/{image}", "*.tsv")
         print(image)
-        df_avg = pd.DataFrame()
-        df_time = pd.DataFrame()
+        runs = list()
         cores = [0]
         cpus = [0, 12]
-        largest = 0
-        x = 0
         for file in files:
             base, df = read_tsv(file)
             # print(base)
@@ -133,32 +149,19 @@ def parse_greenserver_samples(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
             df_samples = get_greenserver_time(df_samples, df)
             df_samples = get_greenserver_average_power(df_samples, df, cores)
             df_samples = get_greenserver_cpu_usage(df_samples, df, cpus)
-            if len(df_samples[f"CORE0_AVERAGE_POWER (W)"]) > largest:
-                largest = len(df_samples[f"CORE0_AVERAGE_POWER (W)"])
-                x = base
-                df_time = get_greenserver_time(pd.DataFrame(), df)
-                # print(df_time)
-            if df_avg.empty:
-                df_avg = df_samples
-            else:
-                df_avg = df_avg.add(df_samples, fill_value=0)
+            runs.append(df_samples.drop(columns=["TIME_DELTA (s)", "INTERVAL_ELAPSED_TIME (s)"]))
             # df = get_greenserver_cpu_usage(df, [0, 12])
-        df_avg = df_avg / 30
-        df_avg = pd.concat([df_time, df_avg], axis=1)
+        # Aggregate the runs on a common time grid (runs can have different lengths and sampling jitter)
+        df_avg = resample_runs(runs)
         print(df_avg)
 
         sns.set_style("white")
         plt.figure(figsize=(10, 7))
 
-        x_value = "INTERVAL_ELAPSED_TIME (s)"
+        x_value = "ELAPSED_TIME (s)"
         y_value1 = f"CORE0_AVERAGE_POWER (W)"
         y_value2 = f"CPU0_USAGE_DELTA"
-        ax = sns.lineplot(
-            x=x_value,
-            y=y_value1,
-            data=df_avg,
-            # color="b",
-        )
+        ax = plot_band(df_avg, y_value1, x_value)
         # sns.lineplot(
         #     x=x_value,
         #     y="CPU12_USAGE_DELTA",
@@ -198,11 +201,115 @@ def parse_greenserver_samples(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
         print(df_samples)
 
 
+def get_statistic_column(column: str, statistic: str):
+    # The column of a statistic of a part, before its unit (e.g. "CORE0_AVERAGE_POWER_MEAN (W)")
+    if " (" in column:
+        name, unit = column.split(" (", 1)
+        return f"{name}_{statistic} ({unit}"
+    return f"{column}_{statistic}"
+
+
+def interpolate(times: np.ndarray, values: np.ndarray, grid: np.ndarray):
+    """Linearly interpolates every column of a run at the points of a time grid.
+
+    Args:
+        times: The (non-decreasing) elapsed time of every sample.
+        values: The samples, as a (samples, columns) matrix.
+        grid: The time grid.
+
+    Returns:
+        A (grid, columns) matrix, with NaN at the points before the first or after the last sample.
+    """
+    result = np.full((len(grid), values.shape[1]), np.nan)
+    if len(times) < 2:
+        return result
+    index = np.clip(np.searchsorted(times, grid, side="right") - 1, 0, len(times) - 2)
+    start = times[index]
+    end = times[index + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = np.clip(np.where(end > start, (grid - start) / (end - start), 0), 0, 1)[:, np.newaxis]
+    inside = (grid >= times[0]) & (grid <= times[-1])
+    result[inside] = (values[index] * (1 - weight) + values[index + 1] * weight)[inside]
+    return result
+
+
+def resample_runs(
+    runs: list,
+    x: str = "ELAPSED_TIME (s)",
+    step: float = None,
+    percentiles: list = PERCENTILES,
+):
+    """Puts the samples of several runs on a common elapsed-time grid and aggregates them per grid point.
+
+    Every run is interpolated at the grid points and the runs are stacked into a (runs, grid, columns)
+    array. A run only counts at the points within its duration, so the statistics of every point are
+    computed over the runs that cover it.
+
+    Args:
+        runs: The samples of every run, as dataframes with the x column and the (numeric) columns to aggregate.
+        x: The elapsed time column.
+        step: The interval of the grid (s); the median interval between samples by default.
+        percentiles: The percentiles of the bands.
+
+    Returns:
+        A dataframe with the grid (x), the number of runs at every point (RUNS), and the mean, median and
+        percentiles of every column (see get_statistic_column).
+    """
+    runs = [run for run in runs if len(run) > 0]
+    if len(runs) == 0:
+        return pd.DataFrame()
+    columns = [
+        key for key in runs[0].keys() if key != x and pd.api.types.is_numeric_dtype(runs[0][key])
+    ]
+    # Clock adjustments could make the elapsed time go backwards
+    times = [np.maximum.accumulate(run[x].to_numpy(dtype=float)) for run in runs]
+    if step is None:
+        intervals = np.concatenate([np.diff(time) for time in times])
+        intervals = intervals[intervals > 0]
+        step = float(np.median(intervals)) if len(intervals) > 0 else 1.0
+    end = max(time[-1] for time in times)
+    grid = np.arange(int(np.floor(end / step)) + 1) * step
+
+    stacked = np.stack(
+        [interpolate(time, run[columns].to_numpy(dtype=float), grid) for time, run in zip(times, runs)]
+    )
+    count = np.sum(~np.isnan(stacked[:, :, 0]), axis=0) if len(columns) > 0 else np.full(len(grid), len(runs))
+    data = {x: grid, "RUNS": count}
+    with warnings.catch_warnings():
+        # Points without any run (e.g. a column that is NaN in every run) are NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(stacked, axis=0)
+        median = np.nanmedian(stacked, axis=0)
+        bands = np.nanpercentile(stacked, percentiles, axis=0)
+    for j, column in enumerate(columns):
+        data[get_statistic_column(column, "MEAN")] = mean[:, j]
+        data[get_statistic_column(column, "MEDIAN")] = median[:, j]
+        for percentile, band in zip(percentiles, bands):
+            data[get_statistic_column(column, f"P{percentile:g}")] = band[:, j]
+    return pd.DataFrame(data)
+
+
+def plot_band(df: pd.DataFrame, column: str, x: str = "ELAPSED_TIME (s)", label: str = None):
+    """Plots the mean of a column over the runs (see resample_runs), with the band between its percentiles.
+
+    Returns:
+        The axes of the plot.
+    """
+    df = df.iloc[downsample(df[get_statistic_column(column, "MEAN")].values)]
+    ax = plt.gca()
+    line = ax.plot(df[x], df[get_statistic_column(column, "MEAN")], label=label)[0]
+    low, high = get_statistic_column(column, f"P{PERCENTILES[0]:g}"), get_statistic_column(
+        column, f"P{PERCENTILES[-1]:g}"
+    )
+    if low in df and high in df:
+        ax.fill_between(df[x], df[low], df[high], color=line.get_color(), alpha=0.2, linewidth=0)
+    ax.set(xlabel=x, ylabel=column)
+    return ax
+
+
 def get_greenserver_average_power(
     df_samples: pd.DataFrame, df: pd.DataFrame, cpus: list
 ):
-    df_delta = df.filter(regex=r"CORE\d+_ENERGY \(J\)").copy()
-
     if "GPU_POWER (W)" in df:
         df_samples[f"GPU_AVERAGE_POWER (W)"] = (
             df[f"GPU_POWER (W)"]
@@ -216,48 +323,28 @@ def get_greenserver_average_power(
         #     df_samples[f"GPU_AVERAGE_POWER (W)"].mean()
         #     / ((df_samples["ELAPSED_TIME (s)"].max() * 10))
         # )
-    for cpu in cpus:
-        diff = 0
-        i = df_delta[f"CORE{cpu}_ENERGY (J)"].lt(0).idxmax()
-        if i > 0:
-            diff = abs(
-                df_delta[f"CORE{cpu}_ENERGY (J)"].iloc[i - 1]
-                - abs(df_delta[f"CORE{cpu}_ENERGY (J)"].iloc[i])
-            )
-        df_delta[f"CORE{cpu}_ENERGY (J)"] = (
-            df_delta[f"CORE{cpu}_ENERGY (J)"].diff().fillna(0)
-        )
-
-        if diff > 0:
-            df_delta[f"CORE{cpu}_ENERGY (J)"].at[i] = diff
 
-        df_samples[f"CORE{cpu}_AVERAGE_POWER (W)"] = (
-            df_delta[f"CORE{cpu}_ENERGY (J)"]
-            .div(df_samples["TIME_DELTA (s)"], axis=0)
-            .fillna(0)
-            # .multiply(1000)
-        )
+    # Unwrap the energy counters of all cores at once
+    keys = [f"CORE{cpu}_ENERGY (J)" for cpu in cpus]
+    deltas, _ = unwrap_energy(df[keys].values.astype(float), COUNTER_WIDTH)
+    time_delta = df_samples["TIME_DELTA (s)"].values.astype(float)[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        power = deltas / time_delta
+        power[~np.isfinite(power)] = 0
+        sample_diff = np.diff(deltas, axis=0, prepend=deltas[:1]) / time_delta
+        sample_diff[np.isnan(sample_diff)] = 0
 
-        df_samples[f"CORE{cpu}_ENERGY_SAMPLE (J/interval)"] = (
-            df_delta[f"CORE{cpu}_ENERGY (J)"]
-            # .div(df_samples["TIME_DELTA (s)"], axis=0)
-            # .fillna(0)
-            # .multiply(1000)
-        )
-        df_samples[f"CORE{cpu}_ENERGY_SAMPLE_DIFF"] = (
-            df_samples[f"CORE{cpu}_ENERGY_SAMPLE (J/interval)"]
-            .diff()
-            .fillna(0)
-            .div(df_samples["TIME_DELTA (s)"], axis=0)
-            .fillna(0)
-        )
-        df_samples[f"CORE{cpu}_AVERAGE_POWER (W)"].replace(
-            [np.inf, -np.inf], 0, inplace=True
-        )
+    columns = dict()
+    for j, cpu in enumerate(cpus):
+        columns[f"CORE{cpu}_AVERAGE_POWER (W)"] = power[:, j]
+        columns[f"CORE{cpu}_ENERGY_SAMPLE (J/interval)"] = deltas[:, j]
+        columns[f"CORE{cpu}_ENERGY_SAMPLE_DIFF"] = sample_diff[:, j]
     # df_samples["TOTAL_AVERAGE_POWER (W)"] = (
     #     df_delta.sum(axis=1).div(df["Delta"], axis=0).fillna(0).multiply(1000)
     # )
-    return df_samples
+    return pd.concat(
+        [df_samples, pd.DataFrame(columns, index=df_samples.index)], axis=1
+    )
 
 
 def get_greenserver_cpu_usage(df_samples: pd.DataFrame, df: pd.DataFrame, cpus: list):
@@ -269,24 +356,284 @@ def get_greenserver_cpu_usage(df_samples: pd.DataFrame, df: pd.DataFrame, cpus:
     return df_samples
 
 
+def parse_time(times):
+    return pd.to_datetime(pd.Series(times)).values.astype("datetime64[ns]").astype(np.int64)
+
+
+def decode_time(times):
+    """Converts EnergiBridge timestamps (e.g. 2023-06-01T12:00:00.123456789) to nanoseconds since the epoch.
+
+    The fixed layout is decoded for the whole column at once from the characters of the timestamps;
+    columns that do not follow the layout, or that have anything but fractional digits after the seconds
+    (e.g. a UTC offset), are parsed by pandas instead.
+
+    Args:
+        times: The timestamps to convert.
+
+    Returns:
+        An int64 array with the timestamps in nanoseconds.
+    """
+    try:
+        values = np.asarray(times).astype("S")
+    except UnicodeEncodeError:
+        values = np.empty(0, dtype="S1")
+    size = values.dtype.itemsize
+    if len(values) == 0 or size < 19:
+        return parse_time(times)
+
+    chars = values.view(np.uint8).reshape(len(values), size)
+    # Non-digit characters wrap around to values above 9
+    digits = chars - np.uint8(ord("0"))
+    is_digit = digits <= 9
+    layout = (
+        is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]].all()
+        and (chars[:, [4, 7]] == ord("-")).all()
+        and np.isin(chars[:, 10], [ord("T"), ord(" ")]).all()
+        and (chars[:, [13, 16]] == ord(":")).all()
+    )
+    # Only a fraction may follow the seconds (shorter values are padded with null bytes)
+    if layout and size > 19:
+        padding = chars[:, 19:] == 0
+        layout = (
+            (padding[:, 0] | (chars[:, 19] == ord("."))).all()
+            and (padding[:, 1:] | is_digit[:, 20:]).all()
+        )
+    if not layout:
+        return parse_time(times)
+
+    def number(first: int, last: int, columns=digits, dtype=np.int32):
+        result = np.zeros(len(values), dtype=dtype)
+        for i in range(first, last):
+            result = result * 10 + columns[:, i]
+        return result
+
+    year = number(0, 4)
+    month = number(5, 7)
+    day = number(8, 10)
+    seconds = number(11, 13) * 3600 + number(14, 16) * 60 + number(17, 19)
+
+    # Fractional seconds (the padding counts as zeros); digits after nanoseconds are ignored
+    fraction = np.zeros((len(values), 9), dtype=np.uint8)
+    if size > 20:
+        width = min(size - 20, 9)
+        fraction[:, :width] = digits[:, 20 : 20 + width] * is_digit[:, 20 : 20 + width]
+    nanoseconds = number(0, 9, fraction)
+
+    # Days since the epoch of the (proleptic Gregorian) dates
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = (
+        year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    )
+    days = era * 146097 + day_of_era - 719468
+
+    return (days.astype(np.int64) * 86400 + seconds) * 10**9 + nanoseconds
+
+
 def get_greenserver_time(df_samples: pd.DataFrame, df: pd.DataFrame):
-    df_delta = df.filter(regex=r"Time").copy()
-    df_delta["TIME_NEW"] = pd.to_datetime(df_delta["Time"])
-    df_delta["TIME_OLD"] = pd.to_datetime(df_delta["Time"].shift(1).fillna(0))
-    df_delta["TIME_OLD"].at[0] = df_delta["TIME_NEW"].at[0]
-    df_samples["TIME_DELTA (s)"] = (
-        df_delta["TIME_NEW"] - df_delta["TIME_OLD"]
-    ).dt.total_seconds()
+    time = decode_time(df["Time"])
+    df_samples["TIME_DELTA (s)"] = np.diff(time, prepend=time[:1]) / 10**9
     # df_samples["TIME_DELTA (s)"] = df_delta["TIME_DELTA (s)"]
     df_samples["INTERVAL_ELAPSED_TIME (s)"] = df["Delta"].cumsum() / 1000
     df_samples["ELAPSED_TIME (s)"] = df_samples["TIME_DELTA (s)"].cumsum()
     return df_samples
 
 
-def parse_greenserver(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
+def get_greenserver_headers(keys: list):
+    headers = ["RUN", "TIME (s)"]
+    for key in keys:
+        power = f"{key[:-10]}AVERAGE_POWER (W)"
+        headers.extend([power, key])
+    headers.extend(["TOTAL_CORE_AVERAGE_POWER (W)", "TOTAL_CORE_ENERGY (J)"])
+    # if "GPU_POWER (W)" in df:
+    #     headers.extend(["GPU_ENERGY (J)"])
+    headers.extend(["ENERGY (J)"])
+    return headers
+
+
+def get_greenserver_run_data(run: int, total_time: float, keys: list, energies: dict, cores: list = None):
+    run_data = [run, total_time]
+
+    # The energy of a workload on its own physical cores (see read_cores) is the sum of their counters;
+    # a packed workload whose cores have no counters gets no energy rather than that of other workloads
+    core_keys = ["CORE0_ENERGY (J)"] if cores is None else get_core_keys(cores, keys)
+
+    # For each key, calculate the average power and energy, and the total values
+    total_energy = 0
+    total_power = 0
+    run_energy = 0
+    for key in keys:
+        energy = energies[key]
+        power = (energy / total_time) if total_time != 0 else 0
+        run_data.extend([power, energy])
+        total_energy += energy
+        total_power += power
+        if core_keys is not None and key in core_keys:
+            run_energy += energy
+
+    run_data.extend([total_power, total_energy])
+    # if "GPU_POWER (W)" in df:
+    #     df[f"GPU_POWER (W)"] = df[f"GPU_POWER (W)"].values.astype(float)
+    #     gpu_energy = np.trapz(
+    #         df[f"GPU_POWER (W)"], df_samples["ELAPSED_TIME (s)"]
+    #     )
+    #     run_data.extend([gpu_energy])
+    #     run_energy += gpu_energy
+    run_data.extend([run_energy if core_keys is not None else np.nan])
+    return run_data
+
+
+def get_core_keys(cores: list, keys: list):
+    """Maps the physical cores of a packed workload to the per-core energy counters of the run.
+
+    EnergiBridge names the counters by cpu id (CORE<cpu>_ENERGY (J)). The counter of a physical core is
+    shared by its SMT siblings, so every core is mapped to the counter of its first cpu that has one.
+
+    Args:
+        cores: The cpus of every physical core (see read_cores).
+        keys: The energy columns of the run.
+
+    Returns:
+        One energy column per core, or None if a core has no counter.
+    """
+    core_keys = list()
+    for cpus in cores:
+        counters = [f"CORE{cpu}_ENERGY (J)" for cpu in cpus if f"CORE{cpu}_ENERGY (J)" in keys]
+        if len(counters) == 0:
+            return None
+        core_keys.append(counters[0])
+    return core_keys
+
+
+def get_greenserver_total_time(start: str, end: str):
+    datetime_start, datetime_end = decode_time([start, end])
+    return (datetime_end - datetime_start) / 10**9
+
+
+def unwrap_energy(values: np.ndarray, width: float = None):
+    """Calculates the energy between consecutive samples of all energy counters at once, correcting every wrap.
+
+    Args:
+        values: The counter values, with one row per sample and one column per counter.
+        width: The range of the counters; a negative step is taken modulo this range. If None, a negative
+            step is replaced by the difference between the previous value and the absolute current value.
+
+    Returns:
+        The energy per sample (the first sample is 0), and the correction that was added to each sample.
+    """
+    previous = np.concatenate([values[:1], values[:-1]])
+    deltas = values - previous
+    if width is None:
+        unwrapped = np.abs(previous - np.abs(values))
+    else:
+        unwrapped = np.mod(deltas, width)
+    corrections = np.where(deltas < 0, unwrapped - deltas, 0)
+    return deltas + corrections, corrections
+
+
+def read_cores(directory: str):
+    """Returns the physical cores a workload was isolated on, if it shared the machine with other workloads.
+
+    The cores are listed in cores.txt in the results directory of the workload (one "<socket>:<core><TAB>cpus"
+    line per core, with the comma-separated cpu ids) when the workloads were packed on disjoint cores
+    (measure.py --pack).
+
+    Args:
+        directory: The results directory of the workload.
+
+    Returns:
+        The cpu ids of every core, or None if the workload was not packed.
+    """
+    try:
+        with open(f"{directory}/cores.txt") as f:
+            return [
+                [int(cpu) for cpu in line.split("\t")[1].split(",")] for line in f if line.strip() != ""
+            ]
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def parse_greenserver_run(file: str, keys: list, cores: list = None, cache: bool = True):
+    if os.path.getsize(file) > STREAM_SIZE:
+        return parse_greenserver_run_stream(file, keys, cores)
+
+    base, df = read_tsv(file, cache)
+
+    # Calculate the total time
+    total_time = get_greenserver_total_time(df["Time"].iloc[0], df["Time"].iloc[-1])
+
+    # The energy is the difference between the last and first values, corrected for the counter overflows
+    values = df[keys].values.astype(float)
+    _, corrections = unwrap_energy(values, COUNTER_WIDTH)
+    energy = values[-1] - values[0] + corrections.sum(axis=0)
+    energies = dict(zip(keys, energy))
+
+    return get_greenserver_run_data(int(base[4:]), total_time, keys, energies, cores)
+
+
+def parse_greenserver_run_stream(file: str, keys: list, cores: list = None, chunksize: int = CHUNK_SIZE):
+    """Summarizes a run file in a single pass over chunks of samples, so memory does not grow with the run length.
+
+    Only the first and last samples and the sum of the overflow corrections are kept,
+    which gives the same result as parse_greenserver_run.
+
+    Args:
+        file: The run file to summarize.
+        keys: The energy columns to summarize.
+        cores: The physical cores the energy of the run is attributed to (see read_cores).
+        chunksize: The number of samples to read at a time.
+
+    Returns:
+        The summary row of the run.
+    """
+    start = ""
+    end = ""
+    first = None
+    previous = None
+    corrections = 0
+    for chunk in pd.read_csv(
+        file,
+        sep="\t",
+        decimal=",",
+        usecols=["Time"] + keys,
+        chunksize=chunksize,
+    ):
+        values = chunk[keys].values.astype(float)
+        if first is None:
+            start = chunk["Time"].iloc[0]
+            first = values[0]
+            previous = values[:1]
+
+        # Include the last sample of the previous chunk to detect overflows between chunks
+        _, correction = unwrap_energy(np.concatenate([previous, values]), COUNTER_WIDTH)
+        corrections = corrections + correction.sum(axis=0)
+
+        previous = values[-1:]
+        end = chunk["Time"].iloc[-1]
+
+    energy = previous[0] - first + corrections
+    energies = dict(zip(keys, energy))
+
+    base = Path(file).stem
+    total_time = get_greenserver_total_time(start, end)
+    return get_greenserver_run_data(int(base[4:]), total_time, keys, energies, cores)
+
+
+def get_greenserver_images(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
+    """Collects the run files of every image of a workload, together with the energy columns to summarize.
+
+    Args:
+        directory: The results directory of the workload.
+        columns: The regex of the energy columns to summarize.
+
+    Returns:
+        A list of (directory, image, keys, files) tuples, one for each image with run files.
+    """
     print(directory)
     if not os.path.exists(directory):
-        return
+        return []
 
     images = [
         image
@@ -294,103 +641,166 @@ def parse_greenserver(directory: str, columns=r"CORE\d+_ENERGY \(J\)"):
         if os.path.isdir(f"{directory}/{image}")
     ]
 
+    summaries = list()
     for image in images:
         files = get_files(f"{directory}/{image}", "*.tsv")
         if len(files) == 0:
-            return
+            continue
 
         # Get the column names
-        base, df = read_tsv(files[0])
-        df_delta = df.filter(regex=columns).copy()
+        df = pd.read_csv(files[0], sep="\t", nrows=0)
+        df_delta = df.filter(regex=columns)
         keys = [key for key in df_delta.keys()]
         keys.sort()
+        summaries.append((directory, image, keys, files))
+    return summaries
 
-        # Set the headers
-        headers = ["RUN", "TIME (s)"]
-        for key in keys:
-            power = f"{key[:-10]}AVERAGE_POWER (W)"
-            headers.extend([power, key])
-        headers.extend(["TOTAL_CORE_AVERAGE_POWER (W)", "TOTAL_CORE_ENERGY (J)"])
-        # if "GPU_POWER (W)" in df:
-        #     headers.extend(["GPU_ENERGY (J)"])
-        headers.extend(["ENERGY (J)"])
 
-        data = list()
+def get_manifest_file(directory: str, image: str):
+    return f"{directory}/.{image}.manifest.json"
+
+
+def get_run_version(file: str):
+    stat = os.stat(file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_manifest(directory: str, image: str, keys: list, cores: list = None):
+    """Returns the summary rows of the runs that were parsed before, by run file name.
+
+    A manifest that was written with another counter width (--counter-width) is not used,
+    since the width changes how the energy of every run is unwrapped.
+
+    Args:
+        directory: The results directory of the workload.
+        image: The image of the runs.
+        keys: The energy columns that are summarized; a manifest of other columns is not used.
+        cores: The cores the energy is attributed to; a manifest of other cores is not used.
+
+    Returns:
+        A dictionary with the version (size and modification time) and the summary row of each run file.
+    """
+    try:
+        with open(get_manifest_file(directory, image)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return dict()
+    if (
+        manifest.get("keys") != keys
+        or manifest.get("cores") != cores
+        or manifest.get("counter_width") != COUNTER_WIDTH
+    ):
+        return dict()
+    return manifest.get("runs", dict())
+
+
+def write_manifest(directory: str, image: str, keys: list, runs: dict, cores: list = None):
+    file = get_manifest_file(directory, image)
+    with open(f"{file}.tmp", "w") as f:
+        json.dump({"keys": keys, "cores": cores, "counter_width": COUNTER_WIDTH, "runs": runs}, f)
+    os.replace(f"{file}.tmp", file)
+
+
+def parse_greenserver_images(
+    summaries: list, workers: int = 1, incremental: bool = False
+):
+    """Summarizes the run files of the given images and writes one TSV file per image.
+
+    The runs of all images are parsed in a single process pool when more than one worker is used;
+    the rows are merged back in the same order as the serial path, so the output is identical.
+    The rows of each image are also kept in a manifest next to its TSV file; in incremental mode
+    only the runs that are new or whose file changed since the manifest was written are parsed.
+
+    Args:
+        summaries: The (directory, image, keys, files) tuples returned by get_greenserver_images.
+        workers: The number of worker processes (1 parses the runs in the current process).
+        incremental: Whether to reuse the rows of unchanged runs from the manifests.
+    """
+    if len(summaries) == 0:
+        return
+
+    manifests = list()
+    runs = list()
+    cores = {directory: read_cores(directory) for directory, *_ in summaries}
+    for directory, image, keys, files in summaries:
+        if cores[directory] is not None and get_core_keys(cores[directory], keys) is None:
+            print(f"{image}: the cores in {directory}/cores.txt have no energy counters; ENERGY (J) is left empty")
+        manifest = read_manifest(directory, image, keys, cores[directory]) if incremental else dict()
+        versions = dict()
         for file in files:
-            run_data = list()
-            base, df = read_tsv(file)
-            run_data.append(int(base[4:]))
+            name = Path(file).name
+            versions[name] = get_run_version(file)
+            if name not in manifest or manifest[name]["version"] != versions[name]:
+                runs.append((file, keys, cores[directory]))
+        manifests.append((manifest, versions))
 
-            # Calculate the total time
-            datetime_start = datetime.strptime(
-                df["Time"].iloc[0][:-3], "%Y-%m-%dT%H:%M:%S.%f"
-            ).timestamp()
-            datetime_end = datetime.strptime(
-                df["Time"].iloc[-1][:-3], "%Y-%m-%dT%H:%M:%S.%f"
-            ).timestamp()
+    if workers > 1 and len(runs) > 1:
+        files, keys, run_cores = zip(*runs)
+        chunksize = max(1, len(runs) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(CACHE_DIRECTORY, STREAM_SIZE, COUNTER_WIDTH),
+        ) as executor:
+            rows = list(
+                executor.map(parse_greenserver_run, files, keys, run_cores, chunksize=chunksize)
+            )
+    else:
+        rows = [parse_greenserver_run(file, keys, run_cores) for file, keys, run_cores in runs]
+    rows = {file: row for (file, *_), row in zip(runs, rows)}
 
-            df_samples = pd.DataFrame()
-            df_samples = get_greenserver_time(df_samples, df)
+    for (directory, image, keys, files), (manifest, versions) in zip(
+        summaries, manifests
+    ):
+        data = list()
+        parsed = dict()
+        for file in files:
+            name = Path(file).name
+            if file in rows:
+                row = [int(rows[file][0])] + [float(x) for x in rows[file][1:]]
+            else:
+                row = manifest[name]["row"]
+            data.append(row)
+            parsed[name] = {"version": versions[name], "row": row}
+        if incremental:
+            print(f"{image}: {sum(file in rows for file in files)} new or changed runs")
 
-            total_time = datetime_end - datetime_start
-            run_data.append(total_time)
-
-            # For each key, calculate the average power and energy, and the total values
-            total_energy = 0
-            total_power = 0
-            run_energy = 0
-            for key in keys:
-                df[key] = df[key].values.astype(float)
-                energy = df[key].iloc[-1] - df[key].iloc[0]
-                # If the energy is negative, it means that the counter has overflowed
-                if energy < 0:
-                    # Get the first negative value
-                    i = df[key].lt(0).idxmax()
-                    # Calculate the difference between the last positive value and the first negative value
-                    switch_diff = abs(df[key].iloc[i - 1] - abs(df[key].iloc[i]))
-                    # Calculate the difference between the first value and the last positive value
-                    positive_diff = df[key].iloc[i - 1] - df[key].iloc[0]
-                    # Calculate the difference between the last value and the first negative value
-                    negative_diff = df[key].iloc[-1] - df[key].iloc[i]
-                    energy = switch_diff + positive_diff + negative_diff
-                power = (energy / total_time) if total_time != 0 else 0
-                run_data.extend([power, energy])
-                total_energy += energy
-                total_power += power
-                if key == "CORE0_ENERGY (J)":
-                    run_energy = energy
-
-            run_data.extend([total_power, total_energy])
-            # if "GPU_POWER (W)" in df:
-            #     df[f"GPU_POWER (W)"] = df[f"GPU_POWER (W)"].values.astype(float)
-            #     gpu_energy = np.trapz(
-            #         df[f"GPU_POWER (W)"], df_samples["ELAPSED_TIME (s)"]
-            #     )
-            #     run_data.extend([gpu_energy])
-            #     run_energy += gpu_energy
-            run_data.extend([run_energy])
-            data.append(run_data)
-        df = pd.DataFrame(data, columns=headers)
+        df = pd.DataFrame(data, columns=get_greenserver_headers(keys))
         # print(df)
         create_file(
             image,
             df.sort_values(by=["RUN"], ascending=True).reset_index(drop=True),
             directory,
         )
+        write_manifest(directory, image, keys, parsed, cores[directory])
+
+
+def parse_greenserver(
+    directory: str,
+    columns=r"CORE\d+_ENERGY \(J\)",
+    workers: int = 1,
+    incremental: bool = False,
+):
+    parse_greenserver_images(
+        get_greenserver_images(directory, columns), workers, incremental
+    )
 
 
 def parse_results_samples(file_name: str, directory: str = "results"):
-    with open(file_name) as f:
-        lines = f.read().splitlines()
-        samples = list()
-        data = list()
+    # The samples are written while the log is read, since the image name is only known at the end
+    # they are first written to a temporary file
+    output, temporary = tempfile.mkstemp(dir=directory, suffix=".tsv")
+    with open(file_name) as f, os.fdopen(output, "w", newline="") as out:
+        writer = csv.writer(out, delimiter="\t", lineterminator="\n")
         headers = list()
         run = -1
         image = ""
         start = False
         results = False
+        correct = True
         experiment_info = ["### experiment", "# cpus:", "# workload:", "# started on"]
-        for line in lines:
+        for line in f:
+            line = line.rstrip("\r\n")
             if len(line.split()) == 0:
                 continue
             elif any([x in line for x in experiment_info]):
@@ -405,18 +815,22 @@ def parse_results_samples(file_name: str, directory: str = "results"):
                 if results:
                     line = line.split(",")
                     line.insert(0, run)
-                    samples.append(line)
+                    if len(line) != len(headers):
+                        correct = False
+                        break
+                    writer.writerow(line)
                 elif len(headers) == 0:
                     headers = line.split(",")
                     headers.insert(0, "Run")
+                    writer.writerow(headers)
                     results = True
                 else:
                     results = True
 
-    try:
-        df = pd.DataFrame(samples, columns=headers)
-        create_file(image, df, directory)
-    except:
+    if correct:
+        os.replace(temporary, f"{directory}/{image}.tsv")
+    else:
+        os.remove(temporary)
         print(f"Incorrect file")
 
 
@@ -434,17 +848,213 @@ def total_order(files: list, directory: str = "results"):
     df.to_csv("total_order.tsv", sep="\t", mode="a", index=False)
 
 
-def read_tsv(file: str):
+def set_cache(directory: str):
+    global CACHE_DIRECTORY
+    CACHE_DIRECTORY = directory
+
+
+def set_stream_size(size: int):
+    global STREAM_SIZE
+    STREAM_SIZE = size
+
+
+def set_counter_width(width: float):
+    global COUNTER_WIDTH
+    COUNTER_WIDTH = width
+
+
+def set_plot_points(points: int):
+    global PLOT_POINTS
+    PLOT_POINTS = points
+
+
+def downsample(values: np.ndarray, points: int = None):
+    """Selects the samples of a time series to plot, keeping its peaks (min/max bucketing).
+
+    The samples are split in consecutive buckets of equal size, and the minimum and the maximum of every
+    bucket are kept (in their original order), together with the first and the last sample.
+
+    Args:
+        values: The values of the series (NaN values are never selected unless a bucket is all NaN).
+        points: The maximum number of samples to keep (PLOT_POINTS by default; all samples if 0).
+
+    Returns:
+        The indices of the selected samples, in ascending order.
+    """
+    points = PLOT_POINTS if points is None else points
+    values = np.asarray(values, dtype=float)
+    count = len(values)
+    if points <= 0 or count <= points:
+        return np.arange(count)
+
+    buckets = max(1, (points - 2) // 2)
+    size = -(-count // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:count] = values
+    padded = padded.reshape(buckets, size)
+    missing = np.isnan(padded)
+    offsets = np.arange(buckets) * size
+    minimum = np.where(missing, np.inf, padded).argmin(axis=1) + offsets
+    maximum = np.where(missing, -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.unique(np.concatenate([[0, count - 1], minimum, maximum]))
+    # Buckets that are only padding select an index past the end
+    return indices[indices < count]
+
+
+def init_worker(cache_directory: str, stream_size: int, counter_width: float):
+    # Worker processes do not inherit the options when they are spawned
+    set_cache(cache_directory)
+    set_stream_size(stream_size)
+    set_counter_width(counter_width)
+
+
+def get_cache_entry(file: str, variant: str):
+    """Returns the cache directory of a file and the name of the entry for its current contents.
+
+    Args:
+        file: The file to look up in the cache.
+        variant: The name of the reader, since the same file can be parsed in different ways.
+
+    Returns:
+        The directory with all entries of the file and the entry for its current size and modification time.
+    """
+    stat = os.stat(file)
+    key = hashlib.sha1(f"{variant}:{os.path.abspath(file)}".encode()).hexdigest()
+    version = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return f"{CACHE_DIRECTORY}/{key[:2]}/{key}", version
+
+
+def read_cache(file: str, variant: str, columns: list = None):
+    """Loads a parsed file from the cache; the columns are memory-mapped instead of read.
+
+    Args:
+        file: The file that was parsed.
+        variant: The name of the reader that parsed the file.
+        columns: The columns to load (all columns if None).
+
+    Returns:
+        The cached dataframe, or None if the file is not cached, has changed since, or the entry does not
+        have all the columns.
+    """
+    directory, version = get_cache_entry(file, variant)
+    try:
+        with open(f"{directory}/{version}/columns.json") as f:
+            names = json.load(f)
+        if columns is None and os.path.exists(f"{directory}/{version}/partial"):
+            return None
+        if columns is not None and any(column not in names for column in columns):
+            return None
+        data = {
+            name: np.load(f"{directory}/{version}/{i}.npy", mmap_mode="r")
+            for i, name in enumerate(names)
+            if columns is None or name in columns
+        }
+    except (OSError, ValueError):
+        return None
+    return pd.DataFrame(data, copy=False)
+
+
+def get_cached_columns(file: str, variant: str):
+    # The columns in the entry for the current contents of a file
+    directory, version = get_cache_entry(file, variant)
+    try:
+        with open(f"{directory}/{version}/columns.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return list()
+
+
+def write_cache(file: str, variant: str, df: pd.DataFrame, partial: bool = False):
+    """Stores a parsed file in the cache as one binary array per column, and removes its stale entries.
+
+    Args:
+        file: The file that was parsed.
+        variant: The name of the reader that parsed the file.
+        df: The parsed dataframe.
+        partial: Whether only some columns of the file were parsed; the entry then replaces the previous
+            entry for the same contents, which must have a subset of the columns.
+    """
+    columns = list()
+    for key in df.keys():
+        values = df[key].to_numpy()
+        if values.dtype.kind not in "biuf":
+            # Only string columns can be stored without pickling
+            if df[key].isna().any():
+                return
+            values = values.astype(str)
+        columns.append(values)
+
+    directory, version = get_cache_entry(file, variant)
+    os.makedirs(directory, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=directory, prefix=".")
+    try:
+        for i, values in enumerate(columns):
+            np.save(f"{temporary}/{i}.npy", values, allow_pickle=False)
+        with open(f"{temporary}/columns.json", "w") as f:
+            json.dump([str(key) for key in df.keys()], f)
+        if partial:
+            open(f"{temporary}/partial", "w").close()
+        if os.path.exists(f"{directory}/{version}"):
+            # Move the previous entry out of the way; it is removed with the stale entries
+            os.rename(f"{directory}/{version}", tempfile.mkdtemp(dir=directory, prefix="stale-"))
+        os.rename(temporary, f"{directory}/{version}")
+    except OSError:
+        # Another process cached the same file first
+        shutil.rmtree(temporary, ignore_errors=True)
+        return
+
+    # Remove the entries of previous versions of the file
+    for entry in os.listdir(directory):
+        if entry != version and not entry.startswith("."):
+            shutil.rmtree(f"{directory}/{entry}", ignore_errors=True)
+
+
+def read_cached(file: str, variant: str, read, columns: list = None):
+    """Reads a file through the cache if it is enabled.
+
+    When only some columns are read, the entry of the file keeps the columns parsed so far, and a later
+    read of other columns parses them together with the cached ones.
+
+    Args:
+        file: The file to read.
+        variant: The name of the reader.
+        read: A function that parses the given columns of the file (all columns if None) into a dataframe.
+        columns: The columns to read (all columns if None).
+
+    Returns:
+        The parsed dataframe.
+    """
+    if not CACHE_DIRECTORY:
+        return read(columns)
+    df = read_cache(file, variant, columns)
+    if df is None:
+        if columns is None:
+            df = read(None)
+            write_cache(file, variant, df)
+        else:
+            df = read(list(dict.fromkeys(columns + get_cached_columns(file, variant))))
+            write_cache(file, variant, df, partial=True)
+            df = df[columns]
+    return df
+
+
+def read_tsv(file: str, cache: bool = True):
     base = Path(file).stem
-    return base, pd.read_csv(
-        file,
-        sep="\t",
-        # skiprows=1,
-        # header=None,
-        # usecols=[0, 1],
-        # names=["Time", "Energy"],
-        decimal=",",
-    )
+
+    def read(columns):
+        return pd.read_csv(
+            file,
+            sep="\t",
+            # skiprows=1,
+            # header=None,
+            usecols=columns,
+            # names=["Time", "Energy"],
+            decimal=",",
+        )
+
+    if not cache:
+        return base, read(None)
+    return base, read_cached(file, "greenserver", read)
 
 
 def get_files(directory: str, extension: str):
@@ -453,7 +1063,9 @@ def get_files(directory: str, extension: str):
     return files
 
 
-def parse_files(mode: str, files: list, directory: str):
+def parse_files(
+    mode: str, files: list, directory: str, workers: int = 1, incremental: bool = False
+):
     for file in files:
         parse_results(file, directory)
     if mode == "perf":
@@ -470,10 +1082,12 @@ def parse_files(mode: str, files: list, directory: str):
             for workload in os.listdir(directory)
             if os.path.isdir(f"{directory}/{workload}")
         ]
+        summaries = list()
         for workload in workloads:
             # if workload != "llama.cpp-gpu":
             #     continue
-            parse_greenserver(f"{directory}/{workload}")
+            summaries.extend(get_greenserver_images(f"{directory}/{workload}"))
+        parse_greenserver_images(summaries, workers, incremental)
     elif mode == "greenserver-samples":
         workloads = [
             workload
@@ -493,12 +1107,21 @@ def main(argv):
     files = list()
     directory = "results"
     mode = ""
+    workers = 1
+    incremental = False
     opts, args = getopt.getopt(
         argv,
-        "f:d:",
+        "f:d:j:c:",
         [
             "file=",
             "directory=",
+            "workers=",
+            "cache=",
+            "no-cache",
+            "stream",
+            "counter-width=",
+            "points=",
+            "incremental",
             "perf",
             "perf-samples",
             "samples",
@@ -514,6 +1137,32 @@ def main(argv):
             if directory[-1] == "/":
                 directory = directory[:-1]
             # files = get_files(directory, "*.txt")
+        elif opt in ["-j", "--workers"]:
+            try:
+                workers = int(arg)
+            except ValueError:
+                print(f"Number of workers must be an integer; using default value ({workers})")
+            # 0 uses one worker per available CPU
+            if workers == 0:
+                workers = os.cpu_count()
+        elif opt in ["-c", "--cache"]:
+            set_cache(arg)
+        elif opt == "--no-cache":
+            set_cache("")
+        elif opt == "--stream":
+            set_stream_size(0)
+        elif opt == "--points":
+            try:
+                set_plot_points(int(arg))
+            except ValueError:
+                print(f"Number of points must be an integer; using default value ({PLOT_POINTS})")
+        elif opt == "--incremental":
+            incremental = True
+        elif opt == "--counter-width":
+            try:
+                set_counter_width(float(arg))
+            except ValueError:
+                print("Counter width must be a number")
         elif opt == "--perf":
             mode = "perf"
         elif opt == "--perf-samples":
@@ -525,7 +1174,7 @@ def main(argv):
         elif opt == "--greenserver-samples":
             mode = "greenserver-samples"
 
-    parse_files(mode, files, directory)
+    parse_files(mode, files, directory, workers, incremental)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Default number of bootstrap and permutation replicates
+REPLICATES = 10000
+
+# Default confidence level of the bootstrap intervals
+CONFIDENCE = 0.95
+
+# Streams of the seed sequence, so every image and pair gets the same replicates regardless of the workers
+BOOTSTRAP_STREAM = 0
+PERMUTATION_STREAM = 1
+
+BOOTSTRAP_COLUMNS = [
+    "IMAGE",
+    "PART",
+    "RUNS",
+    "MEAN",
+    "MEAN LOW",
+    "MEAN HIGH",
+    "MEDIAN",
+    "MEDIAN LOW",
+    "MEDIAN HIGH",
+]
+PERMUTATION_COLUMNS = ["IMAGE", "OTHER", "PART", "DIFFERENCE", "P-VALUE"]
+
+
+def get_seed(seed: int = None):
+    # A random seed is drawn once, so it can be reported and the results reproduced
+    return np.random.SeedSequence(seed).entropy
+
+
+def get_rng(seed: int, *key):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def get_bootstrap_indices(rng, runs: int, replicates: int):
+    """Returns a (replicates, runs) matrix with the runs drawn (with replacement) in every replicate."""
+    return rng.integers(0, runs, size=(replicates, runs))
+
+
+def get_counts(indices: np.ndarray, runs: int):
+    # The number of times every run is drawn in every replicate, as a (replicates, runs) matrix
+    replicates = len(indices)
+    offsets = indices + np.arange(replicates)[:, None] * runs
+    return np.bincount(offsets.ravel(), minlength=replicates * runs).reshape(replicates, runs)
+
+
+def get_permutation_mask(rng, runs: int, other_runs: int, replicates: int):
+    """Returns a (replicates, runs + other_runs) matrix that marks the runs assigned to the first sample."""
+    permutations = np.tile(np.arange(runs + other_runs), (replicates, 1))
+    permutations = rng.permuted(permutations, axis=1)
+    mask = np.zeros(permutations.shape)
+    np.put_along_axis(mask, permutations[:, :runs], 1, axis=1)
+    return mask
+
+
+def bootstrap(values: np.ndarray, seed: int, key: tuple, replicates: int, confidence: float):
+    """Computes percentile bootstrap intervals of the mean and the median of every part.
+
+    The replicates are drawn once as an index matrix and shared by all parts, so the same seed and key give
+    the same intervals for any subset of parts (and any number of workers).
+
+    Args:
+        values: The runs of an image, as a (runs, parts) matrix.
+        seed: The seed of the experiment.
+        key: The key of the image in the seed sequence.
+        replicates: The number of bootstrap replicates.
+        confidence: The confidence level of the intervals.
+
+    Returns:
+        A (parts, 6) matrix with the mean, its interval, the median and its interval of every part.
+    """
+    runs = len(values)
+    indices = get_bootstrap_indices(get_rng(seed, *key), runs, replicates)
+    quantiles = [(1 - confidence) / 2, (1 + confidence) / 2]
+
+    # The means of all replicates and parts at once, from the number of times every run is drawn
+    means = get_counts(indices, runs) @ values / runs
+    mean_interval = np.quantile(means, quantiles, axis=0)
+
+    # The medians of all replicates and parts at once: the indices are drawn uniformly, so they can index the
+    # sorted runs of every part, and the middle of the sorted indices selects the middle order statistics
+    middle = np.sort(indices, axis=1)[:, [(runs - 1) // 2, runs // 2]]
+    ordered = np.sort(values, axis=0)
+    medians = (ordered[middle[:, 0]] + ordered[middle[:, 1]]) / 2
+    median_interval = np.quantile(medians, quantiles, axis=0)
+
+    return np.column_stack(
+        [
+            np.mean(values, axis=0),
+            mean_interval[0],
+            mean_interval[1],
+            np.median(values, axis=0),
+            median_interval[0],
+            median_interval[1],
+        ]
+    )
+
+
+def permutation(x: np.ndarray, y: np.ndarray, seed: int, key: tuple, replicates: int):
+    """Computes the two-sided permutation p-value of the difference between the means of every part.
+
+    Args:
+        x: The runs of the first image, as a (runs, parts) matrix.
+        y: The runs of the second image, with the same parts.
+        seed: The seed of the experiment.
+        key: The key of the pair in the seed sequence.
+        replicates: The number of permutations.
+
+    Returns:
+        A (parts, 2) matrix with the difference between the means and its p-value for every part.
+    """
+    combined = np.concatenate([x, y])
+    mask = get_permutation_mask(get_rng(seed, *key), len(x), len(y), replicates)
+
+    # The sums of the first sample in all permutations and parts at once
+    sums = mask @ combined
+    differences = sums / len(x) - (combined.sum(axis=0) - sums) / len(y)
+    observed = np.mean(x, axis=0) - np.mean(y, axis=0)
+    # Tolerance for differences that are equal up to rounding
+    tolerance = 1e-12 * np.maximum(np.abs(observed), 1)
+    extreme = np.sum(np.abs(differences) >= np.abs(observed) - tolerance, axis=0)
+    return np.column_stack([observed, (extreme + 1) / (replicates + 1)])
+
+
+def get_chunks(parts: list, workers: int):
+    # Contiguous chunks of the parts, one per worker
+    return [chunk for chunk in np.array_split(np.arange(len(parts)), max(1, workers)) if len(chunk) > 0]
+
+
+def run_tasks(function, tasks: list, workers: int):
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, *zip(*tasks)))
+    return [function(*task) for task in tasks]
+
+
+def get_values(images: dict, labels: list, parts: list):
+    # The runs of every image as a (runs, parts) matrix
+    return {label: images[label][parts].to_numpy(dtype=float) for label in labels}
+
+
+def bootstrap_intervals(
+    images: dict,
+    labels: list,
+    parts: list,
+    replicates: int = REPLICATES,
+    confidence: float = CONFIDENCE,
+    seed: int = None,
+    workers: int = 1,
+):
+    """Computes bootstrap intervals of the mean and the median of every part of every image.
+
+    The parts are split in chunks that are computed in separate processes.
+
+    Args:
+        images: The runs of every image.
+        labels: The images.
+        parts: The parts (columns).
+        replicates: The number of bootstrap replicates.
+        confidence: The confidence level of the intervals.
+        seed: The seed of the replicates (see get_seed).
+        workers: The number of processes.
+
+    Returns:
+        A DataFrame with one row per image and part.
+    """
+    seed = get_seed(seed)
+    values = get_values(images, labels, parts)
+    chunks = get_chunks(parts, workers)
+    tasks = [
+        (values[label][:, chunk], seed, (BOOTSTRAP_STREAM, i), replicates, confidence)
+        for i, label in enumerate(labels)
+        for chunk in chunks
+    ]
+    results = iter(run_tasks(bootstrap, tasks, workers))
+
+    rows = list()
+    for label in labels:
+        for chunk in chunks:
+            for part, result in zip(chunk, next(results)):
+                rows.append([label, parts[part], len(values[label]), *result])
+    return pd.DataFrame(rows, columns=BOOTSTRAP_COLUMNS)
+
+
+def permutation_tests(
+    images: dict,
+    labels: list,
+    parts: list,
+    replicates: int = REPLICATES,
+    seed: int = None,
+    workers: int = 1,
+):
+    """Computes permutation p-values of the difference between the means of every pair of images.
+
+    Args:
+        images: The runs of every image.
+        labels: The images to compare, in order.
+        parts: The parts (columns).
+        replicates: The number of permutations.
+        seed: The seed of the permutations (see get_seed).
+        workers: The number of processes.
+
+    Returns:
+        A DataFrame with one row per pair of images and part.
+    """
+    seed = get_seed(seed)
+    values = get_values(images, labels, parts)
+    chunks = get_chunks(parts, workers)
+    pairs = [(i, j) for i in range(len(labels)) for j in range(i + 1, len(labels))]
+    tasks = [
+        (
+            values[labels[i]][:, chunk],
+            values[labels[j]][:, chunk],
+            seed,
+            (PERMUTATION_STREAM, i, j),
+            replicates,
+        )
+        for i, j in pairs
+        for chunk in chunks
+    ]
+    results = iter(run_tasks(permutation, tasks, workers))
+
+    rows = list()
+    for i, j in pairs:
+        for chunk in chunks:
+            for part, result in zip(chunk, next(results)):
+                rows.append([labels[i], labels[j], parts[part], *result])
+    return pd.DataFrame(rows, columns=PERMUTATION_COLUMNS)
@@ -0,0 +1,304 @@
+import getopt
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Interval (s) at which the samples are flushed to the output file
+FLUSH_INTERVAL = 1
+
+
+class Powercap:
+    """Energy counters of the RAPL zones in the powercap tree (e.g. /sys/class/powercap/intel-rapl:0).
+
+    Only the top-level zones (one per package) are read; their counters are accumulated in joules
+    and corrected for wraps at the range of each zone.
+    """
+
+    def __init__(self, directory: str = "/sys/class/powercap"):
+        self.zones = list()
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            names = list()
+        for name in names:
+            # Subzones (e.g. intel-rapl:0:0) are already included in their package, and the
+            # intel-rapl-mmio zones are a second interface to the same package counters
+            prefix, _, index = name.partition(":")
+            if prefix != "intel-rapl" or not index.isdigit():
+                continue
+            if not os.path.exists(f"{directory}/{name}/energy_uj"):
+                continue
+            # Top-level zones that are not packages (e.g. psys) cover more than the CPU
+            try:
+                with open(f"{directory}/{name}/name") as f:
+                    if not f.read().strip().startswith("package-"):
+                        continue
+            except OSError:
+                continue
+            self.zones.append((int(index), f"{directory}/{name}"))
+        self.zones.sort()
+
+        self.ranges = list()
+        for _, zone in self.zones:
+            try:
+                self.ranges.append(read_int(f"{zone}/max_energy_range_uj"))
+            except (OSError, ValueError):
+                self.ranges.append(0)
+        self.previous = None
+        self.energy = [0] * len(self.zones)
+
+    def columns(self):
+        return [f"CORE{index}_ENERGY (J)" for index, _ in self.zones]
+
+    def read_raw(self):
+        return [read_int(f"{zone}/energy_uj") for _, zone in self.zones]
+
+    def read(self):
+        """Returns the energy (J) consumed by every zone since the first reading."""
+        values = self.read_raw()
+        if self.previous is not None:
+            for i, value in enumerate(values):
+                delta = value - self.previous[i]
+                if delta < 0 and self.ranges[i] > 0:
+                    delta %= self.ranges[i]
+                self.energy[i] += delta
+        self.previous = values
+        return [energy / 1000000 for energy in self.energy]
+
+
+class FakePowercap(Powercap):
+    """Synthetic energy counters for dry runs on machines without RAPL.
+
+    Every zone draws an idle power plus a load that drifts randomly between idle and peak power,
+    integrated over the real time between readings.
+    """
+
+    def __init__(self, zones: int = 1, idle: float = 5, peak: float = 15, seed: int = None):
+        self.zones = [(index, "") for index in range(zones)]
+        self.idle = idle
+        self.peak = peak
+        self.random = random.Random(seed)
+        self.load = [self.random.random() for _ in range(zones)]
+        self.previous = None
+        self.energy = [0] * zones
+
+    def read(self):
+        now = time.monotonic()
+        if self.previous is not None:
+            elapsed = now - self.previous
+            for i in range(len(self.zones)):
+                self.load[i] = min(1, max(0, self.load[i] + self.random.gauss(0, 0.1)))
+                power = self.idle + (self.peak - self.idle) * self.load[i]
+                self.energy[i] += power * elapsed
+        self.previous = now
+        return list(self.energy)
+
+
+class ProcStat:
+    """Usage of every CPU, calculated from the time counters in /proc/stat."""
+
+    def __init__(self, file: str = "/proc/stat"):
+        self.file = file
+        self.previous = self.read_raw()
+        self.cpus = sorted(self.previous.keys())
+
+    def columns(self):
+        return [f"CPU{cpu}_USAGE (%)" for cpu in self.cpus]
+
+    def read_raw(self):
+        times = dict()
+        with open(self.file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 5 or not fields[0].startswith("cpu") or fields[0] == "cpu":
+                    continue
+                values = [int(x) for x in fields[1:]]
+                # The idle and iowait times are the only times the CPU was not busy
+                idle = values[3] + (values[4] if len(values) > 4 else 0)
+                times[int(fields[0][3:])] = (sum(values[:8]), idle)
+        return times
+
+    def read(self):
+        """Returns the usage (%) of every CPU since the previous reading."""
+        times = self.read_raw()
+        usage = list()
+        for cpu in self.cpus:
+            total, idle = times.get(cpu, self.previous[cpu])
+            previous_total, previous_idle = self.previous[cpu]
+            delta = total - previous_total
+            busy = delta - (idle - previous_idle)
+            usage.append(100 * busy / delta if delta > 0 else 0)
+        self.previous = times
+        return usage
+
+
+def read_int(file: str):
+    with open(file) as f:
+        return int(f.read().strip())
+
+
+def format_time(timestamp: int):
+    # The same layout as EnergiBridge, with nanoseconds
+    seconds, nanoseconds = divmod(timestamp, 1000000000)
+    return datetime.fromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%S.") + f"{nanoseconds:09d}"
+
+
+def format_value(value: float):
+    return f"{value:.6f}".rstrip("0").rstrip(".")
+
+
+def sample(
+    output: str,
+    interval: int,
+    process: subprocess.Popen = None,
+    powercap: Powercap = None,
+    proc_stat: ProcStat = None,
+    duration: float = None,
+):
+    """Samples the energy counters and CPU usage until the process exits and writes them as a TSV file.
+
+    The file has the same columns as the EnergiBridge output that parse_greenserver expects:
+    Delta (ms since the previous sample), Time, CPU<n>_USAGE (%) and CORE<n>_ENERGY (J).
+
+    Args:
+        output: The TSV file to write the samples to.
+        interval: The interval between samples (ms).
+        process: The monitored process; sampling stops when it exits.
+        powercap: The energy counters to sample.
+        proc_stat: The CPU time counters to sample.
+        duration: The time (s) to sample for if there is no process.
+
+    Returns:
+        The number of samples that were written.
+    """
+    powercap = powercap if powercap is not None else Powercap()
+    proc_stat = proc_stat if proc_stat is not None else ProcStat()
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Every sample is written as soon as it is read, so an interrupted run keeps its samples
+    with open(output, "w") as f:
+        f.write("\t".join(["Delta", "Time"] + proc_stat.columns() + powercap.columns()) + "\n")
+        samples = 0
+        start = time.monotonic()
+        next_sample = start
+        last_flush = start
+        previous = None
+        while True:
+            timestamp = time.time_ns()
+            values = proc_stat.read() + powercap.read()
+            delta = 0 if previous is None else round((timestamp - previous) / 1000000)
+            previous = timestamp
+            f.write(
+                "\t".join([str(delta), format_time(timestamp)] + [format_value(value) for value in values])
+                + "\n"
+            )
+            samples += 1
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                f.flush()
+                last_flush = time.monotonic()
+
+            if process is not None:
+                if process.poll() is not None:
+                    break
+            elif duration is None or time.monotonic() - start >= duration:
+                break
+
+            # Keep a fixed schedule so the interval does not drift with the sampling time
+            next_sample += interval / 1000
+            pause = next_sample - time.monotonic()
+            if pause > 0:
+                if process is not None:
+                    try:
+                        process.wait(timeout=pause)
+                    except subprocess.TimeoutExpired:
+                        pass
+                else:
+                    time.sleep(pause)
+            else:
+                next_sample = time.monotonic()
+    return samples
+
+
+def help():
+    print(
+        "Samples the RAPL energy counters (powercap) and CPU usage while running a command.\n",
+        "Usage: python scripts/sampler.py [options] -- command",
+        "Options:",
+        "   -i --interval       Interval of monitoring (ms) (e.g. -i 100) (default 100)",
+        "   -o --output         TSV file to write the samples to",
+        "   --powercap          Powercap directory (default /sys/class/powercap)",
+        "   --proc-stat         CPU statistics file (default /proc/stat)",
+        "   --fake              Write synthetic energy counters instead of reading powercap (for dry runs)",
+        "   --fake-zones        Number of synthetic energy counters (default 1)",
+        sep=os.linesep,
+    )
+
+
+def main(argv):
+    interval = 100
+    output = "samples.tsv"
+    powercap = "/sys/class/powercap"
+    proc_stat = "/proc/stat"
+    fake = False
+    fake_zones = 1
+
+    opts, args = getopt.getopt(
+        argv,
+        "i:o:h",
+        [
+            "interval=",
+            "output=",
+            "powercap=",
+            "proc-stat=",
+            "fake",
+            "fake-zones=",
+            "help",
+        ],
+    )
+    for opt, arg in opts:
+        if opt in ["-i", "--interval"]:
+            try:
+                interval = int(arg)
+            except ValueError:
+                print(f"Interval time must be an integer; using default value ({interval})")
+        elif opt in ["-o", "--output"]:
+            output = arg
+        elif opt == "--powercap":
+            powercap = arg
+        elif opt == "--proc-stat":
+            proc_stat = arg
+        elif opt == "--fake":
+            fake = True
+        elif opt == "--fake-zones":
+            try:
+                fake_zones = int(arg)
+            except ValueError:
+                print(f"Number of zones must be an integer; using default value ({fake_zones})")
+        elif opt in ["-h", "--help"]:
+            help()
+            return 0
+
+    if len(args) == 0:
+        help()
+        return 1
+
+    if fake:
+        counters = FakePowercap(fake_zones)
+    else:
+        counters = Powercap(powercap)
+    if len(counters.zones) == 0:
+        print(f"No readable RAPL zones found in {powercap}")
+    cpus = ProcStat(proc_stat)
+
+    process = subprocess.Popen(args)
+    sample(output, interval, process, counters, cpus)
+    return process.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,107 @@
+import itertools
+import math
+import os
+
+import pandas as pd
+from scipy import stats
+
+import scripts.parse as parse
+
+
+class SequentialStopping:
+    """Decides when the images of a workload have been measured enough to stop scheduling more runs.
+
+    The energy of every run is added to the estimate of its image. A comparison between two images is settled
+    once the confidence interval of the difference between their mean energies (Welch) is narrower than the
+    target, as a percentage of their mean energy. With a single image, the interval of its mean is used.
+    An image is settled once it has the minimum number of runs and all of its comparisons are settled;
+    its remaining entries in the queue are then skipped.
+    """
+
+    def __init__(self, images: set, min_runs: int = 10, target: float = 5, confidence: float = 0.95):
+        self.images = sorted(images)
+        self.min_runs = min_runs
+        self.target = target
+        self.confidence = confidence
+        self.energies = {image: list() for image in self.images}
+
+    def add(self, image: str, energy: float):
+        self.energies[image].append(energy)
+
+    def get_width(self, image: str, other: str = None):
+        """Returns the width of the confidence interval as a percentage of the mean energy.
+
+        Args:
+            image: The image to estimate.
+            other: The image to compare to; if None, the interval of the mean of image is used.
+
+        Returns:
+            The relative width (%) of the interval, or infinity if it cannot be estimated yet.
+        """
+        a = self.energies[image]
+        b = self.energies[other] if other is not None else list()
+        if len(a) < 2 or (other is not None and len(b) < 2):
+            return math.inf
+
+        variance = stats.tvar(a) / len(a)
+        df = len(a) - 1
+        mean = stats.tmean(a)
+        if other is not None:
+            variance_b = stats.tvar(b) / len(b)
+            # Welch-Satterthwaite degrees of freedom
+            denominator = variance**2 / (len(a) - 1) + variance_b**2 / (len(b) - 1)
+            df = (variance + variance_b) ** 2 / denominator if denominator > 0 else len(a) + len(b) - 2
+            variance += variance_b
+            mean = (mean + stats.tmean(b)) / 2
+        if mean == 0:
+            return math.inf
+
+        width = 2 * stats.t.ppf((1 + self.confidence) / 2, df) * math.sqrt(variance)
+        return 100 * width / abs(mean)
+
+    def get_comparisons(self):
+        if len(self.images) == 1:
+            return [(self.images[0], None)]
+        return list(itertools.combinations(self.images, 2))
+
+    def is_settled(self, image: str):
+        if len(self.energies[image]) < self.min_runs:
+            return False
+        for a, b in self.get_comparisons():
+            if image not in (a, b):
+                continue
+            if b is not None and len(self.energies[b if a == image else a]) < self.min_runs:
+                return False
+            if self.get_width(a, b) > self.target:
+                return False
+        return True
+
+    def summary(self):
+        rows = list()
+        for a, b in self.get_comparisons():
+            runs = len(self.energies[b]) if b is not None else 0
+            rows.append([a, b if b is not None else "", len(self.energies[a]), runs, self.get_width(a, b)])
+        return pd.DataFrame(rows, columns=["IMAGE", "OTHER", "RUNS", "OTHER RUNS", "CI WIDTH (%)"])
+
+
+def get_run_energy(file: str):
+    """Returns the energy (J) of a run from its greenserver (or native) samples.
+
+    Args:
+        file: The run file.
+
+    Returns:
+        The energy of the run, or None if it cannot be read.
+    """
+    try:
+        df = pd.read_csv(file, sep="\t", nrows=0)
+        keys = sorted(df.filter(regex=r"CORE\d+_ENERGY \(J\)").keys())
+        if len(keys) == 0:
+            return None
+        # The results directory of the workload is two levels up (<workload>/<image>/run-<n>.tsv)
+        cores = parse.read_cores(os.path.dirname(os.path.dirname(file)))
+        # The run is read during the measurements, so nothing is written to the parse cache
+        energy = parse.parse_greenserver_run(file, keys, cores, cache=False)[-1]
+        return None if math.isnan(energy) else energy
+    except (OSError, ValueError, IndexError, KeyError, pd.errors.ParserError, pd.errors.EmptyDataError):
+        return None
@@ -0,0 +1,158 @@
+import glob
+import os
+from collections import namedtuple
+
+import psutil
+
+# Root of the CPU and NUMA node directories in sysfs
+ROOT = "/sys/devices/system"
+
+# A physical core: its socket, NUMA node, core id and logical CPUs (SMT siblings)
+Core = namedtuple("Core", ["package", "node", "core", "cpus"])
+
+
+def parse_cpulist(cpulist: str):
+    """Returns the CPUs in a sysfs CPU list (e.g. "0-3,8,10-11")."""
+    cpus = list()
+    for part in cpulist.strip().split(","):
+        if part == "":
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpulist(cpus: list):
+    """Returns the CPUs as a sysfs CPU list, with consecutive CPUs as ranges."""
+    ranges = list()
+    for cpu in sorted(cpus):
+        if len(ranges) > 0 and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def read(file: str):
+    with open(file) as f:
+        return f.read().strip()
+
+
+def get_nodes(root: str = ROOT):
+    """Returns the NUMA node of every CPU (an empty dictionary without NUMA information)."""
+    nodes = dict()
+    for directory in glob.glob(f"{root}/node/node*"):
+        name = os.path.basename(directory)[4:]
+        if not name.isdigit():
+            continue
+        try:
+            for cpu in parse_cpulist(read(f"{directory}/cpulist")):
+                nodes[cpu] = int(name)
+        except (OSError, ValueError):
+            continue
+    return nodes
+
+
+def get_cores(root: str = ROOT):
+    """Returns the physical cores of the online CPUs, ordered by socket, NUMA node and first CPU.
+
+    The cores are read from cpu/cpu<n>/topology (physical_package_id, core_id) and node/node<n>/cpulist in sysfs.
+    Without sysfs, the logical CPUs are allocated round-robin to the physical CPUs (on one socket and node).
+
+    Args:
+        root: The system directory in sysfs (e.g. a fake tree for testing).
+
+    Returns:
+        A list of the physical cores.
+    """
+    try:
+        cpus = parse_cpulist(read(f"{root}/cpu/online"))
+    except (OSError, ValueError):
+        cpus = sorted(
+            int(os.path.basename(directory)[3:])
+            for directory in glob.glob(f"{root}/cpu/cpu*")
+            if os.path.basename(directory)[3:].isdigit()
+        )
+
+    nodes = get_nodes(root)
+    siblings = dict()
+    try:
+        for cpu in cpus:
+            package = int(read(f"{root}/cpu/cpu{cpu}/topology/physical_package_id"))
+            core = int(read(f"{root}/cpu/cpu{cpu}/topology/core_id"))
+            siblings.setdefault((package, nodes.get(cpu, 0), core), []).append(cpu)
+    except (OSError, ValueError):
+        siblings = dict()
+
+    if len(siblings) == 0:
+        physical_cpus = psutil.cpu_count(logical=False) or 1
+        for cpu in range(psutil.cpu_count()):
+            siblings.setdefault((0, 0, cpu % physical_cpus), []).append(cpu)
+
+    cores = [Core(package, node, core, sorted(cpus)) for (package, node, core), cpus in siblings.items()]
+    return sorted(cores, key=lambda core: (core.package, core.node, core.cpus[0]))
+
+
+def get_physical_cores(cores: list):
+    """Returns the cores ordered by their first CPU (the order in which --pack hands them out)."""
+    return sorted(cores, key=lambda core: core.cpus[0])
+
+
+def allocate(cores: list, count: int, free: list = None):
+    """Selects physical cores on a single NUMA node, or else on a single socket.
+
+    The first node (or socket) with enough free cores is used; only if none has enough, the first free
+    cores are used across sockets.
+
+    Args:
+        cores: The physical cores of the machine.
+        count: The number of cores to select.
+        free: The cores that can be selected (all cores by default).
+
+    Returns:
+        The selected cores, or an empty list if there are not enough free cores.
+    """
+    free = cores if free is None else [core for core in cores if core in free]
+    if count > len(free):
+        return list()
+    for group in [lambda core: (core.package, core.node), lambda core: core.package]:
+        groups = dict()
+        for core in free:
+            groups.setdefault(group(core), []).append(core)
+        for members in groups.values():
+            if len(members) >= count:
+                return members[:count]
+    return free[:count]
+
+
+def describe(cpus: list, cores: list):
+    """Describes the sockets, NUMA nodes and cores of a set of CPUs (e.g. for the logs).
+
+    Args:
+        cpus: The logical CPUs.
+        cores: The physical cores of the machine.
+
+    Returns:
+        A line such as "socket 0, node 0, cores 0:0, 0:1 (cpus 0-1,16-17)".
+    """
+    selected = [core for core in cores if any(cpu in cpus for cpu in core.cpus)]
+    packages = sorted(set(core.package for core in selected))
+    nodes = sorted(set(core.node for core in selected))
+    return (
+        f"{'socket' if len(packages) == 1 else 'sockets'} {format_cpulist(packages)}, "
+        f"{'node' if len(nodes) == 1 else 'nodes'} {format_cpulist(nodes)}, "
+        f"cores {', '.join(f'{core.package}:{core.core}' for core in selected)} "
+        f"(cpus {format_cpulist(cpus)})"
+    )
+
+
+def log_topology(file: str, cores: list):
+    """Writes the socket, NUMA node, core id and CPUs of every physical core to a file."""
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, "w") as f:
+        f.write("SOCKET\tNODE\tCORE\tCPUS\n")
+        for core in cores:
+            f.write(f"{core.package}\t{core.node}\t{core.core}\t{format_cpulist(core.cpus)}\n")
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from scripts import sampler
+from scripts.sampler import FakePowercap, Powercap, ProcStat, sample
+
+
+def write_zone(directory: str, name: str, zone: str, energy: int, energy_range: int = 1000000):
+    os.makedirs(f"{directory}/{name}")
+    with open(f"{directory}/{name}/name", "w") as f:
+        f.write(zone + "\n")
+    with open(f"{directory}/{name}/energy_uj", "w") as f:
+        f.write(f"{energy}\n")
+    with open(f"{directory}/{name}/max_energy_range_uj", "w") as f:
+        f.write(f"{energy_range}\n")
+
+
+def set_energy(directory: str, name: str, energy: int):
+    with open(f"{directory}/{name}/energy_uj", "w") as f:
+        f.write(f"{energy}\n")
+
+
+class PowercapTest(unittest.TestCase):
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = self.temporary.name
+        write_zone(self.directory, "intel-rapl:0", "package-0", 100)
+        write_zone(self.directory, "intel-rapl:0:0", "core", 50)
+        write_zone(self.directory, "intel-rapl:1", "psys", 500)
+        write_zone(self.directory, "intel-rapl:2", "package-1", 200)
+        write_zone(self.directory, "intel-rapl-mmio:0", "package-0", 100)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_only_packages(self):
+        powercap = Powercap(self.directory)
+        self.assertEqual(
+            powercap.zones,
+            [(0, f"{self.directory}/intel-rapl:0"), (2, f"{self.directory}/intel-rapl:2")],
+        )
+        self.assertEqual(powercap.columns(), ["CORE0_ENERGY (J)", "CORE2_ENERGY (J)"])
+
+    def test_energy(self):
+        powercap = Powercap(self.directory)
+        self.assertEqual(powercap.read(), [0, 0])
+        set_energy(self.directory, "intel-rapl:0", 1500100)
+        set_energy(self.directory, "intel-rapl:2", 600200)
+        self.assertEqual(powercap.read(), [1.5, 0.6])
+
+    def test_wrap(self):
+        powercap = Powercap(self.directory)
+        powercap.read()
+        # The counter of package-0 wraps at its range of 1000000 uJ
+        set_energy(self.directory, "intel-rapl:0", 50)
+        self.assertEqual(powercap.read(), [0.99995, 0])
+
+    def test_missing_directory(self):
+        self.assertEqual(Powercap(f"{self.directory}/missing").zones, [])
+
+
+class ProcStatTest(unittest.TestCase):
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.file = f"{self.temporary.name}/stat"
+        self.write(["cpu  0 0 0 0 0 0 0 0", "cpu0 10 0 10 80 0 0 0 0", "cpu1 0 0 0 100 0 0 0 0"])
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def write(self, lines):
+        with open(self.file, "w") as f:
+            f.write("\n".join(lines + ["intr 0"]) + "\n")
+
+    def test_usage(self):
+        proc_stat = ProcStat(self.file)
+        self.assertEqual(proc_stat.columns(), ["CPU0_USAGE (%)", "CPU1_USAGE (%)"])
+        self.write(["cpu  0 0 0 0 0 0 0 0", "cpu0 40 0 20 120 0 0 0 0", "cpu1 0 0 0 200 0 0 0 0"])
+        self.assertEqual(proc_stat.read(), [50, 0])
+
+
+class SampleTest(unittest.TestCase):
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.output = f"{self.temporary.name}/samples/run.tsv"
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_columns(self):
+        samples = sample(self.output, 10, powercap=FakePowercap(2, seed=0), duration=0.05)
+        with open(self.output) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), samples + 1)
+        header = lines[0].split("\t")
+        self.assertEqual(header[:2], ["Delta", "Time"])
+        self.assertEqual(header[-2:], ["CORE0_ENERGY (J)", "CORE1_ENERGY (J)"])
+        self.assertTrue(all(len(line.split("\t")) == len(header) for line in lines[1:]))
+
+    def test_streaming(self):
+        # The samples are on disk while the process is still running
+        flush_interval = sampler.FLUSH_INTERVAL
+        sampler.FLUSH_INTERVAL = 0
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.5)"])
+        try:
+            thread = threading.Thread(target=sample, args=(self.output, 10, process, FakePowercap(seed=0)))
+            thread.start()
+            time.sleep(0.2)
+            with open(self.output) as f:
+                self.assertGreater(len(f.read().splitlines()), 1)
+            thread.join()
+        finally:
+            sampler.FLUSH_INTERVAL = flush_interval
+            process.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()